@@ -1,83 +1,1331 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, Blueprint, current_app, render_template, request, redirect, url_for, session, flash, jsonify, g, Response, stream_with_context
+from flask import before_render_template, template_rendered, send_file, get_template_attribute
 import sqlite3
+import click
 import os
-from datetime import datetime, timedelta
+import threading
+import time
+import json
+import hashlib
+import csv
+import io
+import re
+import functools
+import contextlib
+import secrets
+import random
+import glob
+import mimetypes
+import queue
+from collections import OrderedDict, deque
+from email.message import EmailMessage
+from flask.sessions import SessionInterface, SessionMixin
+from flask.json.tag import TaggedJSONSerializer
+from werkzeug.datastructures import CallbackDict
+from werkzeug.local import LocalProxy
+from jinja2 import FileSystemBytecodeCache
+from datetime import datetime, timedelta, timezone
 from werkzeug.security import generate_password_hash, check_password_hash
-import pytz # Untuk penanganan zona waktu WIB
-import json # Untuk menyimpan list kegiatan sebagai JSON string
-from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadTimeSignature
+from itsdangerous import URLSafeTimedSerializer, BadData
 
-app = Flask(__name__)
-app.secret_key = 'kunci_rahasia_untuk_sesi_yang_sangat_kuat_dan_unik' # Ganti dengan kunci rahasia yang lebih kuat
+# Konfigurasi bawaan; ditimpa oleh variabel lingkungan KEGIATAN_<NAMA> lalu argumen create_app(config)
+DEFAULT_CONFIG = {
+    'SECRET_KEY': 'kunci_rahasia_untuk_sesi_yang_sangat_kuat_dan_unik', # Ganti dengan kunci rahasia yang lebih kuat
+    # Path absolut agar tidak bergantung pada direktori kerja saat server dijalankan
+    'DATABASE': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kegiatan_registrasi.db'),
+    'AUTO_MIGRATE': True, # Jalankan migrasi skema yang tertunda saat aplikasi dibuat
+    'DB_POOL_MAX_IDLE': 8,
+    'DB_SYNCHRONOUS': 'NORMAL', # 'FULL' = fsync di setiap commit (tahan mati listrik); murah jika SELECTION_GROUP_COMMIT aktif
+    'CATALOG_CACHE_TTL': 2.0, # Detik; jumlah peserta di /api/activities paling lambat selama ini
+    'PAGE_SIZE': 50, # Jumlah baris per halaman pada daftar peserta dan dashboard admin
+    'SEARCH_MIN_PREFIX': 3, # Kata yang lebih pendek dicari utuh, bukan sebagai awalan
+    # Query yang cocok dengan lebih banyak pengguna dari ini tidak diberi peringkat bm25 (urut id) agar latensi terbatas
+    'SEARCH_MAX_RANKED': 2000,
+    'EXPORT_CHUNK_ROWS': 500, # Jumlah baris CSV per potongan yang dikirim ke klien
+    'PASSWORD_HASH_METHOD': 'scrypt:32768:8:1', # Contoh lain: 'pbkdf2:sha256:600000'
+    'PASSWORD_HASH_WORKERS': min(4, os.cpu_count() or 1), # 0 = hashing langsung di thread request
+    'PASSWORD_HASH_MAX_PENDING': 16, # Batas antrean hashing sebelum request ditolak (503)
+    'PASSWORD_HASH_QUEUE_TIMEOUT': 1.0, # Detik menunggu slot antrean sebelum ditolak
+    'SESSION_BACKEND': 'sqlite', # 'sqlite' (dibagi antar worker) atau 'memory' (LRU per proses)
+    'SESSION_TTL': 12 * 3600, # Detik sesi tidak aktif sebelum kedaluwarsa
+    'SESSION_MEMORY_MAX_ENTRIES': 10000,
+    # None = PASSWORD_HASH_METHOD. Metode yang lebih ringan hanya dipakai bila diminta eksplisit
+    # (--hash-method); hash tersebut diperbarui otomatis ke PASSWORD_HASH_METHOD saat login pertama
+    'BULK_IMPORT_HASH_METHOD': None,
+    'BULK_IMPORT_BATCH_SIZE': 2000,
+    'BULK_IMPORT_WORKERS': os.cpu_count() or 1,
+    # Impor dari halaman admin berjalan sebagai job latar; progres disimpan setiap batch sebesar ini
+    'BULK_IMPORT_JOB_BATCH_SIZE': 200,
+    'METRICS_ENABLED': os.environ.get('KEGIATAN_METRICS') == '1', # Instrumentasi opt-in untuk /admin/metrics
+    'SLOW_REQUEST_THRESHOLD': 0.5, # Detik; request lebih lambat dicatat di log
+    'PROFILE_SAMPLE_RATE': 0.01, # Fraksi request yang diprofil cProfile (disimpan hanya jika lambat)
+    'PROFILE_DIR': None, # None = <instance>/profiles; path relatif dihitung dari folder instance
+    'SEAT_STREAM_COALESCE': 0.25, # Detik; perubahan dalam jendela ini digabung menjadi satu event SSE
+    'SEAT_STREAM_RESYNC': 5.0, # Detik; baca ulang counter selama ada penonton (menangkap tulisan dari worker lain)
+    'SEAT_STREAM_KEEPALIVE': 15.0, # Detik antar komentar keep-alive SSE
+    'SEAT_STREAM_MAX_CLIENTS': 200, # Mode WSGI: setiap stream menahan satu thread server
+    'TEMPLATE_CACHE_DIR': None, # Bytecode Jinja; None = <instance>/jinja_cache, False = nonaktif
+    'ACTIVITY_IMAGE_DIR': None, # Cache gambar kegiatan; None = <instance>/activity_images
+    'ACTIVITY_IMAGE_WIDTH': 640, # Piksel; kartu tampil ~300px, 2x untuk layar retina
+    'ACTIVITY_IMAGE_MAX_AGE': 365 * 24 * 3600, # Aman karena URL gambar memuat hash sumbernya
+    'ACTIVITY_IMAGE_FETCH_TIMEOUT': 10.0,
+    'ACTIVITY_IMAGE_MAX_BYTES': 10 * 1024 * 1024,
+    # Group commit: konfirmasi pilihan dikumpulkan satu thread penulis dan di-commit per batch
+    'SELECTION_GROUP_COMMIT': False,
+    'SELECTION_BATCH_MAX': 64,
+    'SELECTION_BATCH_WAIT_MS': 2.0, # Waktu tunggu maksimum konfirmasi berikutnya sebelum batch di-commit
+    'SELECTION_COMMIT_TIMEOUT': 10.0, # Detik request menunggu hasil commit
+    # Batas laju token bucket: endpoint -> {'ip' | 'account': [jumlah, periode detik]}; hanya metode RATE_LIMIT_METHODS.
+    # Satu IP kampus (NAT) dipakai banyak mahasiswa, jadi batas per IP sengaja jauh lebih longgar dari batas per akun
+    'RATE_LIMIT_ENABLED': True,
+    'RATE_LIMIT_BACKEND': 'memory', # 'memory' (per proses) atau 'sqlite' (batas gabungan semua worker)
+    'RATE_LIMITS': {
+        'main.login': {'ip': [100, 60], 'account': [10, 300]},
+        'main.forgot_password': {'ip': [20, 600], 'account': [3, 900]},
+        'main.confirm_selection': {'ip': [300, 60], 'account': [10, 60]},
+    },
+    'RATE_LIMIT_METHODS': ['POST'],
+    'RATE_LIMIT_MEMORY_MAX_KEYS': 100000, # Bucket yang paling lama tidak dipakai dibuang lebih dulu
+    'PASSWORD_RESET_TTL': 3600, # Detik tautan reset password berlaku (sekali pakai)
+    'PASSWORD_RESET_SWEEP_INTERVAL': 300.0, # Detik antar penghapusan token kedaluwarsa oleh thread penyapu per proses
+    # Email yang tidak terdaftar diingat sebentar per proses agar permintaan reset berulang tidak selalu ke database
+    'EMAIL_NEGATIVE_CACHE_TTL': 60.0,
+    'EMAIL_NEGATIVE_CACHE_MAX_ENTRIES': 10000,
+    'MAIL_BACKEND': 'local', # 'local' (berkas .eml di MAIL_LOCAL_DIR, untuk pengembangan/pengujian) atau 'smtp'
+    'MAIL_LOCAL_DIR': None, # None = <instance>/outbox, False = hanya di memori
+    'MAIL_SENDER': 'Registrasi Kegiatan <no-reply@localhost>',
+    'MAIL_SERVER': 'localhost',
+    'MAIL_PORT': 25,
+    'MAIL_USE_TLS': False,
+    'MAIL_USERNAME': None,
+    'MAIL_PASSWORD': None,
+    'MAIL_TIMEOUT': 10.0,
+    'MAIL_MAX_RETRIES': 3,
+    'MAIL_QUEUE_MAX': 1000, # Email yang menunggu dikirim per proses; selebihnya dibuang dan dicatat di log
+    'PROXY_FIX_X_FOR': 0, # Jumlah reverse proxy tepercaya; > 0 agar batas per IP memakai IP klien dari X-Forwarded-For
+    # Mode ASGI (asgi.py): route baca berjalan di executor thread terbatas, route lain di executor terpisah
+    'ASGI_READ_WORKERS': 8, # Sebaiknya <= DB_POOL_MAX_IDLE agar koneksi pool tidak dibuang-buat ulang
+    'ASGI_WRITE_WORKERS': min(4, os.cpu_count() or 1), # Tulisan SQLite tetap berurutan lewat BEGIN IMMEDIATE
+    'ASGI_BODY_CHUNK': 64 * 1024, # Byte respons streaming (mis. ekspor CSV) yang dikumpulkan per giliran executor
+    'ASGI_SEAT_STREAM_MAX_CLIENTS': 2000, # Stream SSE di mode ASGI tidak menahan thread
+}
 
-# Inisialisasi serializer untuk token reset password
-s = URLSafeTimedSerializer(app.secret_key)
+bp = Blueprint('main', __name__, cli_group=None)
 
-# Definisikan zona waktu WIB
-WIB_TIMEZONE = pytz.timezone('Asia/Jakarta')
-UTC_TIMEZONE = pytz.utc
+def get_reset_serializer():
+    # Serializer untuk token reset password
+    return URLSafeTimedSerializer(current_app.secret_key)
+
+# Definisikan zona waktu WIB; pytz baru dimuat saat ada timestamp di luar jalur cepat
+@functools.lru_cache(maxsize=None)
+def wib_timezone():
+    import pytz
+    return pytz.timezone('Asia/Jakarta')
 
 # Data kegiatan yang sudah disediakan
 ACTIVITIES = {
     "Kelas Catur": {
         "description": "Pelajari strategi catur dari dasar hingga mahir.",
         "day_time": "Setiap Selasa, 16:00 - 18:00 WIB",
-        "image": "https://seputarpapua.com/wp-content/uploads/2023/11/Percasi-Mimika-Pertandingkan-Catur-Kelas-Junior-dan-Senior.webp"
+        "image": "https://seputarpapua.com/wp-content/uploads/2023/11/Percasi-Mimika-Pertandingkan-Catur-Kelas-Junior-dan-Senior.webp",
+        "capacity": 30
     },
     "Futsal": {
         "description": "Bergabung dalam tim futsal dan tingkatkan skill Anda.",
         "day_time": "Setiap Rabu, 19:00 - 21:00 WIB",
-        "image": "https://jasakontraktorlapangan.id/wp-content/uploads/2023/02/Jasa-Pembuatan-Lapangan-Futsal-Serang.jpeg"
+        "image": "https://jasakontraktorlapangan.id/wp-content/uploads/2023/02/Jasa-Pembuatan-Lapangan-Futsal-Serang.jpeg",
+        "capacity": 40
     },
     "Kelas Memasak": {
         "description": "Eksplorasi resep-resep kuliner populer dan ciptakan hidangan lezat.",
         "day_time": "Setiap Kamis, 14:00 - 16:00 WIB",
-        "image": "https://www.joyful-cooking.com/uploads/6/3/3/5/63359151/dscf9643_orig.jpg"
+        "image": "https://www.joyful-cooking.com/uploads/6/3/3/5/63359151/dscf9643_orig.jpg",
+        "capacity": 25
     },
     "Kelas Musik": {
         "description": "Belajar instrumen favorit atau vokal dengan instruktur profesional.",
         "day_time": "Setiap Jumat, 17:00 - 19:00 WIB",
-        "image": "https://interiorqu.id/wp-content/uploads/2022/10/IMG-20220702-WA0026.jpg"
+        "image": "https://interiorqu.id/wp-content/uploads/2022/10/IMG-20220702-WA0026.jpg",
+        "capacity": 30
     },
     "Voli": {
         "description": "Gabung tim voli dan latih kemampuan spikes dan blocks.",
         "day_time": "Setiap Sabtu, 10:00 - 12:00 WIB",
-        "image": "https://www.lantai-kayu.co.id/wp-content/uploads/2022/03/lapang-voli-outdoor.jpg"
+        "image": "https://www.lantai-kayu.co.id/wp-content/uploads/2022/03/lapang-voli-outdoor.jpg",
+        "capacity": 36
     },
     "Badminton": {
         "description": "Asah kelincahan Anda di lapangan badminton.",
         "day_time": "Setiap Minggu, 09:00 - 11:00 WIB",
-        "image": "https://percepat.com/wp-content/uploads/2019/04/Ukuran-Lapangan-Bulu-Tangkis-1.jpg"
+        "image": "https://percepat.com/wp-content/uploads/2019/04/Ukuran-Lapangan-Bulu-Tangkis-1.jpg",
+        "capacity": 32
     },
     "Kelas Tari": {
         "description": "Ekspresikan diri melalui berbagai genre tarian.",
         "day_time": "Setiap Senin, 15:00 - 17:00 WIB",
-        "image": "https://galuhaprilina.wordpress.com/wp-content/uploads/2017/08/a8faf-annex-studio-e.jpg"
+        "image": "https://galuhaprilina.wordpress.com/wp-content/uploads/2017/08/a8faf-annex-studio-e.jpg",
+        "capacity": 30
     }
 }
 
+JURUSAN_LIST = ["Teknik Informatika", "Teknik Sipil", "Teknik Arsitektur", "Teknik Pertambangan"]
+
+# WIB selalu UTC+7 tanpa DST sejak 1964; sebelum itu Asia/Jakarta punya offset lain sehingga tetap lewat pytz
+WIB_OFFSET = timedelta(hours=7)
+_UTC_TIMESTAMP_RE = re.compile(r'[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}:[0-9]{2}')
+
+def _fast_utc_to_wib(utc_timestamp_str):
+    # Jalur cepat untuk format baku CURRENT_TIMESTAMP; None berarti serahkan ke _convert_utc_to_wib_pytz
+    if type(utc_timestamp_str) is not str:
+        return None
+    value = utc_timestamp_str.split('.')[0] if '.' in utc_timestamp_str else utc_timestamp_str
+    if not _UTC_TIMESTAMP_RE.fullmatch(value):
+        return None
+    year = int(value[0:4])
+    if not 1970 <= year <= 9998:
+        return None
+    try:
+        wib_dt = datetime(year, int(value[5:7]), int(value[8:10]),
+                          int(value[11:13]), int(value[14:16]), int(value[17:19])) + WIB_OFFSET
+    except ValueError:
+        return None
+    return (f'{wib_dt.year:04d}-{wib_dt.month:02d}-{wib_dt.day:02d} '
+            f'{wib_dt.hour:02d}:{wib_dt.minute:02d}:{wib_dt.second:02d} WIB')
+
+@functools.lru_cache(maxsize=8192)
 def convert_utc_to_wib(utc_timestamp_str):
     if not utc_timestamp_str:
         return ""
+    converted = _fast_utc_to_wib(utc_timestamp_str)
+    if converted is not None:
+        return converted
+    return _convert_utc_to_wib_pytz(utc_timestamp_str)
+
+def convert_utc_to_wib_batch(utc_timestamp_strs):
+    # Versi untuk banyak baris sekaligus (satu halaman / satu potongan ekspor) tanpa overhead cache per nilai
+    converted = []
+    for utc_timestamp_str in utc_timestamp_strs:
+        if not utc_timestamp_str:
+            converted.append("")
+            continue
+        fast = _fast_utc_to_wib(utc_timestamp_str)
+        converted.append(fast if fast is not None else _convert_utc_to_wib_pytz(utc_timestamp_str))
+    return converted
+
+def _convert_utc_to_wib_pytz(utc_timestamp_str):
     try:
         if '.' in utc_timestamp_str:
             utc_dt = datetime.strptime(utc_timestamp_str.split('.')[0], '%Y-%m-%d %H:%M:%S')
         else:
             utc_dt = datetime.strptime(utc_timestamp_str, '%Y-%m-%d %H:%M:%S')
 
-        utc_dt = UTC_TIMEZONE.localize(utc_dt)
-        wib_dt = utc_dt.astimezone(WIB_TIMEZONE)
+        utc_dt = utc_dt.replace(tzinfo=timezone.utc)
+        wib_dt = utc_dt.astimezone(wib_timezone())
         return wib_dt.strftime('%Y-%m-%d %H:%M:%S WIB')
     except ValueError:
         return utc_timestamp_str
 
+class ConnectionPool:
+    """Pool koneksi SQLite per proses; koneksi dipinjam per app context dan dikembalikan saat teardown."""
+
+    PRAGMAS = (
+        'PRAGMA journal_mode = WAL',
+        'PRAGMA busy_timeout = 5000',
+        'PRAGMA foreign_keys = ON',
+        'PRAGMA mmap_size = 67108864',
+    )
+
+    SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+    def __init__(self, database, max_idle=8, synchronous='NORMAL'):
+        if synchronous.upper() not in self.SYNCHRONOUS_LEVELS:
+            raise ValueError(f'DB_SYNCHRONOUS tidak dikenal: {synchronous}')
+        self.database = database
+        self.max_idle = max_idle
+        self.synchronous = synchronous.upper()
+        self.pid = os.getpid()
+        self._idle = []
+        self._lock = threading.Lock()
+        self._stats = {'created': 0, 'reused': 0, 'released': 0, 'discarded': 0, 'in_use': 0, 'peak_in_use': 0}
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        # WAL + NORMAL tidak fsync per commit; FULL fsync setiap commit
+        conn.execute(f'PRAGMA synchronous = {self.synchronous}')
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._stats['created'] += 1
+            else:
+                self._stats['reused'] += 1
+            self._stats['in_use'] += 1
+            self._stats['peak_in_use'] = max(self._stats['peak_in_use'], self._stats['in_use'])
+        if conn is None:
+            conn = self._connect()
+        return conn
+
+    def release(self, conn):
+        # Transaksi yang tidak di-commit oleh route dibatalkan agar koneksi kembali bersih
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._stats['in_use'] -= 1
+            self._stats['released'] += 1
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self._stats['discarded'] += 1
+        conn.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'idle': len(self._idle), 'max_idle': self.max_idle, 'database': self.database}
+
+_pool_lock = threading.Lock()
+
+def get_pool():
+    state = current_app.extensions['kegiatan']
+    database = current_app.config['DATABASE']
+    # Koneksi SQLite tidak boleh dibawa melewati fork, jadi setiap proses worker membuat pool sendiri
+    pool = state['pool']
+    if pool is None or pool.pid != os.getpid() or pool.database != database:
+        with _pool_lock:
+            pool = state['pool']
+            if pool is None or pool.pid != os.getpid() or pool.database != database:
+                pool = state['pool'] = ConnectionPool(database, max_idle=current_app.config['DB_POOL_MAX_IDLE'],
+                                                      synchronous=current_app.config['DB_SYNCHRONOUS'])
+    return pool
+
+class Metrics:
+    """Penampung metrik in-process yang dirender dalam format teks Prometheus."""
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self._counters = {}
+
+    def observe(self, name, labels, value, buckets=BUCKETS):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': buckets, 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for index, upper_bound in enumerate(buckets):
+                if value <= upper_bound:
+                    histogram['counts'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @staticmethod
+    def _format_labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), " ")}"'
+                   for name, value in pairs)
+        return '{' + ','.join(escaped) + '}'
+
+    def render(self, gauges):
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        declared = set()
+        for (name, labels), histogram in histograms:
+            if name not in declared:
+                lines.append(f'# TYPE {name} histogram')
+                declared.add(name)
+            for upper_bound, count in zip(histogram['buckets'], histogram['counts']):
+                lines.append(f'{name}_bucket{self._format_labels(labels, [("le", upper_bound)])} {count}')
+            lines.append(f'{name}_bucket{self._format_labels(labels, [("le", "+Inf")])} {histogram["count"]}')
+            lines.append(f'{name}_sum{self._format_labels(labels)} {histogram["sum"]:.6f}')
+            lines.append(f'{name}_count{self._format_labels(labels)} {histogram["count"]}')
+        for (name, labels), value in counters:
+            if name not in declared:
+                lines.append(f'# TYPE {name} counter')
+                declared.add(name)
+            lines.append(f'{name}{self._format_labels(labels)} {value:.6f}' if isinstance(value, float)
+                         else f'{name}{self._format_labels(labels)} {value}')
+        for name, value in gauges:
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+metrics = LocalProxy(lambda: current_app.extensions['kegiatan']['metrics'])
+_SQL_WHITESPACE_RE = re.compile(r'\s+')
+_SQL_PLACEHOLDERS_RE = re.compile(r'\?(?:\s*,\s*\?)+')
+
+def normalize_sql(sql):
+    # Satukan spasi dan daftar placeholder IN (?, ?, ...) agar label metrik tidak bertambah tanpa batas
+    sql = _SQL_PLACEHOLDERS_RE.sub('?...', _SQL_WHITESPACE_RE.sub(' ', sql).strip())
+    return sql[:120]
+
+class InstrumentedConnection:
+    """Pembungkus koneksi yang mencatat waktu dan jumlah query per statement."""
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def _timed(self, method, sql, params):
+        started = time.perf_counter()
+        try:
+            return method(sql, params)
+        finally:
+            elapsed = time.perf_counter() - started
+            statement = normalize_sql(sql)
+            metrics.inc('kegiatan_db_queries_total', {'statement': statement})
+            metrics.inc('kegiatan_db_query_seconds_total', {'statement': statement}, elapsed)
+            if 'db_queries' in g:
+                g.db_queries += 1
+
+    def execute(self, sql, params=()):
+        return self._timed(self.raw.execute, sql, params)
+
+    def executemany(self, sql, params):
+        return self._timed(self.raw.executemany, sql, params)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
 def get_db_connection():
-    conn = sqlite3.connect('kegiatan_registrasi.db') 
-    conn.row_factory = sqlite3.Row 
-    return conn
+    # Satu koneksi per app context; beberapa pemanggilan dalam satu request memakai koneksi yang sama
+    if 'db' not in g:
+        g.db = get_pool().acquire()
+        if current_app.config['METRICS_ENABLED']:
+            g.db = InstrumentedConnection(g.db)
+    if 'db_connection_calls' in g:
+        g.db_connection_calls += 1
+    return g.db
 
-def init_db():
+def rollback_request_transaction():
+    # Transaksi yang tidak di-commit route tetap dibatalkan saat teardown; ini hanya melakukannya lebih awal
+    conn = g.get('db')
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+def release_db_connection(exception):
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_pool().release(conn.raw if isinstance(conn, InstrumentedConnection) else conn)
+
+_profile_lock = threading.Lock()
+
+@bp.before_app_request
+def start_request_metrics():
+    if not current_app.config['METRICS_ENABLED']:
+        return
+    g.request_started = time.perf_counter()
+    g.db_queries = 0
+    g.db_connection_calls = 0
+    # Paling banyak satu profiler aktif sekaligus; hasilnya hanya disimpan untuk request yang lambat
+    if random.random() < current_app.config['PROFILE_SAMPLE_RATE'] and _profile_lock.acquire(blocking=False):
+        import cProfile
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@bp.teardown_app_request
+def finish_request_metrics(exception):
+    if 'request_started' not in g:
+        return
+    elapsed = time.perf_counter() - g.pop('request_started')
+    endpoint = request.endpoint or 'unknown'
+    labels = {'endpoint': endpoint, 'method': request.method}
+    metrics.observe('kegiatan_request_duration_seconds', labels, elapsed)
+    metrics.observe('kegiatan_db_queries_per_request', labels, g.db_queries, buckets=Metrics.COUNT_BUCKETS)
+    metrics.observe('kegiatan_db_connection_calls_per_request', labels, g.db_connection_calls, buckets=Metrics.COUNT_BUCKETS)
+
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        _profile_lock.release()
+    if elapsed >= current_app.config['SLOW_REQUEST_THRESHOLD']:
+        metrics.inc('kegiatan_slow_requests_total', labels)
+        profile_path = None
+        if profiler is not None:
+            profile_dir = os.path.join(current_app.instance_path, current_app.config['PROFILE_DIR'] or 'profiles')
+            os.makedirs(profile_dir, exist_ok=True)
+            profile_path = os.path.join(profile_dir, f'{time.strftime("%Y%m%d-%H%M%S")}-{endpoint}-{os.getpid()}.prof')
+            profiler.dump_stats(profile_path)
+        current_app.logger.warning('Request lambat: %s %s %.3fs, %d query, %d get_db_connection%s', request.method, request.path,
+                           elapsed, g.db_queries, g.db_connection_calls, f', profil: {profile_path}' if profile_path else '')
+
+def start_template_timer(sender, template, context, **extra):
+    if current_app.config['METRICS_ENABLED']:
+        g.template_started = time.perf_counter()
+
+def record_template_render(sender, template, context, **extra):
+    if 'template_started' in g:
+        metrics.observe('kegiatan_template_render_seconds', {'template': template.name or 'inline'},
+                        time.perf_counter() - g.pop('template_started'))
+
+class PasswordHasherBusy(Exception):
+    pass
+
+class PasswordHasher:
+    """Hashing password di process pool terbatas agar worker web tidak habis dipakai CPU saat login massal."""
+
+    def __init__(self, app):
+        self.app = app
+        self.pid = None
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self._stats = {'pending': 0, 'peak_pending': 0, 'completed': 0, 'rejected': 0, 'rehashed': 0}
+
+    def _ensure_started(self):
+        if self.pid == os.getpid():
+            return
+        with self._lock:
+            if self.pid == os.getpid():
+                return
+            workers = self.app.config['PASSWORD_HASH_WORKERS']
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # spawn: proses anak tidak mewarisi koneksi SQLite maupun thread milik proses web
+            self._executor = (ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+                              if workers > 0 else None)
+            self._slots = threading.BoundedSemaphore(self.app.config['PASSWORD_HASH_MAX_PENDING'])
+            self.pid = os.getpid()
+
+    def _run(self, func, *args):
+        self._ensure_started()
+        if not self._slots.acquire(timeout=self.app.config['PASSWORD_HASH_QUEUE_TIMEOUT']):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise PasswordHasherBusy()
+        with self._lock:
+            self._stats['pending'] += 1
+            self._stats['peak_pending'] = max(self._stats['peak_pending'], self._stats['pending'])
+        try:
+            if self._executor is None:
+                return func(*args)
+            return self._executor.submit(func, *args).result()
+        finally:
+            self._slots.release()
+            with self._lock:
+                self._stats['pending'] -= 1
+                self._stats['completed'] += 1
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.app.config['PASSWORD_HASH_METHOD'])
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        # Format werkzeug: "<metode>$<salt>$<hash>"; metode berbeda berarti hash lama/biaya lama
+        return password_hash.split('$', 1)[0] != self.app.config['PASSWORD_HASH_METHOD']
+
+    def note_rehash(self):
+        with self._lock:
+            self._stats['rehashed'] += 1
+
+    def shutdown(self):
+        # Menghentikan process pool (mis. akhir benchmark); pool dibuat ulang pada pemanggilan berikutnya
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+            self._executor = None
+            self.pid = None
+            self._stats = {'pending': 0, 'peak_pending': 0, 'completed': 0, 'rejected': 0, 'rehashed': 0}
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats,
+                    'workers': self.app.config['PASSWORD_HASH_WORKERS'],
+                    'max_pending': self.app.config['PASSWORD_HASH_MAX_PENDING'],
+                    'method': self.app.config['PASSWORD_HASH_METHOD']}
+
+password_hasher = LocalProxy(lambda: current_app.extensions['kegiatan']['password_hasher'])
+
+def hashing_busy_response(template, **context):
+    flash('Server sedang sibuk memproses login lain. Silakan coba lagi dalam beberapa detik.', 'error')
+    response = current_app.make_response((render_template(template, **context), 503))
+    response.headers['Retry-After'] = '2'
+    return response
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, expires_at=0.0):
+        def on_update(self):
+            self.modified = True
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.modified = False
+        self.rotate = False
+
+    def regenerate(self):
+        # Ganti ID sesi (mis. setelah login) agar ID lama tidak bisa dipakai ulang
+        self.rotate = True
+        self.modified = True
+
+class SQLiteSessionStore:
+    """Sesi di tabel user_session; memakai koneksi pool terpisah agar tidak ikut meng-commit transaksi route."""
+
+    def __init__(self):
+        self._last_sweep = 0.0
+
+    def _execute(self, sql, params=(), fetch=False):
+        if not fetch:
+            # Penulisan sesi memakai koneksi lain; write lock yang masih dipegang koneksi request akan membuatnya
+            # menunggu sampai busy_timeout habis ("database is locked")
+            rollback_request_transaction()
+        pool = get_pool()
+        conn = pool.acquire()
+        try:
+            cursor = conn.execute(sql, params)
+            if fetch:
+                return cursor.fetchall()
+            conn.commit()
+        finally:
+            pool.release(conn)
+
+    def load(self, sid):
+        rows = self._execute('SELECT data, expires_at FROM user_session WHERE sid = ? AND expires_at > ?',
+                             (sid, time.time()), fetch=True)
+        return (rows[0]['data'], rows[0]['expires_at']) if rows else None
+
+    def save(self, sid, user_id, data, expires_at):
+        self._execute('''
+            INSERT INTO user_session (sid, user_id, data, expires_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (sid) DO UPDATE SET user_id = excluded.user_id, data = excluded.data, expires_at = excluded.expires_at
+        ''', (sid, user_id, data, expires_at))
+        now = time.time()
+        if now - self._last_sweep > 300:
+            self._last_sweep = now
+            self._execute('DELETE FROM user_session WHERE expires_at <= ?', (now,))
+
+    def delete(self, sid):
+        self._execute('DELETE FROM user_session WHERE sid = ?', (sid,))
+
+    def delete_for_users(self, user_ids):
+        user_ids = list(user_ids)
+        if user_ids:
+            placeholders = ','.join('?' * len(user_ids))
+            self._execute(f'DELETE FROM user_session WHERE user_id IN ({placeholders})', user_ids)
+
+    def sessions_for_user(self, user_id):
+        rows = self._execute('SELECT sid, data, expires_at FROM user_session WHERE user_id = ? AND expires_at > ?',
+                             (user_id, time.time()), fetch=True)
+        return [(row['sid'], row['data'], row['expires_at']) for row in rows]
+
+class MemorySessionStore:
+    """Sesi di memori proses dengan eviksi LRU dan TTL; hanya cocok untuk satu proses worker."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            if entry[2] <= time.time():
+                del self._entries[sid]
+                return None
+            self._entries.move_to_end(sid)
+            return entry[1], entry[2]
+
+    def save(self, sid, user_id, data, expires_at):
+        with self._lock:
+            self._entries[sid] = (user_id, data, expires_at)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def delete_for_users(self, user_ids):
+        user_ids = set(user_ids)
+        with self._lock:
+            for sid in [sid for sid, entry in self._entries.items() if entry[0] in user_ids]:
+                del self._entries[sid]
+
+    def sessions_for_user(self, user_id):
+        now = time.time()
+        with self._lock:
+            return [(sid, entry[1], entry[2]) for sid, entry in self._entries.items()
+                    if entry[0] == user_id and entry[2] > now]
+
+class ServerSideSessionInterface(SessionInterface):
+    """Cookie hanya berisi ID sesi acak; isi sesi disimpan di server."""
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self):
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def get_store(self, app):
+        backend = app.config['SESSION_BACKEND']
+        with self._lock:
+            if backend not in self._stores:
+                if backend == 'memory':
+                    self._stores[backend] = MemorySessionStore(app.config['SESSION_MEMORY_MAX_ENTRIES'])
+                elif backend == 'sqlite':
+                    self._stores[backend] = SQLiteSessionStore()
+                else:
+                    raise ValueError(f'SESSION_BACKEND tidak dikenal: {backend}')
+            return self._stores[backend]
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            stored = self.get_store(app).load(sid)
+            if stored is not None:
+                data, expires_at = stored
+                return ServerSideSession(self.serializer.loads(data), sid=sid, expires_at=expires_at)
+        return ServerSideSession()
+
+    def save_session(self, app, session, response):
+        store = self.get_store(app)
+        cookie_name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.sid:
+                store.delete(session.sid)
+                response.delete_cookie(cookie_name, domain=domain, path=path)
+            return
+
+        ttl = app.config['SESSION_TTL']
+        now = time.time()
+        # Sesi yang tidak berubah hanya diperpanjang setelah separuh TTL lewat, jadi sebagian besar request tanpa tulis
+        needs_touch = session.expires_at - now < ttl / 2
+        if not (session.modified or needs_touch or session.sid is None):
+            return
+
+        is_new_sid = session.sid is None or session.rotate
+        if session.rotate and session.sid:
+            store.delete(session.sid)
+        if is_new_sid:
+            session.sid = secrets.token_urlsafe(32)
+        store.save(session.sid, session.get('user_id'), self.serializer.dumps(dict(session)), now + ttl)
+
+        if is_new_sid:
+            response.set_cookie(cookie_name, session.sid,
+                                expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app),
+                                domain=domain, path=path,
+                                secure=self.get_cookie_secure(app),
+                                samesite=self.get_cookie_samesite(app))
+            response.vary.add('Cookie')
+
+    def invalidate_users(self, app, user_ids):
+        self.get_store(app).delete_for_users(user_ids)
+
+    def update_user(self, app, user_id, **fields):
+        # Sinkronkan data profil yang disimpan di sesi setelah admin mengubah akun
+        store = self.get_store(app)
+        for sid, data, expires_at in store.sessions_for_user(user_id):
+            session_data = self.serializer.loads(data)
+            session_data.update(fields)
+            store.save(sid, user_id, self.serializer.dumps(session_data), expires_at)
+
+class MemoryRateLimitStore:
+    """Bucket batas laju di memori proses; batas berlaku per worker."""
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self._arrivals = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, period, now):
+        interval = period / limit
+        with self._lock:
+            arrival = max(self._arrivals.get(key, now), now) + interval
+            if arrival - now > period:
+                return arrival - period - now
+            self._arrivals[key] = arrival
+            self._arrivals.move_to_end(key)
+            if len(self._arrivals) > self.max_keys:
+                self._arrivals.popitem(last=False)
+        return 0.0
+
+class SQLiteRateLimitStore:
+    """Bucket di tabel rate_limit_bucket sehingga batas berlaku gabungan untuk semua worker."""
+
+    def __init__(self):
+        self._last_sweep = 0.0
+
+    def hit(self, key, limit, period, now):
+        interval = period / limit
+        pool = get_pool()
+        conn = pool.acquire()
+        try:
+            # Upsert bersyarat: baris hanya berubah (dan dikembalikan RETURNING) jika bucket masih berisi token
+            allowed = conn.execute('''
+                INSERT INTO rate_limit_bucket (key, arrival) VALUES (:key, :now + :interval)
+                ON CONFLICT (key) DO UPDATE SET arrival = max(arrival, :now) + :interval
+                WHERE max(arrival, :now) + :interval - :now <= :period
+                RETURNING arrival
+            ''', {'key': key, 'now': now, 'interval': interval, 'period': period}).fetchall()
+            conn.commit()
+            retry_after = 0.0
+            if not allowed:
+                arrival = conn.execute('SELECT arrival FROM rate_limit_bucket WHERE key = ?', (key,)).fetchone()[0]
+                retry_after = max(arrival, now) + interval - period - now
+            if now - self._last_sweep > 300:
+                # Bucket yang sudah terisi penuh sama dengan bucket yang belum ada
+                self._last_sweep = now
+                conn.execute('DELETE FROM rate_limit_bucket WHERE arrival <= ?', (now,))
+                conn.commit()
+        finally:
+            pool.release(conn)
+        return retry_after
+
+class RateLimiter:
+    """Batas laju per IP dan per akun untuk endpoint di RATE_LIMITS.
+
+    Token bucket disimpan dalam bentuk GCRA: per kunci hanya waktu kedatangan teoretis (arrival) berikutnya.
+    Bucket berisi `jumlah` token yang terisi ulang merata selama `periode` dan kosong saat arrival lebih dari
+    satu periode di depan waktu sekarang.
+    """
+
+    def __init__(self):
+        self._stores = {}
+        self._lock = threading.Lock()
+        self._limited = {}
+
+    def get_store(self, app):
+        backend = app.config['RATE_LIMIT_BACKEND']
+        store = self._stores.get(backend)
+        if store is None:
+            with self._lock:
+                if backend not in self._stores:
+                    if backend == 'memory':
+                        self._stores[backend] = MemoryRateLimitStore(app.config['RATE_LIMIT_MEMORY_MAX_KEYS'])
+                    elif backend == 'sqlite':
+                        self._stores[backend] = SQLiteRateLimitStore()
+                    else:
+                        raise ValueError(f'RATE_LIMIT_BACKEND tidak dikenal: {backend}')
+                store = self._stores[backend]
+        return store
+
+    def check(self, app, endpoint, limits, identities):
+        """Ambil satu token dari setiap bucket endpoint; mengembalikan detik sampai boleh mencoba lagi (0 = diizinkan)."""
+        store = self.get_store(app)
+        now = time.time()
+        for scope, (limit, period) in limits.items():
+            identity = identities.get(scope)
+            if identity is None:
+                continue
+            retry_after = store.hit(f'{endpoint}:{scope}:{identity}', limit, period, now)
+            if retry_after > 0:
+                with self._lock:
+                    self._limited[f'{endpoint}:{scope}'] = self._limited.get(f'{endpoint}:{scope}', 0) + 1
+                if app.config['METRICS_ENABLED']:
+                    app.extensions['kegiatan']['metrics'].inc('kegiatan_rate_limited_total', {'endpoint': endpoint, 'scope': scope})
+                return retry_after
+        return 0.0
+
+    def stats(self):
+        with self._lock:
+            return {'limited': dict(self._limited)}
+
+rate_limiter = LocalProxy(lambda: current_app.extensions['kegiatan']['rate_limiter'])
+
+# Halaman yang dirender ulang bersama pesan 429; endpoint lain di RATE_LIMITS mendapat JSON
+RATE_LIMIT_TEMPLATES = {
+    'main.login': 'login.html',
+    'main.forgot_password': 'forgot_password.html',
+    'main.confirm_selection': 'confirm_selection.html',
+}
+
+# Endpoint tanpa sesi login yang akunnya diambil dari email di form; endpoint lain selalu memakai user_id sesi
+# agar field email tambahan di form tidak bisa dipakai untuk berpindah ke bucket lain
+RATE_LIMIT_FORM_ACCOUNT_ENDPOINTS = frozenset({'main.login', 'main.forgot_password'})
+
+def rate_limit_identities(req):
+    if req.endpoint in RATE_LIMIT_FORM_ACCOUNT_ENDPOINTS:
+        account = req.form.get('email', '').strip().lower()[:254] or None
+    else:
+        account = session.get('user_id')
+    return {'ip': req.remote_addr, 'account': account}
+
+def rate_limited_response(retry_after):
+    seconds = int(retry_after) + 1
+    message = f'Terlalu banyak percobaan. Silakan coba lagi dalam {seconds} detik.'
+    template = RATE_LIMIT_TEMPLATES.get(request.endpoint)
+    if template is None:
+        response = jsonify({'error': message})
+        response.status_code = 429
+    else:
+        flash(message, 'error')
+        response = current_app.make_response(
+            (render_template(template, selected_activities=request.form.getlist('selected_activities')), 429))
+    response.headers['Retry-After'] = str(seconds)
+    return response
+
+@bp.before_app_request
+def enforce_rate_limit():
+    # Dijalankan di setiap request: proxy current_app/request di-resolve sekali saja karena tiap aksesnya ~1 µs
+    app = current_app._get_current_object()
+    req = request._get_current_object()
+    limits = app.config['RATE_LIMITS'].get(req.endpoint)
+    if limits is None or not app.config['RATE_LIMIT_ENABLED'] or req.method not in app.config['RATE_LIMIT_METHODS']:
+        return None
+    retry_after = app.extensions['kegiatan']['rate_limiter'].check(app, req.endpoint, limits, rate_limit_identities(req))
+    if retry_after > 0:
+        return rate_limited_response(retry_after)
+
+class NegativeCache:
+    """Cache singkat untuk kunci yang diketahui tidak ada (mis. email yang tidak terdaftar), dengan eviksi LRU."""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def contains(self, key):
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is not None and expires_at > time.monotonic():
+                self._stats['hits'] += 1
+                return True
+            if expires_at is not None:
+                del self._entries[key]
+            self._stats['misses'] += 1
+            return False
+
+    def add(self, key):
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'entries': len(self._entries), 'ttl': self.ttl}
+
+email_negative_cache = LocalProxy(lambda: current_app.extensions['kegiatan']['email_negative_cache'])
+
+class LocalMailer:
+    """Pengganti SMTP untuk pengembangan dan pengujian: email disimpan sebagai berkas .eml dan di memori (sent)."""
+
+    def __init__(self, directory, keep=100):
+        self.directory = directory
+        self.sent = deque(maxlen=keep)
+
+    def send(self, message):
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f'{time.strftime("%Y%m%d-%H%M%S")}-{secrets.token_hex(4)}.eml')
+            with open(path, 'wb') as f:
+                f.write(message.as_bytes())
+        self.sent.append(message)
+
+class SMTPMailer:
+    def __init__(self, config):
+        self.config = config
+
+    def send(self, message):
+        import smtplib
+        with smtplib.SMTP(self.config['MAIL_SERVER'], self.config['MAIL_PORT'], timeout=self.config['MAIL_TIMEOUT']) as smtp:
+            if self.config['MAIL_USE_TLS']:
+                smtp.starttls()
+            if self.config['MAIL_USERNAME']:
+                smtp.login(self.config['MAIL_USERNAME'], self.config['MAIL_PASSWORD'])
+            smtp.send_message(message)
+
+class MailOutbox:
+    """Antrean email per proses; satu thread latar mengirim lewat mailer sehingga request tidak menunggu SMTP.
+
+    Email yang masih di antrean hilang jika proses berhenti; pengguna cukup meminta tautan baru.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.mailer = None
+        self._lock = threading.Condition()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._pending = 0
+        self._stats = {'queued': 0, 'sent': 0, 'failed': 0, 'dropped': 0, 'retries': 0}
+
+    def get_mailer(self):
+        if self.mailer is None:
+            backend = self.app.config['MAIL_BACKEND']
+            if backend == 'local':
+                directory = self.app.config['MAIL_LOCAL_DIR']
+                if directory is None:
+                    directory = os.path.join(self.app.instance_path, 'outbox')
+                self.mailer = LocalMailer(directory or None)
+            elif backend == 'smtp':
+                self.mailer = SMTPMailer(self.app.config)
+            else:
+                raise ValueError(f'MAIL_BACKEND tidak dikenal: {backend}')
+        return self.mailer
+
+    def _ensure_thread(self):
+        # Dipanggil dengan self._lock terkunci
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            if self._pid != os.getpid():
+                self._queue = queue.SimpleQueue()
+                self._pending = 0
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='mail-outbox', daemon=True)
+            self._thread.start()
+        return self._queue
+
+    def send(self, to, subject, body):
+        """Masukkan email ke antrean lalu langsung kembali; False jika antrean penuh dan email dibuang."""
+        message = EmailMessage()
+        message['From'] = self.app.config['MAIL_SENDER']
+        message['To'] = to
+        message['Subject'] = subject
+        message.set_content(body)
+        with self._lock:
+            if self._pending >= self.app.config['MAIL_QUEUE_MAX']:
+                self._stats['dropped'] += 1
+                self.app.logger.warning('Antrean email penuh; email ke %s dibuang', to)
+                return False
+            self._ensure_thread().put(message)
+            self._pending += 1
+            self._stats['queued'] += 1
+        return True
+
+    def wait_idle(self, timeout=None):
+        """Tunggu sampai semua email di antrean selesai diproses (untuk pengujian dan benchmark)."""
+        with self._lock:
+            return self._lock.wait_for(lambda: self._pending == 0, timeout)
+
+    def _run(self):
+        pending_queue = self._queue
+        while True:
+            self._deliver(pending_queue.get())
+
+    def _deliver(self, message):
+        retries = self.app.config['MAIL_MAX_RETRIES']
+        delivered = False
+        for attempt in range(retries + 1):
+            try:
+                self.get_mailer().send(message)
+                delivered = True
+                break
+            except Exception:
+                self.app.logger.exception('Gagal mengirim email ke %s (percobaan %d)', message['To'], attempt + 1)
+                if attempt < retries:
+                    with self._lock:
+                        self._stats['retries'] += 1
+                    time.sleep(min(30.0, 0.5 * (2 ** attempt)))
+        with self._lock:
+            self._stats['sent' if delivered else 'failed'] += 1
+            self._pending -= 1
+            self._lock.notify_all()
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'pending': self._pending, 'backend': self.app.config['MAIL_BACKEND']}
+
+mail_outbox = LocalProxy(lambda: current_app.extensions['kegiatan']['mail_outbox'])
+
+class ResetTokenSweeper:
+    """Thread latar per proses yang menghapus token reset password kedaluwarsa secara berkala.
+
+    Dimulai oleh request lupa/reset password pertama di proses ini, terlepas dari ada tidaknya email yang dikirim.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stats = {'sweeps': 0, 'swept_tokens': 0}
+
+    def ensure_started(self):
+        # Dipanggil di setiap request lupa/reset password; jalur cepat tanpa lock setelah thread berjalan
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='reset-token-sweeper', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self.sweep()
+            time.sleep(self.app.config['PASSWORD_RESET_SWEEP_INTERVAL'])
+
+    def sweep(self):
+        try:
+            with self.app.app_context():
+                conn = get_db_connection()
+                swept = conn.execute('DELETE FROM password_reset_token WHERE expires_at <= ?', (time.time(),)).rowcount
+                conn.commit()
+        except sqlite3.Error:
+            self.app.logger.exception('Gagal menghapus token reset password yang kedaluwarsa')
+            return 0
+        with self._lock:
+            self._stats['sweeps'] += 1
+            self._stats['swept_tokens'] += swept
+        return swept
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'running': self._thread is not None and self._thread.is_alive()}
+
+reset_token_sweeper = LocalProxy(lambda: current_app.extensions['kegiatan']['reset_token_sweeper'])
+
+def reset_token_digest(nonce):
+    # Database hanya menyimpan hash nonce; token lengkap (bertanda tangan) hanya ada di email
+    return hashlib.sha256(nonce.encode('utf-8')).hexdigest()
+
+def issue_reset_token(conn, user_id):
+    nonce = secrets.token_urlsafe(16)
+    conn.execute('INSERT INTO password_reset_token (token_hash, user_id, expires_at) VALUES (?, ?, ?)',
+                 (reset_token_digest(nonce), user_id, time.time() + current_app.config['PASSWORD_RESET_TTL']))
+    conn.commit()
+    return get_reset_serializer().dumps({'uid': user_id, 'nonce': nonce}, salt='password-reset-salt')
+
+def load_reset_token(token):
+    # Cek tanda tangan dan umur token tanpa database; None jika palsu, kedaluwarsa, atau format lama
+    try:
+        payload = get_reset_serializer().loads(token, salt='password-reset-salt', max_age=current_app.config['PASSWORD_RESET_TTL'])
+    except BadData:
+        return None
+    if not isinstance(payload, dict) or not isinstance(payload.get('nonce'), str):
+        return None
+    return payload
+
+def reset_token_usable(conn, payload):
+    # Cek murah sebelum hashing password baru, agar tautan yang sudah dipakai tidak membebani CPU
+    return conn.execute('''
+        SELECT 1 FROM password_reset_token WHERE token_hash = ? AND user_id = ? AND used_at IS NULL AND expires_at > ?
+    ''', (reset_token_digest(payload['nonce']), payload['uid'], time.time())).fetchone() is not None
+
+def consume_reset_token(conn, payload):
+    # Menandai token terpakai dalam transaksi pemanggil; False jika sudah dipakai, kedaluwarsa, atau tidak dikenal
+    used = conn.execute('''
+        UPDATE password_reset_token SET used_at = ?
+        WHERE token_hash = ? AND user_id = ? AND used_at IS NULL AND expires_at > ?
+        RETURNING user_id
+    ''', (time.time(), reset_token_digest(payload['nonce']), payload['uid'], time.time())).fetchall()
+    if not used:
+        return False
+    # Token lain milik akun yang sama ikut tidak berlaku setelah password diganti
+    conn.execute('DELETE FROM password_reset_token WHERE user_id = ? AND used_at IS NULL', (payload['uid'],))
+    return True
+
+def validate_registration(email, name, nim, jurusan, password):
+    # Aturan yang sama dipakai oleh /register dan impor massal
+    if not all([email, name, nim, jurusan, password]):
+        return 'Semua kolom harus diisi!'
+    if '@' not in email or '.' not in email:
+        return 'Format email tidak valid.'
+    if not nim.isdigit() or len(nim) != 13:
+        return 'NIM harus 13 digit angka.'
+    return None
+
+IMPORT_COLUMNS = ('email', 'name', 'nim', 'jurusan', 'password')
+
+def import_students(conn, csv_file, hash_method=None, batch_size=None, workers=None, progress=None):
+    """Impor akun mahasiswa dari CSV (email,name,nim,jurusan,password) secara streaming.
+
+    Baris divalidasi dan diperiksa duplikatnya per batch, password di-hash paralel di beberapa
+    proses, lalu disimpan dengan executemany satu transaksi per batch. progress(report) dipanggil
+    setelah setiap batch tersimpan. Mengembalikan laporan {'inserted', 'rows', 'errors': [(nomor_baris, pesan), ...]}.
+    """
+    hash_method = (hash_method or current_app.config['BULK_IMPORT_HASH_METHOD']
+                   or current_app.config['PASSWORD_HASH_METHOD'])
+    batch_size = batch_size or current_app.config['BULK_IMPORT_BATCH_SIZE']
+    workers = workers or current_app.config['BULK_IMPORT_WORKERS']
+    report = {'inserted': 0, 'rows': 0, 'errors': []}
+
+    reader = csv.DictReader(csv_file)
+    missing_columns = [column for column in IMPORT_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing_columns:
+        report['errors'].append((1, f'Kolom wajib tidak ada: {", ".join(missing_columns)}'))
+        return report
+
+    seen_emails, seen_nims = set(), set()
+    hash_func = functools.partial(generate_password_hash, method=hash_method)
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        batch = []
+        # Baris 1 adalah header
+        for line_number, row in enumerate(reader, start=2):
+            report['rows'] += 1
+            values = tuple((row.get(column) or '').strip() for column in IMPORT_COLUMNS)
+            email, name, nim, jurusan, password = values
+            validation_error = validate_registration(email, name, nim, jurusan, password)
+            if validation_error:
+                report['errors'].append((line_number, validation_error))
+            elif email in seen_emails:
+                report['errors'].append((line_number, 'Email ganda di dalam file.'))
+            elif nim in seen_nims:
+                report['errors'].append((line_number, 'NIM ganda di dalam file.'))
+            else:
+                seen_emails.add(email)
+                seen_nims.add(nim)
+                batch.append((line_number, values))
+            if len(batch) >= batch_size:
+                _insert_import_batch(conn, executor, workers, hash_func, batch, report)
+                batch = []
+                if progress is not None:
+                    progress(report)
+        if batch:
+            _insert_import_batch(conn, executor, workers, hash_func, batch, report)
+    report['errors'].sort()
+    return report
+
+def _insert_import_batch(conn, executor, workers, hash_func, batch, report):
+    emails = [values[0] for _, values in batch]
+    nims = [values[2] for _, values in batch]
+    email_placeholders = ','.join('?' * len(emails))
+    nim_placeholders = ','.join('?' * len(nims))
+    existing_emails = {row['email'] for row in conn.execute(
+        f'SELECT email FROM users WHERE email IN ({email_placeholders})', emails)}
+    existing_nims = {row['nim'] for row in conn.execute(
+        f'SELECT nim FROM users WHERE nim IN ({nim_placeholders})', nims)}
+
+    accepted = []
+    for line_number, values in batch:
+        if values[0] in existing_emails:
+            report['errors'].append((line_number, 'Email ini sudah terdaftar.'))
+        elif values[2] in existing_nims:
+            report['errors'].append((line_number, 'NIM ini sudah terdaftar.'))
+        else:
+            accepted.append((line_number, values))
+
+    chunksize = max(1, len(accepted) // (workers * 4))
+    password_hashes = list(executor.map(hash_func, [values[4] for _, values in accepted], chunksize=chunksize))
+    rows = [values[:4] + (password_hash,) for (_, values), password_hash in zip(accepted, password_hashes)]
+    insert_sql = 'INSERT INTO users (email, name, nim, jurusan, password_hash, is_admin) VALUES (?, ?, ?, ?, ?, 0)'
+    try:
+        conn.executemany(insert_sql, rows)
+        conn.commit()
+        report['inserted'] += len(rows)
+        return
+    except sqlite3.IntegrityError:
+        # Email/NIM didaftarkan orang lain setelah pengecekan di atas: ulangi per baris agar hanya baris itu yang gagal
+        conn.rollback()
+    for (line_number, _), row in zip(accepted, rows):
+        try:
+            conn.execute(insert_sql, row)
+            report['inserted'] += 1
+        except sqlite3.IntegrityError as e:
+            report['errors'].append((line_number, 'NIM ini sudah terdaftar.' if 'users.nim' in str(e)
+                                     else 'Email ini sudah terdaftar.'))
+    conn.commit()
+
+def run_import_job(app, job_id, path):
+    # Dijalankan di thread latar; progres dan hasil disimpan di tabel import_job agar bisa dibaca worker mana pun
+    with app.app_context():
+        conn = get_db_connection()
+        latest = {'inserted': 0, 'rows': 0, 'errors': []}
+
+        def save_progress(report):
+            latest.update(report)
+            conn.execute('UPDATE import_job SET rows = ?, inserted = ?, error_count = ?, updated_at = ? WHERE id = ?',
+                         (report['rows'], report['inserted'], len(report['errors']), time.time(), job_id))
+            conn.commit()
+
+        status, message = 'done', None
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as csv_file:
+                latest = import_students(conn, csv_file, batch_size=app.config['BULK_IMPORT_JOB_BATCH_SIZE'],
+                                         progress=save_progress)
+        except UnicodeDecodeError:
+            status, message = 'failed', 'File harus berupa CSV dengan encoding UTF-8.'
+        except Exception:
+            app.logger.exception('Impor akun (job %s) gagal', job_id)
+            status, message = 'failed', 'Terjadi kesalahan saat mengimpor. Baris yang sudah tersimpan tetap ada.'
+        finally:
+            conn.rollback()
+            os.remove(path)
+        email_negative_cache.clear()
+        conn.execute('''
+            UPDATE import_job SET status = ?, message = ?, rows = ?, inserted = ?, error_count = ?, errors = ?, updated_at = ?
+            WHERE id = ?
+        ''', (status, message, latest['rows'], latest['inserted'], len(latest['errors']),
+              json.dumps(sorted(latest['errors'])), time.time(), job_id))
+        conn.commit()
+
+def start_import_job(uploaded):
+    """Simpan file unggahan lalu impor di thread latar; mengembalikan id job."""
+    app = current_app._get_current_object()
+    directory = os.path.join(app.instance_path, 'imports')
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{secrets.token_hex(8)}.csv')
+    uploaded.save(path)
     conn = get_db_connection()
+    now = time.time()
+    job_id = conn.execute("INSERT INTO import_job (status, created_at, updated_at) VALUES ('running', ?, ?)",
+                          (now, now)).lastrowid
+    conn.commit()
+    threading.Thread(target=run_import_job, args=(app, job_id, path), name=f'import-job-{job_id}', daemon=True).start()
+    return job_id
+
+# Jam pendaftaran dalam WIB sebagai kunci histogram, mis. '2024-08-17 09:00'
+ANALYTICS_HOUR_SQL = "strftime('%Y-%m-%d %H:00', {column}, '+7 hours')"
+
+# Tabel analitik -> (kolom kunci, agregat penuh dari data mentah); dipakai saat migrasi dan oleh `flask verify-analytics`
+ANALYTICS_SOURCES = {
+    'analytics_jurusan_activity': (('jurusan', 'activity'), '''
+        SELECT COALESCE(u.jurusan, ''), sa.activity, COUNT(*)
+        FROM selection_activity sa
+        JOIN user_final_selection s ON s.id = sa.selection_id
+        JOIN users u ON u.id = s.user_id
+        GROUP BY 1, 2
+    '''),
+    'analytics_activity_pair': (('activity_a', 'activity_b'), '''
+        SELECT a.activity, b.activity, COUNT(*)
+        FROM selection_activity a JOIN selection_activity b ON b.selection_id = a.selection_id AND a.activity < b.activity
+        GROUP BY 1, 2
+    '''),
+    'analytics_submission_hour': (('hour_wib',), f'''
+        SELECT {ANALYTICS_HOUR_SQL.format(column='submission_date')}, COUNT(*)
+        FROM user_final_selection WHERE {ANALYTICS_HOUR_SQL.format(column='submission_date')} IS NOT NULL
+        GROUP BY 1
+    '''),
+}
+
+def _schema_v1(conn):
+    # Skema awal; IF NOT EXISTS agar database yang dibuat sebelum ada versi skema ikut tercatat sebagai versi 1
     conn.execute('''
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -93,15 +1341,1119 @@ def init_db():
         CREATE TABLE IF NOT EXISTS user_final_selection (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL UNIQUE,
-            selected_activities TEXT NOT NULL,
             submission_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
         )
     ''')
-    conn.commit()
-    conn.close()
+    # Satu baris per kegiatan yang dipilih, menggantikan kolom JSON selected_activities
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS selection_activity (
+            selection_id INTEGER NOT NULL,
+            activity TEXT NOT NULL,
+            PRIMARY KEY (selection_id, activity),
+            FOREIGN KEY (selection_id) REFERENCES user_final_selection (id) ON DELETE CASCADE
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_selection_activity_activity ON selection_activity (activity)')
+    # Indeks untuk pagination keyset pada daftar pilihan dan daftar pengguna admin
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_selection_submission ON user_final_selection (submission_date, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_admin_name ON users (is_admin, name, id)')
+    # Jumlah peserta per kegiatan yang selalu diperbarui bersama penulisan pilihan
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS activity_counter (
+            activity TEXT PRIMARY KEY,
+            participant_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_session (
+            sid TEXT PRIMARY KEY,
+            user_id INTEGER,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_session_user ON user_session (user_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_session_expires ON user_session (expires_at)')
+    migrate_selection_json(conn)
+    counters_missing = conn.execute('SELECT COUNT(*) FROM activity_counter').fetchone()[0] < len(ACTIVITIES)
+    if counters_missing:
+        verify_activity_counters(conn, repair=True)
+
+def _schema_v2_user_search(conn):
+    # Indeks FTS5 untuk pencarian admin; isi diambil dari tabel users (external content) dan disinkronkan trigger.
+    # Indeks prefix 2-4 huruf mencegah "user"* menggabungkan ribuan token berawalan sama (mis. user1..user99999)
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5(
+            name, email, nim, jurusan,
+            content='users', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3 4'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS users_search_insert AFTER INSERT ON users BEGIN
+            INSERT INTO user_search (rowid, name, email, nim, jurusan) VALUES (new.id, new.name, new.email, new.nim, new.jurusan);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS users_search_delete AFTER DELETE ON users BEGIN
+            INSERT INTO user_search (user_search, rowid, name, email, nim, jurusan) VALUES ('delete', old.id, old.name, old.email, old.nim, old.jurusan);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS users_search_update AFTER UPDATE OF name, email, nim, jurusan ON users BEGIN
+            INSERT INTO user_search (user_search, rowid, name, email, nim, jurusan) VALUES ('delete', old.id, old.name, old.email, old.nim, old.jurusan);
+            INSERT INTO user_search (rowid, name, email, nim, jurusan) VALUES (new.id, new.name, new.email, new.nim, new.jurusan);
+        END
+    ''')
+    # Bobot bm25 per kolom: nama paling penting, lalu NIM, email, jurusan
+    conn.execute("INSERT INTO user_search (user_search, rank) VALUES ('rank', 'bm25(10.0, 4.0, 6.0, 1.0)')")
+    conn.execute("INSERT INTO user_search (user_search) VALUES ('rebuild')")
+
+def _schema_v3_analytics(conn):
+    # Ringkasan analitik admin yang diperbarui trigger di transaksi yang sama dengan penulisan pilihan,
+    # sehingga halaman analitik hanya membaca puluhan/ratusan baris berapa pun jumlah pendaftar
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_jurusan_activity (
+            jurusan TEXT NOT NULL,
+            activity TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (jurusan, activity)
+        ) WITHOUT ROWID
+    ''')
+    # Pasangan disimpan sekali dengan activity_a < activity_b
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_activity_pair (
+            activity_a TEXT NOT NULL,
+            activity_b TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (activity_a, activity_b)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_submission_hour (
+            hour_wib TEXT PRIMARY KEY,
+            total INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS selection_activity_analytics_insert AFTER INSERT ON selection_activity BEGIN
+            INSERT INTO analytics_jurusan_activity (jurusan, activity, total)
+            SELECT COALESCE(u.jurusan, ''), new.activity, 1
+            FROM user_final_selection s JOIN users u ON u.id = s.user_id WHERE s.id = new.selection_id
+            ON CONFLICT (jurusan, activity) DO UPDATE SET total = total + 1;
+            INSERT INTO analytics_activity_pair (activity_a, activity_b, total)
+            SELECT min(other.activity, new.activity), max(other.activity, new.activity), 1
+            FROM selection_activity other WHERE other.selection_id = new.selection_id AND other.activity <> new.activity
+            ON CONFLICT (activity_a, activity_b) DO UPDATE SET total = total + 1;
+        END
+    ''')
+    # Baris dihapus satu per satu, jadi setiap pasangan dikurangi tepat sekali oleh baris yang dihapus lebih dulu
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS selection_activity_analytics_delete AFTER DELETE ON selection_activity BEGIN
+            UPDATE analytics_jurusan_activity SET total = total - 1
+            WHERE activity = old.activity AND jurusan = (
+                SELECT COALESCE(u.jurusan, '') FROM user_final_selection s JOIN users u ON u.id = s.user_id
+                WHERE s.id = old.selection_id);
+            UPDATE analytics_activity_pair SET total = total - 1
+            WHERE (activity_a, activity_b) IN (
+                SELECT min(other.activity, old.activity), max(other.activity, old.activity)
+                FROM selection_activity other WHERE other.selection_id = old.selection_id AND other.activity <> old.activity);
+        END
+    ''')
+    # Cascade FK menghapus baris induk sebelum anaknya; hapus anak lebih dulu agar trigger di atas masih bisa membaca jurusan
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS user_final_selection_delete_children BEFORE DELETE ON user_final_selection BEGIN
+            DELETE FROM selection_activity WHERE selection_id = old.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS users_delete_selection BEFORE DELETE ON users BEGIN
+            DELETE FROM user_final_selection WHERE user_id = old.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS users_jurusan_analytics AFTER UPDATE OF jurusan ON users
+        WHEN COALESCE(old.jurusan, '') <> COALESCE(new.jurusan, '') BEGIN
+            UPDATE analytics_jurusan_activity SET total = total - 1
+            WHERE jurusan = COALESCE(old.jurusan, '') AND activity IN (
+                SELECT sa.activity FROM user_final_selection s JOIN selection_activity sa ON sa.selection_id = s.id
+                WHERE s.user_id = new.id);
+            INSERT INTO analytics_jurusan_activity (jurusan, activity, total)
+            SELECT COALESCE(new.jurusan, ''), sa.activity, 1
+            FROM user_final_selection s JOIN selection_activity sa ON sa.selection_id = s.id WHERE s.user_id = new.id
+            ON CONFLICT (jurusan, activity) DO UPDATE SET total = total + 1;
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS user_final_selection_analytics_insert AFTER INSERT ON user_final_selection BEGIN
+            INSERT INTO analytics_submission_hour (hour_wib, total)
+            SELECT {ANALYTICS_HOUR_SQL.format(column='new.submission_date')}, 1
+            WHERE {ANALYTICS_HOUR_SQL.format(column='new.submission_date')} IS NOT NULL
+            ON CONFLICT (hour_wib) DO UPDATE SET total = total + 1;
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS user_final_selection_analytics_delete AFTER DELETE ON user_final_selection BEGIN
+            UPDATE analytics_submission_hour SET total = total - 1
+            WHERE hour_wib = {ANALYTICS_HOUR_SQL.format(column='old.submission_date')};
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS user_final_selection_analytics_update AFTER UPDATE OF submission_date ON user_final_selection
+        WHEN old.submission_date IS NOT new.submission_date BEGIN
+            UPDATE analytics_submission_hour SET total = total - 1
+            WHERE hour_wib = {ANALYTICS_HOUR_SQL.format(column='old.submission_date')};
+            INSERT INTO analytics_submission_hour (hour_wib, total)
+            SELECT {ANALYTICS_HOUR_SQL.format(column='new.submission_date')}, 1
+            WHERE {ANALYTICS_HOUR_SQL.format(column='new.submission_date')} IS NOT NULL
+            ON CONFLICT (hour_wib) DO UPDATE SET total = total + 1;
+        END
+    ''')
+    verify_analytics(conn, repair=True)
+
+def _schema_v4_rate_limit(conn):
+    # Dipakai RATE_LIMIT_BACKEND = 'sqlite'; arrival = waktu kedatangan teoretis berikutnya (detik epoch)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS rate_limit_bucket (
+            key TEXT PRIMARY KEY,
+            arrival REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+def _schema_v5_waitlist(conn):
+    # Daftar tunggu FIFO per kegiatan; urutan = rowid (id selalu lebih besar dari semua entri yang masih ada)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS activity_waitlist (
+            id INTEGER PRIMARY KEY,
+            activity TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (activity, user_id),
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    # Kepala antrean dan posisi (COUNT atas rentang indeks) per kegiatan
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_activity_waitlist_queue ON activity_waitlist (activity, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_activity_waitlist_user ON activity_waitlist (user_id)')
+
+def _schema_v6_password_reset(conn):
+    # Token reset password sekali pakai; baris yang sudah dipakai disimpan sampai kedaluwarsa agar pemakaian ulang ditolak
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS password_reset_token (
+            token_hash TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            expires_at REAL NOT NULL,
+            used_at REAL,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_password_reset_token_expires ON password_reset_token (expires_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_password_reset_token_user ON password_reset_token (user_id)')
+
+def _schema_v7_import_job(conn):
+    # Progres impor akun dari halaman admin; errors (JSON) baru diisi saat job selesai
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS import_job (
+            id INTEGER PRIMARY KEY,
+            status TEXT NOT NULL,
+            message TEXT,
+            rows INTEGER NOT NULL DEFAULT 0,
+            inserted INTEGER NOT NULL DEFAULT 0,
+            error_count INTEGER NOT NULL DEFAULT 0,
+            errors TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+
+# Migrasi berurutan; versi yang sudah diterapkan disimpan di PRAGMA user_version.
+# Tambahkan versi baru di akhir dan jangan ubah migrasi yang sudah dirilis.
+SCHEMA_MIGRATIONS = (
+    (1, _schema_v1),
+    (2, _schema_v2_user_search),
+    (3, _schema_v3_analytics),
+    (4, _schema_v4_rate_limit),
+    (5, _schema_v5_waitlist),
+    (6, _schema_v6_password_reset),
+    (7, _schema_v7_import_job),
+)
+
+@contextlib.contextmanager
+def file_lock(path):
+    # Kunci antar proses, mis. beberapa worker gunicorn yang boot bersamaan
+    with open(path, 'a') as lock_file:
+        try:
+            import fcntl
+        except ImportError: # Windows
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate_db(conn):
+    """Jalankan migrasi skema yang belum diterapkan; mengembalikan daftar versi yang baru dijalankan."""
+    latest = SCHEMA_MIGRATIONS[-1][0]
+    # Jalur cepat saat boot worker: satu PRAGMA, tanpa kunci
+    if schema_version(conn) >= latest:
+        return []
+    applied = []
+    with file_lock(current_app.config['DATABASE'] + '.migrate.lock'):
+        for version, migration in SCHEMA_MIGRATIONS:
+            # Diperiksa ulang setelah kunci didapat; worker lain mungkin sudah menjalankannya
+            if version <= schema_version(conn):
+                continue
+            begin_immediate(conn)
+            try:
+                migration(conn)
+                conn.execute(f'PRAGMA user_version = {version}')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied.append(version)
+    return applied
+
+def init_db():
+    return migrate_db(get_db_connection())
+
+def migrate_selection_json(conn):
+    # Database lama menyimpan pilihan sebagai JSON string; pindahkan ke selection_activity lalu buang kolomnya
+    columns = [row['name'] for row in conn.execute('PRAGMA table_info(user_final_selection)')]
+    if 'selected_activities' not in columns:
+        return
+    conn.execute('''
+        INSERT OR IGNORE INTO selection_activity (selection_id, activity)
+        SELECT ufs.id, je.value
+        FROM (SELECT id, selected_activities FROM user_final_selection
+              WHERE json_valid(selected_activities)) ufs, json_each(ufs.selected_activities) je
+        ORDER BY ufs.id, je.key
+    ''')
+    conn.execute('ALTER TABLE user_final_selection DROP COLUMN selected_activities')
+
+def fetch_activity_counts(conn):
+    counts = {activity_name: 0 for activity_name in ACTIVITIES.keys()}
+    rows = conn.execute('SELECT activity, participant_count FROM activity_counter').fetchall()
+    for row in rows:
+        if row['activity'] in counts:
+            counts[row['activity']] = row['participant_count']
+    return counts
+
+def verify_activity_counters(conn, repair=False):
+    # Bandingkan activity_counter dengan hitungan sebenarnya; kembalikan {kegiatan: (tersimpan, sebenarnya)} yang berbeda
+    actual = {activity_name: 0 for activity_name in ACTIVITIES.keys()}
+    for row in conn.execute('SELECT activity, COUNT(*) AS total FROM selection_activity GROUP BY activity'):
+        if row['activity'] in actual:
+            actual[row['activity']] = row['total']
+    stored = {row['activity']: row['participant_count']
+              for row in conn.execute('SELECT activity, participant_count FROM activity_counter')}
+
+    drift = {}
+    for activity_name, total in actual.items():
+        if stored.get(activity_name) != total:
+            drift[activity_name] = (stored.get(activity_name), total)
+
+    if repair and drift:
+        conn.executemany('''
+            INSERT INTO activity_counter (activity, participant_count) VALUES (?, ?)
+            ON CONFLICT (activity) DO UPDATE SET participant_count = excluded.participant_count
+        ''', [(activity_name, actual[activity_name]) for activity_name in drift])
+    return drift
+
+def verify_analytics(conn, repair=False):
+    # Bandingkan tabel analitik dengan agregat dari data mentah; kembalikan {tabel: jumlah kunci yang berbeda}
+    drift = {}
+    for table, (key_columns, query) in ANALYTICS_SOURCES.items():
+        columns = ', '.join(key_columns)
+        actual = {tuple(row[:-1]): row[-1] for row in conn.execute(query)}
+        stored = {tuple(row[:-1]): row[-1] for row in conn.execute(f'SELECT {columns}, total FROM {table} WHERE total <> 0')}
+        differing = sum(1 for key in actual.keys() | stored.keys() if actual.get(key) != stored.get(key))
+        if not differing:
+            continue
+        drift[table] = differing
+        if repair:
+            conn.execute(f'DELETE FROM {table}')
+            conn.execute(f'INSERT INTO {table} ({columns}, total) {query}')
+    return drift
+
+def fetch_analytics(conn):
+    """Cross-tab jurusan x kegiatan, pasangan kegiatan yang dipilih bersama, dan jumlah pendaftaran per jam WIB."""
+    crosstab = {}
+    for row in conn.execute('SELECT jurusan, activity, total FROM analytics_jurusan_activity WHERE total > 0'):
+        crosstab.setdefault(row['jurusan'], {})[row['activity']] = row['total']
+    jurusan_names = JURUSAN_LIST + sorted(name for name in crosstab if name not in JURUSAN_LIST)
+    activities = list(ACTIVITIES) + sorted({name for counts in crosstab.values() for name in counts} - set(ACTIVITIES))
+    jurusan_activity = {jurusan: {activity: crosstab.get(jurusan, {}).get(activity, 0) for activity in activities}
+                        for jurusan in jurusan_names}
+
+    pairs = [{'activities': [row['activity_a'], row['activity_b']], 'total': row['total']}
+             for row in conn.execute('''
+                 SELECT activity_a, activity_b, total FROM analytics_activity_pair
+                 WHERE total > 0 ORDER BY total DESC, activity_a, activity_b
+             ''')]
+
+    timeline = [{'hour_wib': row['hour_wib'], 'total': row['total']}
+                for row in conn.execute('SELECT hour_wib, total FROM analytics_submission_hour WHERE total > 0 ORDER BY hour_wib')]
+    by_hour_of_day = [0] * 24
+    for bucket in timeline:
+        by_hour_of_day[int(bucket['hour_wib'][11:13])] += bucket['total']
+
+    return {
+        'total_selections': sum(by_hour_of_day),
+        'jurusan': jurusan_names,
+        'activities': activities,
+        'jurusan_activity': jurusan_activity,
+        'jurusan_totals': {jurusan: sum(counts.values()) for jurusan, counts in jurusan_activity.items()},
+        'activity_totals': {activity: sum(counts[activity] for counts in jurusan_activity.values()) for activity in activities},
+        'activity_pairs': pairs,
+        'submissions_per_hour': timeline,
+        'submissions_by_hour_of_day': by_hour_of_day,
+    }
+
+def adjust_activity_counters(conn, activities, delta):
+    conn.executemany('UPDATE activity_counter SET participant_count = participant_count + ? WHERE activity = ?',
+                     [(delta, activity) for activity in activities])
+
+class ActivityFullError(Exception):
+    def __init__(self, activities):
+        super().__init__(', '.join(activities))
+        self.activities = activities
+
+def reserve_seats(conn, activities):
+    # Penambahan hanya berhasil jika masih ada kursi; kegiatan yang penuh dikembalikan ke pemanggil
+    full_activities = []
+    for activity in activities:
+        cursor = conn.execute('''
+            UPDATE activity_counter SET participant_count = participant_count + 1
+            WHERE activity = ? AND participant_count < ?
+        ''', (activity, ACTIVITIES[activity]['capacity']))
+        if cursor.rowcount == 0:
+            full_activities.append(activity)
+    return full_activities
+
+def fetch_selected_activities(conn, selection_ids):
+    # Mengembalikan {selection_id: [kegiatan, ...]} dengan urutan sesuai saat disimpan
+    selection_ids = list(selection_ids)
+    if not selection_ids:
+        return {}
+    placeholders = ','.join('?' * len(selection_ids))
+    rows = conn.execute(f'SELECT selection_id, activity FROM selection_activity WHERE selection_id IN ({placeholders}) ORDER BY rowid',
+                        selection_ids).fetchall()
+    activities_by_selection = {}
+    for row in rows:
+        activities_by_selection.setdefault(row['selection_id'], []).append(row['activity'])
+    return activities_by_selection
+
+def read_selection_filters(args):
+    # Nilai filter yang tidak dikenal diabaikan agar tidak menghasilkan query yang tidak memakai indeks
+    activity = args.get('activity') or None
+    jurusan = args.get('jurusan') or None
+    nim_prefix = (args.get('nim') or '').strip()
+    return {
+        'activity': activity if activity in ACTIVITIES else None,
+        'jurusan': jurusan if jurusan in JURUSAN_LIST else None,
+        'nim': nim_prefix if nim_prefix.isdigit() and len(nim_prefix) <= 13 else None,
+    }
+
+def encode_page_cursor(*values):
+    return '|'.join(str(value) for value in values)
+
+def decode_page_cursor(raw):
+    # Cursor berbentuk "<nilai urut>|<id>"; cursor rusak dianggap halaman pertama
+    if not raw or '|' not in raw:
+        return None
+    sort_value, row_id = raw.rsplit('|', 1)
+    try:
+        return sort_value, int(row_id)
+    except ValueError:
+        return None
+
+def build_selection_where(filters, cursor=None, include_admins=True):
+    conditions, params = [], []
+    if not include_admins:
+        conditions.append('u.is_admin = 0')
+    if cursor:
+        conditions.append('(ufs.submission_date, ufs.id) < (?, ?)')
+        params.extend(cursor)
+    if filters.get('activity'):
+        conditions.append('EXISTS (SELECT 1 FROM selection_activity sa WHERE sa.selection_id = ufs.id AND sa.activity = ?)')
+        params.append(filters['activity'])
+    if filters.get('jurusan'):
+        conditions.append('u.jurusan = ?')
+        params.append(filters['jurusan'])
+    if filters.get('nim'):
+        # Rentang [prefix, prefix berikutnya) agar pencarian awalan NIM memakai indeks UNIQUE pada nim
+        prefix = filters['nim']
+        conditions.append('u.nim >= ? AND u.nim < ?')
+        params.extend([prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)])
+    where_clause = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+    return where_clause, params
+
+def fetch_selection_page(conn, filters, cursor=None, include_admins=True, page_size=None):
+    # Pagination keyset pada (submission_date, id) terbaru lebih dulu; mengembalikan (baris, cursor berikutnya)
+    page_size = page_size or current_app.config['PAGE_SIZE']
+    where_clause, params = build_selection_where(filters, cursor=cursor, include_admins=include_admins)
+    rows = conn.execute(f'''
+        SELECT ufs.id, u.name AS user_name, u.email, u.nim, u.jurusan, ufs.submission_date
+        FROM user_final_selection ufs
+        JOIN users u ON ufs.user_id = u.id
+        {where_clause}
+        ORDER BY ufs.submission_date DESC, ufs.id DESC
+        LIMIT ?
+    ''', params + [page_size + 1]).fetchall()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_page_cursor(rows[-1]['submission_date'], rows[-1]['id'])
+
+    activities_by_selection = fetch_selected_activities(conn, [row['id'] for row in rows])
+    submission_dates_wib = convert_utc_to_wib_batch([row['submission_date'] for row in rows])
+    selections = []
+    for row, submission_date_wib in zip(rows, submission_dates_wib):
+        selection_dict = dict(row)
+        selection_dict['selected_activities'] = activities_by_selection.get(selection_dict['id'], [])
+        selection_dict['submission_date_wib'] = submission_date_wib
+        selections.append(selection_dict)
+    return selections, next_cursor
+
+# Sel yang diawali karakter ini dijalankan sebagai formula oleh Excel/LibreOffice (CSV injection)
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def csv_safe_cell(value):
+    # Awalan ' membuat spreadsheet menampilkan isi sel sebagai teks biasa
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def iter_selection_export_rows(conn, filters):
+    # Baris dibaca langsung dari cursor SQLite satu per satu sehingga memori tetap konstan
+    where_clause, params = build_selection_where(filters)
+    cursor = conn.execute(f'''
+        SELECT ufs.id, u.name, u.email, u.nim, u.jurusan, ufs.submission_date,
+               (SELECT group_concat(sa.activity, '; ') FROM selection_activity sa WHERE sa.selection_id = ufs.id) AS activities
+        FROM user_final_selection ufs
+        JOIN users u ON ufs.user_id = u.id
+        {where_clause}
+        ORDER BY ufs.submission_date DESC, ufs.id DESC
+    ''', params)
+    while True:
+        rows = cursor.fetchmany(500)
+        if not rows:
+            break
+        submission_dates_wib = convert_utc_to_wib_batch([row['submission_date'] for row in rows])
+        for row, submission_date_wib in zip(rows, submission_dates_wib):
+            yield (row['id'], row['name'], row['email'], row['nim'], row['jurusan'],
+                   row['activities'] or '', submission_date_wib)
+
+def fetch_user_page(conn, cursor=None, page_size=None):
+    # Pagination keyset pada (name, id) untuk pengguna non-admin
+    page_size = page_size or current_app.config['PAGE_SIZE']
+    params = []
+    cursor_clause = ''
+    if cursor:
+        cursor_clause = 'AND (name, id) > (?, ?)'
+        params.extend(cursor)
+    rows = conn.execute(f'''
+        SELECT id, email, name, nim, jurusan, is_admin FROM users
+        WHERE is_admin = 0 {cursor_clause}
+        ORDER BY name ASC, id ASC
+        LIMIT ?
+    ''', params + [page_size + 1]).fetchall()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_page_cursor(rows[-1]['name'], rows[-1]['id'])
+    return rows, next_cursor
+
+_SEARCH_TOKEN_RE = re.compile(r'\w+')
+
+def build_search_match(text, min_prefix=3):
+    # Setiap kata dijadikan prefix query yang di-quote, jadi input admin tidak bisa memakai sintaks FTS5 mentah.
+    # Kata pendek (mis. "a") hanya dicocokkan utuh; sebagai awalan ia cocok dengan hampir semua pengguna
+    tokens = _SEARCH_TOKEN_RE.findall(text.lower())[:8]
+    return ' '.join(f'"{token}"*' if len(token) >= min_prefix else f'"{token}"' for token in tokens)
+
+def search_users(conn, query, cursor=None, limit=None):
+    """Cari pengguna berdasarkan nama, email, NIM, atau jurusan.
+
+    Query yang seluruhnya angka dianggap awalan NIM dan dilayani indeks UNIQUE pada nim (urut NIM);
+    selain itu memakai FTS5 yang diurutkan bm25 (rank) di dalam tabel FTS, sehingga hanya satu halaman
+    yang di-join ke users. Jika kecocokan lebih dari SEARCH_MAX_RANKED, hasil diurutkan per id tanpa
+    peringkat (mode 'fulltext_unranked'). Mengembalikan (baris, cursor berikutnya, mode).
+    """
+    limit = limit or current_app.config['PAGE_SIZE']
+    query = query.strip()
+    if query.isdigit() and len(query) <= 13:
+        mode = 'nim'
+        params = [query, query[:-1] + chr(ord(query[-1]) + 1)]
+        cursor_clause = ''
+        if cursor:
+            cursor_clause = 'AND u.nim > ?'
+            params.append(cursor[0])
+        rows = conn.execute(f'''
+            SELECT u.id, u.name, u.email, u.nim, u.jurusan, u.is_admin, NULL AS score,
+                   ufs.id AS selection_id, ufs.submission_date
+            FROM users u
+            LEFT JOIN user_final_selection ufs ON ufs.user_id = u.id
+            WHERE u.nim >= ? AND u.nim < ? {cursor_clause}
+            ORDER BY u.nim
+            LIMIT ?
+        ''', params + [limit + 1]).fetchall()
+    else:
+        mode = 'fulltext'
+        match = build_search_match(query, current_app.config['SEARCH_MIN_PREFIX'])
+        if not match:
+            return [], None, mode
+        max_ranked = current_app.config['SEARCH_MAX_RANKED']
+        # Menghitung paling banyak max_ranked + 1 kecocokan tanpa bm25 jauh lebih murah daripada memberi peringkat semuanya
+        matches = conn.execute('SELECT COUNT(*) FROM (SELECT 1 FROM user_search WHERE user_search MATCH ? LIMIT ?)',
+                               (match, max_ranked + 1)).fetchone()[0]
+        if matches > max_ranked:
+            mode = 'fulltext_unranked'
+        params = [match]
+        cursor_clause = ''
+        if cursor and mode == 'fulltext_unranked':
+            try:
+                params.append(int(cursor[-1]))
+                cursor_clause = 'AND rowid > ?'
+            except ValueError:
+                pass
+        elif cursor:
+            try:
+                params.extend([float(cursor[0]), cursor[1]])
+                cursor_clause = 'AND (rank, rowid) > (?, ?)'
+            except ValueError:
+                pass
+        if mode == 'fulltext_unranked':
+            rows = conn.execute(f'''
+                SELECT u.id, u.name, u.email, u.nim, u.jurusan, u.is_admin, NULL AS score,
+                       ufs.id AS selection_id, ufs.submission_date
+                FROM (SELECT rowid AS id FROM user_search
+                      WHERE user_search MATCH ? {cursor_clause}
+                      ORDER BY rowid
+                      LIMIT ?) m
+                JOIN users u ON u.id = m.id
+                LEFT JOIN user_final_selection ufs ON ufs.user_id = u.id
+                ORDER BY m.id
+            ''', params + [limit + 1]).fetchall()
+        else:
+            rows = conn.execute(f'''
+                SELECT u.id, u.name, u.email, u.nim, u.jurusan, u.is_admin, m.score,
+                       ufs.id AS selection_id, ufs.submission_date
+                FROM (SELECT rowid AS id, rank AS score FROM user_search
+                      WHERE user_search MATCH ? {cursor_clause}
+                      ORDER BY rank, rowid
+                      LIMIT ?) m
+                JOIN users u ON u.id = m.id
+                LEFT JOIN user_final_selection ufs ON ufs.user_id = u.id
+                ORDER BY m.score, m.id
+            ''', params + [limit + 1]).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if mode == 'nim':
+            next_cursor = encode_page_cursor(last['nim'], last['id'])
+        elif mode == 'fulltext_unranked':
+            next_cursor = encode_page_cursor('', last['id'])
+        else:
+            next_cursor = encode_page_cursor(repr(last['score']), last['id'])
+    return rows, next_cursor, mode
+
+def save_selected_activities(conn, selection_id, activities):
+    # Dipanggil di dalam transaksi pemanggil sehingga activity_counter ikut ter-commit/rollback.
+    # Hanya kegiatan yang baru ditambahkan yang dicek kuotanya; pemanggil wajib rollback jika ActivityFullError.
+    # Kursi yang dilepas langsung diisi dari daftar tunggu; mengembalikan hasil promote_waitlist.
+    old_activities = fetch_selected_activities(conn, [selection_id]).get(selection_id, [])
+    removed_activities = [activity for activity in old_activities if activity not in activities]
+    added_activities = [activity for activity in activities if activity not in old_activities]
+    adjust_activity_counters(conn, removed_activities, -1)
+    full_activities = reserve_seats(conn, added_activities)
+    if full_activities:
+        raise ActivityFullError(full_activities)
+    conn.execute('DELETE FROM selection_activity WHERE selection_id = ?', (selection_id,))
+    conn.executemany('INSERT INTO selection_activity (selection_id, activity) VALUES (?, ?)',
+                     [(selection_id, activity) for activity in activities])
+    if added_activities:
+        # Kegiatan yang sudah didapat tidak perlu ditunggu lagi
+        placeholders = ','.join('?' * len(added_activities))
+        conn.execute(f'''
+            DELETE FROM activity_waitlist WHERE activity IN ({placeholders})
+            AND user_id = (SELECT user_id FROM user_final_selection WHERE id = ?)
+        ''', (*added_activities, selection_id))
+    return promote_waitlist(conn, removed_activities)
+
+def promote_waitlist(conn, activities):
+    # Dipanggil di transaksi penulisan yang mengosongkan kursi, sehingga kursi itu tidak pernah terlihat kosong oleh
+    # pendaftar lain. Entri yang tidak lagi memenuhi syarat (tidak punya pilihan atau sudah 3 kegiatan) dibuang tanpa
+    # memakai kursi; promosi hanya menambah kegiatan ke pilihan yang sudah dikonfirmasi, tidak pernah membuat pilihan baru.
+    # Mengembalikan [(kegiatan, user_id), ...] sesuai urutan promosi.
+    promoted = []
+    for activity in activities:
+        capacity = ACTIVITIES[activity]['capacity']
+        while conn.execute('SELECT participant_count FROM activity_counter WHERE activity = ?',
+                           (activity,)).fetchone()[0] < capacity:
+            entry = conn.execute('''
+                DELETE FROM activity_waitlist
+                WHERE id = (SELECT id FROM activity_waitlist WHERE activity = ? ORDER BY id LIMIT 1)
+                RETURNING user_id
+            ''', (activity,)).fetchall()
+            if not entry:
+                break
+            user_id = entry[0]['user_id']
+            selection = conn.execute('SELECT id FROM user_final_selection WHERE user_id = ?', (user_id,)).fetchone()
+            if selection is None:
+                continue
+            selection_id = selection['id']
+            current = fetch_selected_activities(conn, [selection_id]).get(selection_id, [])
+            if activity in current or len(current) >= 3:
+                continue
+            reserve_seats(conn, [activity])
+            conn.execute('INSERT INTO selection_activity (selection_id, activity) VALUES (?, ?)', (selection_id, activity))
+            promoted.append((activity, user_id))
+    return promoted
+
+def fetch_waitlist_positions(conn, user_id):
+    # {kegiatan: {'position': urutan (1 = berikutnya), 'waiting': panjang antrean}}; dua COUNT atas indeks antrean
+    rows = conn.execute('''
+        SELECT w.activity,
+               (SELECT COUNT(*) FROM activity_waitlist ahead WHERE ahead.activity = w.activity AND ahead.id <= w.id) AS position,
+               (SELECT COUNT(*) FROM activity_waitlist queue WHERE queue.activity = w.activity) AS waiting
+        FROM activity_waitlist w WHERE w.user_id = ? ORDER BY w.id
+    ''', (user_id,)).fetchall()
+    return {row['activity']: {'position': row['position'], 'waiting': row['waiting']} for row in rows}
+
+def fetch_waitlist_lengths(conn):
+    return {row['activity']: row['waiting']
+            for row in conn.execute('SELECT activity, COUNT(*) AS waiting FROM activity_waitlist GROUP BY activity')}
+
+def begin_immediate(conn, retries=5):
+    # Ambil write lock di awal transaksi; busy_timeout sudah menunggu, ini cadangan saat antrean sangat panjang
+    for attempt in range(retries):
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            return
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) and 'busy' not in str(e):
+                raise
+            if attempt == retries - 1:
+                raise
+            time.sleep(0.05 * (2 ** attempt))
+
+def enroll_user(conn, user_id, activities):
+    # Simpan pilihan dan pesan kursi untuk semua kegiatan dalam satu transaksi
+    begin_immediate(conn)
+    try:
+        cursor = conn.execute('INSERT INTO user_final_selection (user_id) VALUES (?)', (user_id,))
+        save_selected_activities(conn, cursor.lastrowid, activities)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    selection_changed()
+
+class PendingEnrollment:
+    __slots__ = ('user_id', 'activities', 'done', 'error')
+
+    def __init__(self, user_id, activities):
+        self.user_id = user_id
+        self.activities = activities
+        self.done = threading.Event()
+        self.error = None
+
+class SelectionWriter:
+    """Group commit: satu thread penulis meng-commit konfirmasi pilihan dalam batch kecil (satu commit/fsync per batch)."""
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._stats = {'batches': 0, 'enrollments': 0, 'rejected': 0, 'failed_batches': 0, 'largest_batch': 0}
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                # Antrean dibuat ulang per proses; kunci internalnya tidak aman dibawa melewati fork
+                if self._pid != os.getpid():
+                    self._queue = queue.SimpleQueue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='selection-writer', daemon=True)
+                self._thread.start()
+            return self._queue
+
+    def enroll(self, user_id, activities):
+        """Padanan enroll_user lewat group commit; memblokir sampai batch berisi pilihan ini di-commit.
+
+        Kesalahan per pilihan (ActivityFullError, sqlite3.IntegrityError untuk pilihan ganda) dilempar ke pemanggil
+        seperti pada enroll_user, tanpa membatalkan pilihan lain di batch yang sama.
+        """
+        pending = PendingEnrollment(user_id, list(activities))
+        self._ensure_thread().put(pending)
+        if not pending.done.wait(self.app.config['SELECTION_COMMIT_TIMEOUT']):
+            raise TimeoutError('Pilihan belum selesai disimpan.')
+        if pending.error is not None:
+            raise pending.error
+
+    def _run(self):
+        pending_queue = self._queue
+        while True:
+            batch = [pending_queue.get()]
+            # Tunggu sebentar agar konfirmasi yang datang bersamaan ikut di-commit sekaligus
+            deadline = time.monotonic() + self.app.config['SELECTION_BATCH_WAIT_MS'] / 1000.0
+            while len(batch) < self.app.config['SELECTION_BATCH_MAX']:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(pending_queue.get(timeout=remaining) if remaining > 0 else pending_queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch):
+        enrolled, failed = 0, False
+        try:
+            with self.app.app_context():
+                conn = get_db_connection()
+                begin_immediate(conn)
+                try:
+                    for pending in batch:
+                        # Savepoint per pilihan: yang gagal dibatalkan sendiri, sisanya tetap ikut commit
+                        conn.execute('SAVEPOINT enroll')
+                        try:
+                            cursor = conn.execute('INSERT INTO user_final_selection (user_id) VALUES (?)', (pending.user_id,))
+                            save_selected_activities(conn, cursor.lastrowid, pending.activities)
+                            enrolled += 1
+                        except Exception as e:
+                            conn.execute('ROLLBACK TO enroll')
+                            pending.error = e
+                        conn.execute('RELEASE enroll')
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                if enrolled:
+                    selection_changed()
+        except Exception as e:
+            self.app.logger.exception('Group commit pilihan kegiatan gagal (%d pilihan)', len(batch))
+            enrolled, failed = 0, True
+            for pending in batch:
+                pending.error = e
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['enrollments'] += enrolled
+            self._stats['rejected'] += len(batch) - enrolled
+            self._stats['failed_batches'] += int(failed)
+            self._stats['largest_batch'] = max(self._stats['largest_batch'], len(batch))
+        # Request baru dilepas setelah commit selesai, jadi pilihan yang dilaporkan berhasil sudah tersimpan
+        for pending in batch:
+            pending.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'enabled': self.app.config['SELECTION_GROUP_COMMIT'],
+                    'batch_max': self.app.config['SELECTION_BATCH_MAX'],
+                    'batch_wait_ms': self.app.config['SELECTION_BATCH_WAIT_MS']}
+
+selection_writer = LocalProxy(lambda: current_app.extensions['kegiatan']['selection_writer'])
 
-@app.route('/register', methods=['GET', 'POST'])
+class CatalogCache:
+    """Katalog kegiatan beserta jumlah peserta, disimpan di memori proses selama TTL."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entry = None
+        self._expires_at = 0.0
+
+    def get(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._entry is not None and now < self._expires_at:
+                return self._entry
+        entry = self._build()
+        with self._lock:
+            # Last-Modified hanya bergeser jika isi katalog benar-benar berubah
+            if self._entry is not None and self._entry['etag'] == entry['etag']:
+                entry['last_modified'] = self._entry['last_modified']
+            self._entry = entry
+            self._expires_at = now + current_app.config['CATALOG_CACHE_TTL']
+        return entry
+
+    def invalidate(self):
+        with self._lock:
+            self._expires_at = 0.0
+
+    def _build(self):
+        counts = fetch_activity_counts(get_db_connection())
+        activities = []
+        for name, data in ACTIVITIES.items():
+            participant_count = counts.get(name, 0)
+            activities.append({
+                'name': name,
+                **data,
+                'participant_count': participant_count,
+                'seats_left': max(0, data['capacity'] - participant_count),
+            })
+        body = json.dumps({'activities': activities}, ensure_ascii=False, sort_keys=True)
+        return {
+            'counts': counts,
+            'body': body,
+            'etag': hashlib.sha1(body.encode('utf-8')).hexdigest(),
+            'last_modified': datetime.now(timezone.utc).replace(microsecond=0),
+        }
+
+catalog_cache = LocalProxy(lambda: current_app.extensions['kegiatan']['catalog_cache'])
+
+class SeatBroadcaster:
+    """Satu thread penerbit yang membaca counter sekali dan membagikan delta ke semua stream SSE."""
+
+    def __init__(self, app):
+        self.app = app
+        self._condition = threading.Condition()
+        self._dirty = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._counts = None
+        self._version = 0
+        self._delta = {}
+        self._listeners = []
+        self.watchers = 0
+
+    def _ensure_thread(self):
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='seat-broadcaster', daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        # Murah dan tidak memblokir; pembacaan counter dilakukan di thread penerbit
+        with self._condition:
+            if self.watchers == 0:
+                self._counts = None
+                return
+            self._ensure_thread()
+        self._dirty.set()
+
+    def _run(self):
+        while True:
+            woke = self._dirty.wait(self.app.config['SEAT_STREAM_RESYNC'])
+            if woke:
+                time.sleep(self.app.config['SEAT_STREAM_COALESCE'])
+            self._dirty.clear()
+            with self._condition:
+                if self.watchers == 0:
+                    continue
+            try:
+                with self.app.app_context():
+                    counts = fetch_activity_counts(get_db_connection())
+            except sqlite3.Error as e:
+                self.app.logger.warning('Gagal membaca counter untuk stream kursi: %s', e)
+                continue
+            self._publish(counts)
+
+    def _publish(self, counts):
+        with self._condition:
+            previous = self._counts or {}
+            delta = {name: seat_payload(name, count) for name, count in counts.items() if previous.get(name) != count}
+            self._counts = counts
+            if not delta:
+                return
+            self._version += 1
+            self._delta = delta
+            self._condition.notify_all()
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback()
+
+    def add_listener(self, callback):
+        # Callback dipanggil dari thread penerbit setiap ada versi baru; dipakai stream async di mode ASGI
+        with self._condition:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._condition:
+            self._listeners.remove(callback)
+
+    def subscribe(self, initial_counts, max_clients=None):
+        with self._condition:
+            if self.watchers >= (max_clients or self.app.config['SEAT_STREAM_MAX_CLIENTS']):
+                return None
+            self.watchers += 1
+            if self._counts is None:
+                self._counts = initial_counts
+            self._ensure_thread()
+            return self._version
+
+    def unsubscribe(self):
+        with self._condition:
+            self.watchers -= 1
+
+    def wait(self, version, timeout):
+        # Mengembalikan (versi, event, kursi) atau None jika tidak ada perubahan sebelum timeout. Hanya delta versi
+        # terakhir yang disimpan, jadi penonton yang tertinggal lebih dari satu versi mendapat snapshot penuh
+        with self._condition:
+            if self._version == version:
+                self._condition.wait(timeout)
+            if self._version == version:
+                return None
+            if self._version - version == 1:
+                return self._version, 'seats', self._delta
+            return (self._version, 'snapshot',
+                    {name: seat_payload(name, count) for name, count in (self._counts or {}).items()})
+
+    def snapshot(self):
+        with self._condition:
+            return self._version, {name: seat_payload(name, count) for name, count in (self._counts or {}).items()}
+
+# Satu broadcaster per aplikasi, dibuat oleh create_app
+seat_broadcaster = LocalProxy(lambda: current_app.extensions['kegiatan']['seat_broadcaster'])
+
+def seat_payload(activity, participant_count):
+    capacity = ACTIVITIES[activity]['capacity'] if activity in ACTIVITIES else 0
+    return {'participant_count': participant_count, 'seats_left': max(0, capacity - participant_count)}
+
+SEAT_STREAM_KEEPALIVE_EVENT = ': keep-alive\n\n'
+
+def format_seat_event(version, event, seats):
+    return f'id: {version}\nevent: {event}\ndata: {json.dumps(seats, ensure_ascii=False)}\n\n'
+
+def selection_changed():
+    # Dipanggil setelah commit setiap penulisan pilihan kegiatan
+    catalog_cache.invalidate()
+    seat_broadcaster.notify()
+
+def delete_selection(conn, selection_id):
+    old_activities = fetch_selected_activities(conn, [selection_id]).get(selection_id, [])
+    # Daftar tunggu hanya untuk pemilik pilihan, jadi antreannya ikut dihapus
+    conn.execute('DELETE FROM activity_waitlist WHERE user_id = (SELECT user_id FROM user_final_selection WHERE id = ?)',
+                 (selection_id,))
+    conn.execute('DELETE FROM selection_activity WHERE selection_id = ?', (selection_id,))
+    conn.execute('DELETE FROM user_final_selection WHERE id = ?', (selection_id,))
+    adjust_activity_counters(conn, old_activities, -1)
+    return promote_waitlist(conn, old_activities)
+
+def promotion_note(promoted):
+    # Tambahan pesan flash admin saat kursi yang dilepas langsung diisi dari daftar tunggu
+    if not promoted:
+        return ''
+    activities = ', '.join(sorted({activity for activity, user_id in promoted}))
+    return f' {len(promoted)} mahasiswa dari daftar tunggu mendapat kursi ({activities}).'
+
+def is_valid_selection(selected_activities):
+    return (1 <= len(selected_activities) <= 3
+            and len(set(selected_activities)) == len(selected_activities)
+            and all(activity in ACTIVITIES for activity in selected_activities))
+
+def activity_image_key(url, width):
+    # Nama berbasis URL sumber dan lebar hasil: jika salah satunya berubah, URL lokal ikut berubah sehingga
+    # respons yang di-cache browser sebagai immutable tidak pernah basi
+    return hashlib.sha1(f'{url}|{width}'.encode('utf-8')).hexdigest()[:16]
+
+@functools.lru_cache(maxsize=None)
+def activity_image_sources(width):
+    # Hanya gambar milik ACTIVITIES yang boleh diambil, jadi route gambar bukan proxy terbuka
+    return {activity_image_key(data['image'], width): data['image'] for data in ACTIVITIES.values()}
+
+_image_locks = {}
+_image_locks_lock = threading.Lock()
+
+def fetch_activity_image(url, path_prefix):
+    """Unduh gambar, perkecil ke ACTIVITY_IMAGE_WIDTH jika Pillow terpasang, lalu simpan di samping path_prefix."""
+    import urllib.request
+    config = current_app.config
+    upstream_request = urllib.request.Request(url, headers={'User-Agent': 'kegiatan-image-cache/1.0'})
+    with urllib.request.urlopen(upstream_request, timeout=config['ACTIVITY_IMAGE_FETCH_TIMEOUT']) as upstream:
+        data = upstream.read(config['ACTIVITY_IMAGE_MAX_BYTES'] + 1)
+        mimetype = upstream.headers.get_content_type()
+    if len(data) > config['ACTIVITY_IMAGE_MAX_BYTES']:
+        raise ValueError('gambar melebihi ACTIVITY_IMAGE_MAX_BYTES')
+    try:
+        from PIL import Image
+    except ImportError:
+        Image = None
+    if Image is not None:
+        image = Image.open(io.BytesIO(data))
+        image.thumbnail((config['ACTIVITY_IMAGE_WIDTH'], config['ACTIVITY_IMAGE_WIDTH'] * 4))
+        buffer = io.BytesIO()
+        image.convert('RGB').save(buffer, 'JPEG', quality=80, optimize=True, progressive=True)
+        data, extension = buffer.getvalue(), '.jpg'
+    elif mimetype.startswith('image/'):
+        # Tanpa Pillow gambar disimpan apa adanya; tetap lebih cepat daripada hot-link ke host pihak ketiga
+        extension = mimetypes.guess_extension(mimetype) or '.img'
+    else:
+        raise ValueError(f'bukan gambar: {mimetype}')
+    path = path_prefix + extension
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temp_path, 'wb') as image_file:
+        image_file.write(data)
+    os.replace(temp_path, path)
+    return path
+
+def cached_activity_image(key, url):
+    cache_dir = current_app.config['ACTIVITY_IMAGE_DIR'] or os.path.join(current_app.instance_path, 'activity_images')
+    path_prefix = os.path.join(cache_dir, f'{key}-{current_app.config["ACTIVITY_IMAGE_WIDTH"]}')
+    with _image_locks_lock:
+        lock = _image_locks.setdefault(path_prefix, threading.Lock())
+    # Satu unduhan per gambar; request lain untuk gambar yang sama menunggu hasilnya
+    with lock:
+        existing = [path for path in glob.glob(glob.escape(path_prefix) + '.*') if not path.endswith('.tmp')]
+        if existing:
+            return existing[0]
+        os.makedirs(cache_dir, exist_ok=True)
+        return fetch_activity_image(url, path_prefix)
+
+def activity_card_fragments():
+    # Bagian statis kartu kegiatan dirender sekali per aplikasi; template hanya mengisi jumlah peserta dan status pilihan
+    state = current_app.extensions['kegiatan']
+    fragments = state.get('card_fragments')
+    if fragments is None:
+        image_macro = get_template_attribute('_activity_card.html', 'image')
+        details_macro = get_template_attribute('_activity_card.html', 'details')
+        fragments = {
+            name: {
+                'image': image_macro(name, activity_image_key(data['image'], current_app.config['ACTIVITY_IMAGE_WIDTH'])),
+                'details': details_macro(name, data),
+            }
+            for name, data in ACTIVITIES.items()
+        }
+        state['card_fragments'] = fragments
+    return fragments
+
+@bp.route('/images/activities/<key>')
+def activity_image(key):
+    url = activity_image_sources(current_app.config['ACTIVITY_IMAGE_WIDTH']).get(key)
+    if url is None:
+        return 'Gambar tidak ditemukan.', 404
+    try:
+        path = cached_activity_image(key, url)
+    except (OSError, ValueError) as e:
+        current_app.logger.warning('Gagal mengambil gambar kegiatan %s: %s', url, e)
+        # Jatuh ke URL asli tanpa cache agar request berikutnya mencoba mengunduh lagi
+        response = redirect(url)
+        response.cache_control.no_store = True
+        return response
+    response = send_file(path, max_age=current_app.config['ACTIVITY_IMAGE_MAX_AGE'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         email = request.form['email']
@@ -110,40 +2462,29 @@ def register():
         jurusan = request.form['jurusan']
         password = request.form['password']
 
-        if not all([email, name, nim, jurusan, password]):
-            flash('Semua kolom harus diisi!', 'error')
-            return render_template('register.html', 
-                                   email=email, 
-                                   name=name, 
-                                   nim=nim, 
-                                   jurusan=jurusan)
-        
-        if '@' not in email or '.' not in email:
-            flash('Format email tidak valid.', 'error')
-            return render_template('register.html', 
-                                   email=email, 
-                                   name=name, 
-                                   nim=nim, 
-                                   jurusan=jurusan)
-
-        if not nim.isdigit() or len(nim) != 13:
-            flash('NIM harus 13 digit angka.', 'error')
+        validation_error = validate_registration(email, name, nim, jurusan, password)
+        if validation_error:
+            flash(validation_error, 'error')
             return render_template('register.html', 
                                    email=email, 
                                    name=name, 
                                    nim=nim, 
                                    jurusan=jurusan)
         
-        password_hash = generate_password_hash(password)
+        try:
+            password_hash = password_hasher.hash(password)
+        except PasswordHasherBusy:
+            return hashing_busy_response('register.html', email=email, name=name, nim=nim, jurusan=jurusan)
         conn = get_db_connection()
         try:
             conn.execute('INSERT INTO users (email, name, nim, jurusan, password_hash, is_admin) VALUES (?, ?, ?, ?, ?, ?)', 
                          (email, name, nim, jurusan, password_hash, 0))
             conn.commit()
+            email_negative_cache.discard(email)
             flash('Pendaftaran akun berhasil! Silakan masuk.', 'success')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         except sqlite3.IntegrityError as e:
-            conn.close()
+            conn.rollback()
             if "UNIQUE constraint failed: users.email" in str(e):
                 flash('Email ini sudah terdaftar. Silakan gunakan email lain.', 'error')
             elif "UNIQUE constraint failed: users.nim" in str(e):
@@ -155,24 +2496,37 @@ def register():
                                    name=name, 
                                    nim=nim, 
                                    jurusan=jurusan)
-        finally:
-            conn.close()
     return render_template('register.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         email_input = request.form['email']
         password = request.form['password']
         if not email_input or not password:
             flash('Email dan password tidak boleh kosong.', 'error')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
 
         conn = get_db_connection()
         user = conn.execute('SELECT * FROM users WHERE email = ?', (email_input,)).fetchone()
-        conn.close()
+
+        try:
+            password_ok = user is not None and password_hasher.verify(user['password_hash'], password)
+        except PasswordHasherBusy:
+            return hashing_busy_response('login.html')
+        if password_ok and password_hasher.needs_rehash(user['password_hash']):
+            # Hash lama diperbarui ke metode/biaya saat ini selagi password asli tersedia.
+            # Saat pool hashing penuh pembaruan dilewati (dicoba lagi di login berikutnya), login tetap berhasil
+            try:
+                conn.execute('UPDATE users SET password_hash = ? WHERE id = ?', (password_hasher.hash(password), user['id']))
+                conn.commit()
+                password_hasher.note_rehash()
+            except PasswordHasherBusy:
+                pass
         
-        if user and check_password_hash(user['password_hash'], password):
+        if password_ok:
+            session.clear()
+            session.regenerate()
             session['logged_in'] = True
             session['user_id'] = user['id']        
             session['user_email'] = user['email']
@@ -183,48 +2537,55 @@ def login():
             
             if user['is_admin'] == 1:
                 flash(f'Selamat datang kembali, Administrator!', 'success')
-                return redirect(url_for('admin_dashboard'))
+                return redirect(url_for('main.admin_dashboard'))
             else:
                 flash(f'Selamat datang kembali, {user["name"]}!', 'success')
-                return redirect(url_for('index')) 
+                return redirect(url_for('main.index')) 
         else:
             flash('Email atau password salah.', 'error')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
     return render_template('login.html')
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     session.clear()
     flash('Anda berhasil keluar.', 'success')
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
-@app.route('/forgot_password', methods=['GET', 'POST'])
+@bp.route('/forgot_password', methods=['GET', 'POST'])
 def forgot_password():
+    reset_token_sweeper.ensure_started()
     if request.method == 'POST':
-        email = request.form.get('email')
-        conn = get_db_connection()
-        user = conn.execute('SELECT email FROM users WHERE email = ?', (email,)).fetchone()
-        conn.close()
+        email = request.form.get('email', '').strip()
+        # Email yang baru saja terbukti tidak terdaftar tidak dicari ulang ke database
+        if email and not email_negative_cache.contains(email):
+            conn = get_db_connection()
+            user = conn.execute('SELECT id, email, name FROM users WHERE email = ?', (email,)).fetchone()
+            if user is None:
+                email_negative_cache.add(email)
+            else:
+                token = issue_reset_token(conn, user['id'])
+                reset_link = url_for('main.reset_password', token=token, _external=True)
+                # Dikirim thread outbox; request tidak menunggu server email
+                mail_outbox.send(user['email'], 'Reset password akun kegiatan',
+                                 f'Halo {user["name"]},\n\n'
+                                 f'Buka tautan berikut untuk mengganti password Anda. Tautan hanya bisa dipakai sekali '
+                                 f'dan berlaku {current_app.config["PASSWORD_RESET_TTL"] // 60} menit:\n{reset_link}\n\n'
+                                 'Abaikan email ini jika Anda tidak meminta reset password.\n')
 
-        if user:
-            token = s.dumps(email, salt='password-reset-salt')
-            reset_link = url_for('reset_password', token=token, _external=True)
-            
-            # Simulasi pengiriman email:
-            flash(f'Silakan periksa email Anda untuk tautan reset password. Untuk demo, klik tautan ini: <a href="{reset_link}" class="alert-link">Reset Password</a>', 'info')
-        else:
-            flash('Email tidak ditemukan.', 'error')
-            
-        return redirect(url_for('forgot_password'))
+        # Jawaban yang sama untuk email terdaftar maupun tidak, sehingga halaman ini tidak bisa dipakai menebak email
+        flash('Jika email tersebut terdaftar, tautan reset password sudah dikirim. Silakan periksa email Anda.', 'info')
+        return redirect(url_for('main.forgot_password'))
     return render_template('forgot_password.html')
 
-@app.route('/reset_password/<token>', methods=['GET', 'POST'])
+@bp.route('/reset_password/<token>', methods=['GET', 'POST'])
 def reset_password(token):
-    try:
-        email = s.loads(token, salt='password-reset-salt', max_age=3600) # Token valid 1 jam
-    except (SignatureExpired, BadTimeSignature):
+    reset_token_sweeper.ensure_started()
+    # Tanda tangan dan umur token dicek tanpa database; status sekali pakai diperiksa saat password baru dikirim
+    payload = load_reset_token(token)
+    if payload is None:
         flash('Tautan reset password tidak valid atau sudah kedaluwarsa.', 'error')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     if request.method == 'POST':
         new_password = request.form.get('password')
@@ -234,22 +2595,39 @@ def reset_password(token):
             flash('Password baru tidak cocok.', 'error')
             return render_template('reset_password.html', token=token)
 
-        hashed_password = generate_password_hash(new_password)
         conn = get_db_connection()
-        conn.execute('UPDATE users SET password_hash = ? WHERE email = ?', (hashed_password, email))
-        conn.commit()
-        conn.close()
+        if not reset_token_usable(conn, payload):
+            flash('Tautan reset password sudah dipakai atau tidak berlaku lagi. Silakan minta tautan baru.', 'error')
+            return redirect(url_for('main.forgot_password'))
+        try:
+            hashed_password = password_hasher.hash(new_password)
+        except PasswordHasherBusy:
+            return hashing_busy_response('reset_password.html', token=token)
+        begin_immediate(conn)
+        try:
+            # Dicek ulang secara atomik: dua submit bersamaan dengan token yang sama hanya satu yang berhasil
+            if not consume_reset_token(conn, payload):
+                conn.rollback()
+                flash('Tautan reset password sudah dipakai atau tidak berlaku lagi. Silakan minta tautan baru.', 'error')
+                return redirect(url_for('main.forgot_password'))
+            conn.execute('UPDATE users SET password_hash = ? WHERE id = ?', (hashed_password, payload['uid']))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        # Sesi lain akun ini (mis. milik orang yang mengetahui password lama) ikut berakhir
+        current_app.session_interface.invalidate_users(current_app, [payload['uid']])
 
         flash('Password Anda berhasil diubah! Silakan masuk dengan password baru.', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
         
     return render_template('reset_password.html', token=token)
 
-@app.route('/')
+@bp.route('/')
 def index():
     if not session.get('logged_in'):
         flash('Anda harus masuk untuk mengakses halaman ini.', 'error')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
         
     conn = get_db_connection()
     user_id = session['user_id']
@@ -257,90 +2635,120 @@ def index():
     user_selection_raw = conn.execute('''
         SELECT * FROM user_final_selection WHERE user_id = ?
     ''', (user_id,)).fetchone()
-    conn.close()
 
     user_selection = None
     if user_selection_raw:
         user_selection = dict(user_selection_raw)
-        user_selection['selected_activities'] = json.loads(user_selection['selected_activities'])
+        user_selection['selected_activities'] = fetch_selected_activities(conn, [user_selection['id']]).get(user_selection['id'], [])
         user_selection['submission_date_wib'] = convert_utc_to_wib(user_selection['submission_date'])
     
-    return render_template('index.html', user_selection=user_selection)
+    return render_template('index.html', user_selection=user_selection,
+                           waitlist_positions=fetch_waitlist_positions(conn, user_id))
 
-@app.route('/activities')
+@bp.route('/activities')
 def browse_activities():
     if not session.get('logged_in'):
         flash('Anda harus masuk untuk melihat kegiatan.', 'error')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     if session.get('is_admin'):
         flash('Admin tidak dapat mendaftar kegiatan.', 'info')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
 
     conn = get_db_connection()
     user_id = session['user_id']
 
-    has_made_selection = conn.execute('SELECT 1 FROM user_final_selection WHERE user_id = ?', (user_id,)).fetchone() is not None
+    selection_data = conn.execute('SELECT id FROM user_final_selection WHERE user_id = ?', (user_id,)).fetchone()
+    has_made_selection = selection_data is not None
     user_selected_activities = []
     if has_made_selection:
-        selection_data = conn.execute('SELECT selected_activities FROM user_final_selection WHERE user_id = ?', (user_id,)).fetchone()
-        if selection_data:
-            user_selected_activities = json.loads(selection_data['selected_activities'])
-
-    all_selections_raw = conn.execute('SELECT selected_activities FROM user_final_selection').fetchall()
-    
-    activity_counts_dict = {activity_name: 0 for activity_name in ACTIVITIES.keys()}
-    for selection_entry in all_selections_raw:
-        try:
-            selected_activities_list = json.loads(selection_entry['selected_activities'])
-            for activity in selected_activities_list:
-                if activity in activity_counts_dict:
-                    activity_counts_dict[activity] += 1
-        except json.JSONDecodeError:
-            pass
-
-    activities_with_counts = {}
-    for name, data in ACTIVITIES.items():
-        activities_with_counts[name] = {
-            **data, 
-            "participant_count": activity_counts_dict.get(name, 0)
-        }
-    conn.close()
+        user_selected_activities = fetch_selected_activities(conn, [selection_data['id']]).get(selection_data['id'], [])
 
     return render_template('activities_browse.html', 
-                           activities=activities_with_counts, 
+                           activities=ACTIVITIES, 
+                           activity_counts=catalog_cache.get()['counts'],
+                           card_fragments=activity_card_fragments(),
                            has_made_selection=has_made_selection,
-                           user_selected_activities=user_selected_activities)
+                           user_selected_activities=user_selected_activities,
+                           waitlist_positions=fetch_waitlist_positions(conn, user_id))
+
+@bp.route('/api/activities')
+def api_activities():
+    if not session.get('logged_in'):
+        return jsonify({'error': 'Anda harus masuk untuk melihat kegiatan.'}), 401
+
+    entry = catalog_cache.get()
+    response = Response(entry['body'], mimetype='application/json')
+    response.set_etag(entry['etag'])
+    response.last_modified = entry['last_modified']
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    # Mengembalikan 304 Not Modified jika If-None-Match / If-Modified-Since masih cocok
+    return response.make_conditional(request)
+
+@bp.route('/api/activities/stream')
+def api_activities_stream():
+    if not session.get('logged_in'):
+        return jsonify({'error': 'Anda harus masuk untuk melihat kegiatan.'}), 401
+
+    # Generator berjalan di luar request context, jadi broadcaster diambil sekarang
+    broadcaster = current_app.extensions['kegiatan']['seat_broadcaster']
+    version = broadcaster.subscribe(catalog_cache.get()['counts'])
+    if version is None:
+        response = jsonify({'error': 'Terlalu banyak koneksi realtime. Muat ulang halaman secara berkala.'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+
+    keepalive = current_app.config['SEAT_STREAM_KEEPALIVE']
 
-@app.route('/confirm_selection', methods=['GET', 'POST']) 
+    def generate():
+        # Snapshot penuh di awal (juga saat EventSource tersambung ulang), lalu hanya delta
+        current, seats = broadcaster.snapshot()
+        yield 'retry: 3000\n' + format_seat_event(current, 'snapshot', seats)
+        while True:
+            update = broadcaster.wait(current, keepalive)
+            if update is None:
+                yield SEAT_STREAM_KEEPALIVE_EVENT
+                continue
+            current, event, seats = update
+            yield format_seat_event(current, event, seats)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    # Dipanggil server saat klien memutus koneksi, juga jika generator belum sempat berjalan
+    response.call_on_close(broadcaster.unsubscribe)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # Jangan di-buffer oleh reverse proxy
+    return response
+
+@bp.route('/confirm_selection', methods=['GET', 'POST']) 
 def confirm_selection(): 
     if not session.get('logged_in'):
         flash('Anda harus masuk untuk mendaftar kegiatan.', 'error')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     if session.get('is_admin'):
         flash('Admin tidak dapat mendaftar kegiatan.', 'info')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
 
     user_id = session['user_id']
     conn = get_db_connection()
     has_made_selection = conn.execute('SELECT 1 FROM user_final_selection WHERE user_id = ?', (user_id,)).fetchone() is not None
-    conn.close()
 
     if has_made_selection:
         flash('Anda sudah membuat pilihan kegiatan final dan tidak bisa mendaftar lagi.', 'info')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
 
     if request.method == 'GET':
         selected_activities = request.args.getlist('selected_activities')
         
         if not selected_activities:
             flash('Anda belum memilih kegiatan apapun.', 'error')
-            return redirect(url_for('browse_activities'))
+            return redirect(url_for('main.browse_activities'))
 
         if not (1 <= len(selected_activities) <= 3):
             flash('Anda harus memilih antara 1 hingga 3 kegiatan.', 'error')
-            return redirect(url_for('browse_activities'))
+            return redirect(url_for('main.browse_activities'))
         
         session['temp_selected_activities'] = selected_activities
         return render_template('confirm_selection.html', selected_activities=selected_activities)
@@ -348,9 +2756,9 @@ def confirm_selection():
     elif request.method == 'POST':
         selected_activities = request.form.getlist('selected_activities')
         
-        if not selected_activities or not (1 <= len(selected_activities) <= 3):
+        if not selected_activities or not is_valid_selection(selected_activities):
             flash('Kesalahan validasi pilihan kegiatan. Silakan pilih kembali.', 'error')
-            return redirect(url_for('browse_activities'))
+            return redirect(url_for('main.browse_activities'))
 
         user_id = session['user_id']
         conn = get_db_connection()
@@ -358,149 +2766,327 @@ def confirm_selection():
             existing_selection = conn.execute('SELECT 1 FROM user_final_selection WHERE user_id = ?', (user_id,)).fetchone()
             if existing_selection:
                 flash('Anda sudah membuat pilihan kegiatan final dan tidak bisa mendaftar lagi.', 'info')
-                return redirect(url_for('index'))
+                return redirect(url_for('main.index'))
 
-            json_activities = json.dumps(selected_activities)
-            conn.execute('INSERT INTO user_final_selection (user_id, selected_activities) VALUES (?, ?)',
-                         (user_id, json_activities))
-            conn.commit()
+            if current_app.config['SELECTION_GROUP_COMMIT']:
+                selection_writer.enroll(user_id, selected_activities)
+            else:
+                enroll_user(conn, user_id, selected_activities)
             flash('Pilihan kegiatan Anda berhasil dikonfirmasi dan disimpan!', 'success')
             session.pop('temp_selected_activities', None)
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
+        except ActivityFullError as e:
+            flash(f'Kuota kegiatan sudah penuh: {e}. Silakan pilih kegiatan lain.', 'error')
+            return redirect(url_for('main.browse_activities'))
         except sqlite3.IntegrityError as e:
             flash('Terjadi kesalahan: Anda sudah membuat pilihan kegiatan final.', 'error')
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
+        except TimeoutError:
+            # Pilihan masih di antrean group commit dan mungkin tetap tersimpan
+            flash('Server sedang sibuk menyimpan pilihan. Periksa halaman utama beberapa saat lagi sebelum mendaftar ulang.', 'error')
+            return redirect(url_for('main.index'))
         except Exception as e:
             flash(f'Terjadi kesalahan saat menyimpan pilihan: {str(e)}', 'error')
-            return redirect(url_for('browse_activities'))
-        finally:
-            conn.close()
+            return redirect(url_for('main.browse_activities'))
+
+@bp.route('/waitlist/join', methods=['POST'])
+def join_waitlist():
+    if not session.get('logged_in'):
+        flash('Anda harus masuk untuk masuk daftar tunggu.', 'error')
+        return redirect(url_for('main.login'))
+
+    if session.get('is_admin'):
+        flash('Admin tidak dapat mendaftar kegiatan.', 'info')
+        return redirect(url_for('main.index'))
+
+    activity = request.form.get('waitlist_activity', '')
+    if activity not in ACTIVITIES:
+        flash('Kegiatan tidak ditemukan.', 'error')
+        return redirect(url_for('main.browse_activities'))
+
+    user_id = session['user_id']
+    conn = get_db_connection()
+    # Diserialkan dengan penulisan yang melepas kursi: jika kursi masih ada, daftar langsung saja
+    begin_immediate(conn)
+    try:
+        selection = conn.execute('SELECT id FROM user_final_selection WHERE user_id = ?', (user_id,)).fetchone()
+        current = fetch_selected_activities(conn, [selection['id']]).get(selection['id'], []) if selection else []
+        participant_count = conn.execute('SELECT participant_count FROM activity_counter WHERE activity = ?',
+                                         (activity,)).fetchone()[0]
+        if selection is None:
+            # Promosi hanya menambah kegiatan ke pilihan yang sudah ada; tanpa pilihan, kursi itu akan
+            # menjadi pilihan satu kegiatan yang mengunci mahasiswa dari halaman konfirmasi
+            flash('Konfirmasi pilihan kegiatan Anda terlebih dahulu. Daftar tunggu hanya untuk mahasiswa yang '
+                  'sudah terdaftar di kurang dari 3 kegiatan.', 'error')
+        elif activity in current:
+            flash(f'Anda sudah terdaftar di {activity}.', 'info')
+        elif len(current) >= 3:
+            flash('Anda sudah memilih 3 kegiatan sehingga tidak dapat masuk daftar tunggu.', 'error')
+        elif participant_count < ACTIVITIES[activity]['capacity']:
+            flash(f'Kuota {activity} masih tersedia. Silakan daftar langsung.', 'info')
+        else:
+            conn.execute('INSERT INTO activity_waitlist (activity, user_id) VALUES (?, ?) ON CONFLICT DO NOTHING',
+                         (activity, user_id))
+            conn.commit()
+            position = fetch_waitlist_positions(conn, user_id)[activity]['position']
+            flash(f'Anda masuk daftar tunggu {activity} di posisi {position}. Kursi yang kosong otomatis diberikan '
+                  f'sesuai urutan.', 'success')
+    finally:
+        conn.rollback()
+    return redirect(url_for('main.index'))
+
+@bp.route('/waitlist/leave', methods=['POST'])
+def leave_waitlist():
+    if not session.get('logged_in'):
+        flash('Anda harus masuk untuk mengubah daftar tunggu.', 'error')
+        return redirect(url_for('main.login'))
+
+    activity = request.form.get('waitlist_activity', '')
+    conn = get_db_connection()
+    cursor = conn.execute('DELETE FROM activity_waitlist WHERE activity = ? AND user_id = ?', (activity, session['user_id']))
+    conn.commit()
+    if cursor.rowcount:
+        flash(f'Anda keluar dari daftar tunggu {activity}.', 'success')
+    else:
+        flash('Anda tidak berada di daftar tunggu kegiatan tersebut.', 'info')
+    return redirect(url_for('main.index'))
 
-@app.route('/participants_list') 
+@bp.route('/api/waitlist')
+def api_waitlist():
+    if not session.get('logged_in'):
+        return jsonify({'error': 'Anda harus masuk untuk melihat daftar tunggu.'}), 401
+    return jsonify(fetch_waitlist_positions(get_db_connection(), session['user_id']))
+
+@bp.route('/participants_list') 
 def list_participants():
     if not session.get('logged_in'):
         flash('Anda harus masuk untuk melihat daftar peserta.', 'error')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     conn = get_db_connection()
-    all_selections_raw = conn.execute('''
-        SELECT ufs.id, u.name AS user_name, u.nim, u.jurusan, ufs.selected_activities, ufs.submission_date
-        FROM user_final_selection ufs
-        JOIN users u ON ufs.user_id = u.id
-        WHERE u.is_admin = 0
-        ORDER BY ufs.submission_date DESC
-    ''').fetchall()
-    
-    all_selections = []
-    activity_counts_dict = {activity_name: 0 for activity_name in ACTIVITIES.keys()}
+    filters = read_selection_filters(request.args)
+    all_selections, next_cursor = fetch_selection_page(conn, filters,
+                                                       cursor=decode_page_cursor(request.args.get('cursor')),
+                                                       include_admins=False)
 
-    for selection_entry in all_selections_raw:
-        selection_dict = dict(selection_entry)
-        try:
-            selected_activities_list = json.loads(selection_dict['selected_activities'])
-            selection_dict['selected_activities'] = selected_activities_list
-            selection_dict['submission_date_wib'] = convert_utc_to_wib(selection_dict['submission_date'])
-            all_selections.append(selection_dict)
-
-            for activity in selected_activities_list:
-                if activity in activity_counts_dict:
-                    activity_counts_dict[activity] += 1
-        except json.JSONDecodeError:
-            pass
-    
-    activity_counts = [{'activity_type': name, 'total': count} for name, count in activity_counts_dict.items()]
+    activity_counts_dict = catalog_cache.get()['counts']
+    activity_counts = [{'activity_type': name, 'total': count, 'capacity': ACTIVITIES[name]['capacity']}
+                       for name, count in activity_counts_dict.items()]
 
-    conn.close()
-    return render_template('participants.html', all_selections=all_selections, activity_counts=activity_counts)
+    return render_template('participants.html', all_selections=all_selections, activity_counts=activity_counts,
+                           filters=filters, next_cursor=next_cursor, is_first_page=not request.args.get('cursor'),
+                           activities_data=ACTIVITIES, all_jurusan=JURUSAN_LIST)
 
-@app.route('/admin')
+@bp.route('/admin')
 def admin_dashboard():
     if not session.get('is_admin'):
         flash('Anda tidak memiliki izin untuk mengakses halaman admin.', 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     conn = get_db_connection()
-    all_selections_raw = conn.execute('''
-        SELECT ufs.id, u.name AS user_name, u.email, u.nim, u.jurusan, ufs.selected_activities, ufs.submission_date
-        FROM user_final_selection ufs
-        JOIN users u ON ufs.user_id = u.id
-        ORDER BY ufs.submission_date DESC
-    ''').fetchall()
+    filters = read_selection_filters(request.args)
+    all_selections, next_cursor = fetch_selection_page(conn, filters,
+                                                       cursor=decode_page_cursor(request.args.get('cursor')))
+    all_users_raw, next_user_cursor = fetch_user_page(conn, cursor=decode_page_cursor(request.args.get('user_cursor')))
     
-    all_selections = []
-    for selection_entry in all_selections_raw:
-        selection_dict = dict(selection_entry)
-        try:
-            selection_dict['selected_activities'] = json.loads(selection_dict['selected_activities'])
-            selection_dict['submission_date_wib'] = convert_utc_to_wib(selection_dict['submission_date'])
-            all_selections.append(selection_dict)
-        except json.JSONDecodeError:
-            pass
+    return render_template('admin_dashboard.html', all_selections=all_selections, all_users=all_users_raw,
+                           filters=filters, next_cursor=next_cursor, is_first_page=not request.args.get('cursor'),
+                           next_user_cursor=next_user_cursor, is_first_user_page=not request.args.get('user_cursor'),
+                           activities_data=ACTIVITIES, all_jurusan=JURUSAN_LIST)
 
-    all_users_raw = conn.execute('SELECT id, email, name, nim, jurusan, is_admin FROM users WHERE is_admin = 0 ORDER BY name ASC').fetchall()
-    
-    conn.close()
-    
-    return render_template('admin_dashboard.html', all_selections=all_selections, all_users=all_users_raw)
 
+@bp.route('/admin/api/search')
+def admin_search():
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Anda tidak memiliki izin untuk mengakses halaman admin.'}), 403
+
+    query = request.args.get('q', '')
+    if not query.strip():
+        return jsonify({'error': 'Parameter q wajib diisi.'}), 400
+    limit = request.args.get('limit', type=int) or current_app.config['PAGE_SIZE']
+    limit = max(1, min(limit, 100))
+
+    conn = get_db_connection()
+    rows, next_cursor, mode = search_users(conn, query, cursor=decode_page_cursor(request.args.get('cursor')), limit=limit)
+    activities_by_selection = fetch_selected_activities(conn, [row['selection_id'] for row in rows if row['selection_id']])
+    submission_dates_wib = convert_utc_to_wib_batch([row['submission_date'] for row in rows])
+    results = []
+    for row, submission_date_wib in zip(rows, submission_dates_wib):
+        results.append({
+            'id': row['id'],
+            'name': row['name'],
+            'email': row['email'],
+            'nim': row['nim'],
+            'jurusan': row['jurusan'],
+            'is_admin': bool(row['is_admin']),
+            'selection_id': row['selection_id'],
+            'selected_activities': activities_by_selection.get(row['selection_id'], []),
+            'submission_date_wib': submission_date_wib or None,
+        })
+    return jsonify({'query': query, 'mode': mode, 'results': results, 'next_cursor': next_cursor})
+
+@bp.route('/admin/analytics')
+def admin_analytics():
+    if not session.get('is_admin'):
+        flash('Anda tidak memiliki izin untuk mengakses halaman ini.', 'error')
+        return redirect(url_for('main.index'))
+    analytics = fetch_analytics(get_db_connection())
+    cells = [count for counts in analytics['jurusan_activity'].values() for count in counts.values()]
+    return render_template('admin_analytics.html', analytics=analytics, max_cell=max(cells, default=0),
+                           max_hour=max(analytics['submissions_by_hour_of_day']))
+
+@bp.route('/admin/api/analytics')
+def admin_api_analytics():
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Anda tidak memiliki izin untuk mengakses halaman admin.'}), 403
+    return jsonify(fetch_analytics(get_db_connection()))
+
+@bp.route('/admin/export.csv')
+def admin_export_csv():
+    if not session.get('is_admin'):
+        flash('Anda tidak memiliki izin untuk mengakses halaman admin.', 'error')
+        return redirect(url_for('main.index'))
 
-@app.route('/admin/delete_user/<int:user_id>', methods=['POST'])
+    filters = read_selection_filters(request.args)
+    chunk_rows = current_app.config['EXPORT_CHUNK_ROWS']
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        # BOM agar Excel membaca UTF-8 dengan benar
+        buffer.write('\ufeff')
+        writer.writerow(['ID Pilihan', 'Nama', 'Email', 'NIM', 'Jurusan', 'Pilihan Kegiatan', 'Waktu Pendaftaran (WIB)'])
+        pending = 0
+        for row in iter_selection_export_rows(get_db_connection(), filters):
+            # Nama, email, dan NIM diisi mahasiswa sendiri, jadi tidak boleh terbaca sebagai formula
+            writer.writerow([csv_safe_cell(value) for value in row])
+            pending += 1
+            if pending >= chunk_rows:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+        yield buffer.getvalue()
+
+    filename = f'pendaftaran_kegiatan_{datetime.now(timezone(WIB_OFFSET)).strftime("%Y%m%d_%H%M%S")}.csv'
+    return Response(stream_with_context(generate()), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@bp.route('/admin/metrics')
+def admin_metrics():
+    if not session.get('is_admin'):
+        return Response('Forbidden\n', status=403, mimetype='text/plain')
+    pool_stats = get_pool().stats()
+    hasher_stats = password_hasher.stats()
+    gauges = [
+        ('kegiatan_metrics_enabled', int(current_app.config['METRICS_ENABLED'])),
+        ('kegiatan_db_pool_in_use', pool_stats['in_use']),
+        ('kegiatan_db_pool_idle', pool_stats['idle']),
+        ('kegiatan_db_pool_created', pool_stats['created']),
+        ('kegiatan_password_hash_pending', hasher_stats['pending']),
+        ('kegiatan_password_hash_rejected', hasher_stats['rejected']),
+    ]
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/admin/import_students', methods=['GET', 'POST'])
+def admin_import_students():
+    if not session.get('is_admin'):
+        flash('Anda tidak memiliki izin untuk mengakses halaman ini.', 'error')
+        return redirect(url_for('main.index'))
+
+    if request.method == 'POST':
+        uploaded = request.files.get('file')
+        if not uploaded or not uploaded.filename:
+            flash('Pilih file CSV terlebih dahulu.', 'error')
+            return redirect(url_for('main.admin_import_students'))
+        # Hashing password dengan PASSWORD_HASH_METHOD bisa memakan waktu lama, jadi request tidak menunggu impor selesai
+        job_id = start_import_job(uploaded)
+        flash('File diterima. Impor berjalan di latar belakang; halaman ini menampilkan progresnya.', 'info')
+        return redirect(url_for('main.admin_import_job', job_id=job_id))
+
+    return render_template('admin_import_students.html', job=None, report=None, columns=IMPORT_COLUMNS)
+
+@bp.route('/admin/import_students/<int:job_id>')
+def admin_import_job(job_id):
+    if not session.get('is_admin'):
+        flash('Anda tidak memiliki izin untuk mengakses halaman ini.', 'error')
+        return redirect(url_for('main.index'))
+
+    job = get_db_connection().execute('SELECT * FROM import_job WHERE id = ?', (job_id,)).fetchone()
+    if job is None:
+        flash('Job impor tidak ditemukan.', 'error')
+        return redirect(url_for('main.admin_import_students'))
+    report = None
+    if job['status'] != 'running':
+        report = {'inserted': job['inserted'], 'rows': job['rows'], 'errors': json.loads(job['errors'] or '[]')}
+    return render_template('admin_import_students.html', job=job, report=report, columns=IMPORT_COLUMNS)
+
+@bp.route('/admin/delete_user/<int:user_id>', methods=['POST'])
 def admin_delete_user(user_id):
     if not session.get('is_admin'):
         flash('Anda tidak memiliki izin untuk melakukan tindakan ini.', 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
 
     if user_id == session.get('user_id'):
         flash('Tidak dapat menghapus akun Anda sendiri.', 'error')
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
 
     conn = get_db_connection()
     try:
+        # Pilihan lama dibaca di bawah write lock agar penulisan lain (mis. promosi daftar tunggu) tidak menyela
+        begin_immediate(conn)
         user_to_delete = conn.execute('SELECT id, name FROM users WHERE id = ?', (user_id,)).fetchone()
         if user_to_delete:
+            selection = conn.execute('SELECT id FROM user_final_selection WHERE user_id = ?', (user_id,)).fetchone()
+            promoted = delete_selection(conn, selection['id']) if selection else []
             conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
             conn.commit()
-            flash(f'Akun {user_to_delete["name"]} berhasil dihapus.', 'success')
+            current_app.session_interface.invalidate_users(current_app, [user_id])
+            if selection:
+                selection_changed()
+            flash(f'Akun {user_to_delete["name"]} berhasil dihapus.{promotion_note(promoted)}', 'success')
         else:
+            conn.rollback()
             flash('Akun tidak ditemukan.', 'error')
     except Exception as e:
+        conn.rollback()
         flash(f'Terjadi kesalahan saat menghapus akun: {str(e)}', 'error')
-    finally:
-        conn.close()
     
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('main.admin_dashboard'))
 
-@app.route('/admin/delete_selection/<int:selection_id>', methods=['POST'])
+@bp.route('/admin/delete_selection/<int:selection_id>', methods=['POST'])
 def admin_delete_selection(selection_id):
     if not session.get('is_admin'):
         flash('Anda tidak memiliki izin untuk melakukan tindakan ini.', 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     conn = get_db_connection()
     try:
+        begin_immediate(conn)
         selection_to_delete = conn.execute('SELECT * FROM user_final_selection WHERE id = ?', (selection_id,)).fetchone()
         if selection_to_delete:
-            conn.execute('DELETE FROM user_final_selection WHERE id = ?', (selection_id,))
+            promoted = delete_selection(conn, selection_id)
             conn.commit()
-            flash(f'Pilihan kegiatan ID {selection_id} berhasil dihapus.', 'success')
+            selection_changed()
+            flash(f'Pilihan kegiatan ID {selection_id} berhasil dihapus.{promotion_note(promoted)}', 'success')
         else:
+            conn.rollback()
             flash('Pilihan kegiatan tidak ditemukan.', 'error')
     except Exception as e:
+        conn.rollback()
         flash(f'Terjadi kesalahan saat menghapus pilihan: {str(e)}', 'error')
-    finally:
-        conn.close()
     
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('main.admin_dashboard'))
 
-@app.route('/admin/edit_selection/<int:selection_id>', methods=['GET', 'POST'])
+@bp.route('/admin/edit_selection/<int:selection_id>', methods=['GET', 'POST'])
 def admin_edit_selection(selection_id):
     if not session.get('is_admin'):
         flash('Anda tidak memiliki izin untuk mengakses halaman ini.', 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
 
     conn = get_db_connection()
     selection_record = conn.execute('''
-        SELECT ufs.id, ufs.user_id, ufs.selected_activities, ufs.submission_date,
+        SELECT ufs.id, ufs.user_id, ufs.submission_date,
                u.name AS user_name, u.email, u.nim, u.jurusan
         FROM user_final_selection ufs
         JOIN users u ON ufs.user_id = u.id
@@ -508,31 +3094,32 @@ def admin_edit_selection(selection_id):
     ''', (selection_id,)).fetchone()
 
     if not selection_record:
-        conn.close()
         flash('Pilihan kegiatan tidak ditemukan.', 'error')
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
+
+    selection_record_dict = dict(selection_record)
+    selection_record_dict['selected_activities'] = fetch_selected_activities(conn, [selection_id]).get(selection_id, [])
 
     if request.method == 'POST':
         new_selected_activities = request.form.getlist('selected_activities')
         new_jurusan = request.form.get('jurusan') 
 
-        if not new_selected_activities or not (1 <= len(new_selected_activities) <= 3):
+        if not new_selected_activities or not is_valid_selection(new_selected_activities):
             flash('Anda harus memilih antara 1 hingga 3 kegiatan.', 'error')
-            conn.close()
-            selection_record_dict = dict(selection_record)
-            selection_record_dict['selected_activities'] = json.loads(selection_record_dict['selected_activities'])
             return render_template('admin_edit_selection.html', 
                                    selection=selection_record_dict, 
                                    activities_data=ACTIVITIES,
-                                   all_jurusan=["Teknik Informatika", "Teknik Sipil", "Teknik Arsitektur", "Teknik Pertambangan"])
+                                   card_fragments=activity_card_fragments(),
+                                   all_jurusan=JURUSAN_LIST)
 
         try:
-            json_activities = json.dumps(new_selected_activities)
+            begin_immediate(conn)
             conn.execute('''
                 UPDATE user_final_selection 
-                SET selected_activities = ?, submission_date = CURRENT_TIMESTAMP
+                SET submission_date = CURRENT_TIMESTAMP
                 WHERE id = ?
-            ''', (json_activities, selection_id))
+            ''', (selection_id,))
+            promoted = save_selected_activities(conn, selection_id, new_selected_activities)
 
             conn.execute('''
                 UPDATE users
@@ -541,46 +3128,189 @@ def admin_edit_selection(selection_id):
             ''', (new_jurusan, selection_record['user_id']))
 
             conn.commit()
-            flash(f'Pilihan kegiatan dan jurusan untuk {selection_record["user_name"]} berhasil diperbarui.', 'success')
-            return redirect(url_for('admin_dashboard'))
+            selection_changed()
+            current_app.session_interface.update_user(current_app, selection_record['user_id'], user_jurusan=new_jurusan)
+            flash(f'Pilihan kegiatan dan jurusan untuk {selection_record["user_name"]} berhasil diperbarui.'
+                  f'{promotion_note(promoted)}', 'success')
+            return redirect(url_for('main.admin_dashboard'))
+        except ActivityFullError as e:
+            flash(f'Kuota kegiatan sudah penuh: {e}.', 'error')
+            conn.rollback()
+            return render_template('admin_edit_selection.html', 
+                                   selection=selection_record_dict, 
+                                   activities_data=ACTIVITIES,
+                                   card_fragments=activity_card_fragments(),
+                                   all_jurusan=JURUSAN_LIST)
         except Exception as e:
             flash(f'Terjadi kesalahan saat memperbarui pilihan: {str(e)}', 'error')
-            conn.close()
-            selection_record_dict = dict(selection_record)
-            selection_record_dict['selected_activities'] = json.loads(selection_record_dict['selected_activities'])
+            conn.rollback()
             return render_template('admin_edit_selection.html', 
                                    selection=selection_record_dict, 
                                    activities_data=ACTIVITIES,
-                                   all_jurusan=["Teknik Informatika", "Teknik Sipil", "Teknik Arsitektur", "Teknik Pertambangan"])
-        finally:
-            conn.close()
-    
-    selection_record_dict = dict(selection_record)
-    selection_record_dict['selected_activities'] = json.loads(selection_record_dict['selected_activities'])
+                                   card_fragments=activity_card_fragments(),
+                                   all_jurusan=JURUSAN_LIST)
     
-    conn.close()
     return render_template('admin_edit_selection.html', 
                            selection=selection_record_dict, 
                            activities_data=ACTIVITIES,
-                           all_jurusan=["Teknik Informatika", "Teknik Sipil", "Teknik Arsitektur", "Teknik Pertambangan"])
+                           card_fragments=activity_card_fragments(),
+                           all_jurusan=JURUSAN_LIST)
 
+@bp.route('/admin/stats')
+def admin_stats():
+    if not session.get('is_admin'):
+        flash('Anda tidak memiliki izin untuk mengakses halaman ini.', 'error')
+        return redirect(url_for('main.index'))
+    return jsonify({'db_pool': get_pool().stats(), 'password_hasher': password_hasher.stats(),
+                    'seat_stream': {'watchers': seat_broadcaster.watchers},
+                    'selection_writer': selection_writer.stats(), 'rate_limit': rate_limiter.stats(),
+                    'waitlist': fetch_waitlist_lengths(get_db_connection()), 'mail_outbox': mail_outbox.stats(),
+                    'reset_token_sweeper': reset_token_sweeper.stats(),
+                    'email_negative_cache': email_negative_cache.stats()})
 
-if __name__ == '__main__':
-    # Hapus database lama jika ada untuk memulai bersih (khusus development)
-    # Anda bisa mengomentari ini untuk menjaga data jika ingin mempertahankan data
-    if os.path.exists('kegiatan_registrasi.db'): 
-        os.remove('kegiatan_registrasi.db') 
-    
-    init_db()
-    
+
+@bp.cli.command('verify-counters')
+@click.option('--repair', is_flag=True, help='Perbaiki activity_counter yang tidak sesuai.')
+def verify_counters_command(repair):
+    """Periksa (dan opsional perbaiki) jumlah peserta per kegiatan."""
+    conn = get_db_connection()
+    drift = verify_activity_counters(conn, repair=repair)
+    conn.commit()
+
+    if not drift:
+        click.echo('Semua penghitung kegiatan sesuai.')
+        return
+    for activity_name, (stored, actual) in drift.items():
+        click.echo(f'{activity_name}: tersimpan={stored} sebenarnya={actual}')
+    if repair:
+        click.echo(f'{len(drift)} penghitung diperbaiki.')
+    else:
+        click.echo('Jalankan dengan --repair untuk memperbaiki.')
+
+
+@bp.cli.command('verify-analytics')
+@click.option('--repair', is_flag=True, help='Bangun ulang tabel analitik yang tidak sesuai.')
+def verify_analytics_command(repair):
+    """Periksa (dan opsional bangun ulang) ringkasan analitik admin."""
     conn = get_db_connection()
-    # Buat pengguna admin default
-    admin_user = conn.execute("SELECT * FROM users WHERE email = 'admin@example.com'").fetchone()
-    if not admin_user:
-        hashed_admin_password = generate_password_hash('adminjago')
-        conn.execute('INSERT INTO users (email, name, nim, jurusan, password_hash, is_admin) VALUES (?, ?, ?, ?, ?, ?)', 
-                     ('admin@example.com', 'Administrator', '1234567890123', 'Teknik Informatika', hashed_admin_password, 1))
+    drift = verify_analytics(conn, repair=repair)
+    conn.commit()
+
+    if not drift:
+        click.echo('Semua tabel analitik sesuai.')
+        return
+    for table, differing in drift.items():
+        click.echo(f'{table}: {differing} kunci berbeda')
+    if repair:
+        click.echo(f'{len(drift)} tabel dibangun ulang.')
+    else:
+        click.echo('Jalankan dengan --repair untuk memperbaiki.')
+
+
+@bp.cli.command('import-students')
+@click.argument('csv_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--hash-method', default=None, help='Metode hash password (default: BULK_IMPORT_HASH_METHOD, lalu PASSWORD_HASH_METHOD).')
+@click.option('--batch-size', type=int, default=None)
+@click.option('--workers', type=int, default=None)
+def import_students_command(csv_path, hash_method, batch_size, workers):
+    """Impor akun mahasiswa dari file CSV (email,name,nim,jurusan,password)."""
+    started = time.perf_counter()
+    with open(csv_path, encoding='utf-8-sig', newline='') as csv_file:
+        report = import_students(get_db_connection(), csv_file, hash_method=hash_method,
+                                 batch_size=batch_size, workers=workers)
+    for line_number, message in report['errors']:
+        click.echo(f'Baris {line_number}: {message}', err=True)
+    click.echo(f'{report["inserted"]} dari {report["rows"]} akun diimpor dalam {time.perf_counter() - started:.1f} detik.')
+
+
+@bp.cli.command('prefetch-images')
+def prefetch_images_command():
+    """Unduh dan perkecil semua gambar kegiatan ke cache lokal (mis. saat deploy)."""
+    for key, url in activity_image_sources(current_app.config['ACTIVITY_IMAGE_WIDTH']).items():
+        try:
+            click.echo(f'{cached_activity_image(key, url)} <- {url}')
+        except (OSError, ValueError) as e:
+            click.echo(f'Gagal: {url} ({e})', err=True)
+
+
+@bp.cli.command('migrate-db')
+def migrate_db_command():
+    """Terapkan migrasi skema yang tertunda (untuk AUTO_MIGRATE=False)."""
+    applied = migrate_db(get_db_connection())
+    version = schema_version(get_db_connection())
+    click.echo(f'Migrasi diterapkan: {applied}; versi skema: {version}' if applied else f'Skema sudah terbaru (versi {version}).')
+
+
+@bp.cli.command('create-admin')
+@click.option('--email', default='admin@example.com', show_default=True)
+@click.option('--name', default='Administrator', show_default=True)
+@click.option('--nim', default='1234567890123', show_default=True)
+@click.option('--jurusan', type=click.Choice(JURUSAN_LIST), default='Teknik Informatika', show_default=True)
+@click.password_option()
+def create_admin_command(email, name, nim, jurusan, password):
+    """Buat akun admin jika email tersebut belum terdaftar."""
+    conn = get_db_connection()
+    if conn.execute('SELECT 1 FROM users WHERE email = ?', (email,)).fetchone():
+        click.echo(f'Akun {email} sudah ada; tidak ada yang diubah.')
+        return
+    try:
+        conn.execute('INSERT INTO users (email, name, nim, jurusan, password_hash, is_admin) VALUES (?, ?, ?, ?, ?, 1)',
+                     (email, name, nim, jurusan, generate_password_hash(password, current_app.config['PASSWORD_HASH_METHOD'])))
         conn.commit()
-    conn.close()
+    except sqlite3.IntegrityError:
+        raise click.ClickException(f'NIM {nim} sudah dipakai akun lain.')
+    click.echo(f'Admin {email} dibuat.')
+
 
-    app.run(debug=True)
\ No newline at end of file
+def create_app(config=None):
+    """Buat aplikasi Flask; config (dict) menimpa DEFAULT_CONFIG dan variabel lingkungan KEGIATAN_*.
+
+    Contoh: gunicorn -w 4 'app:create_app()' atau flask --app app run
+    Mode ASGI (route baca di event loop + executor terbatas): uvicorn --factory asgi:create_asgi_app
+    """
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    app.config.from_prefixed_env('KEGIATAN')
+    if config:
+        app.config.update(config)
+
+    app.extensions['kegiatan'] = {
+        'pool': None,
+        'metrics': Metrics(),
+        'password_hasher': PasswordHasher(app),
+        'catalog_cache': CatalogCache(),
+        'seat_broadcaster': SeatBroadcaster(app),
+        'selection_writer': SelectionWriter(app),
+        'rate_limiter': RateLimiter(),
+        'email_negative_cache': NegativeCache(app.config['EMAIL_NEGATIVE_CACHE_TTL'], app.config['EMAIL_NEGATIVE_CACHE_MAX_ENTRIES']),
+        'mail_outbox': MailOutbox(app),
+        'reset_token_sweeper': ResetTokenSweeper(app),
+    }
+    if app.config['PROXY_FIX_X_FOR']:
+        # request.remote_addr diambil dari X-Forwarded-For yang dipasang proxy tepercaya
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+    template_cache_dir = app.config['TEMPLATE_CACHE_DIR']
+    if template_cache_dir is not False:
+        # Template yang sudah dikompilasi disimpan di disk sehingga worker baru tidak mem-parse ulang Jinja
+        template_cache_dir = template_cache_dir or os.path.join(app.instance_path, 'jinja_cache')
+        os.makedirs(template_cache_dir, exist_ok=True)
+        app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(template_cache_dir)}
+    app.session_interface = ServerSideSessionInterface()
+    app.teardown_appcontext(release_db_connection)
+    before_render_template.connect(start_template_timer, app)
+    template_rendered.connect(record_template_render, app)
+    app.register_blueprint(bp)
+
+    if app.config['AUTO_MIGRATE']:
+        with app.app_context():
+            migrate_db(get_db_connection())
+            # Jangan bawa koneksi SQLite melewati fork (gunicorn --preload)
+            release_db_connection(None)
+            get_pool().close_all()
+    return app
+
+
+if __name__ == '__main__':
+    # Database tidak lagi dihapus saat start; buat admin sekali dengan: flask --app app create-admin
+    create_app().run(debug=True)
\ No newline at end of file
@@ -0,0 +1,250 @@
+"""Mode penyajian ASGI untuk aplikasi kegiatan.
+
+Koneksi klien ditangani event loop, jadi ribuan klien yang menunggu tidak masing-masing menahan thread.
+Pekerjaan yang memblokir (view Flask + I/O SQLite) tetap sinkron dan dijalankan di executor thread terbatas:
+route baca yang ramai memakai ASGI_READ_WORKERS thread, route lain (termasuk semua penulisan) memakai
+executor terpisah berukuran ASGI_WRITE_WORKERS. Stream SSE jumlah kursi berjalan async penuh.
+
+Contoh:
+    uvicorn --factory asgi:create_asgi_app --host 0.0.0.0 --port 8000
+"""
+import asyncio
+import contextvars
+import io
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import session
+
+import app as kegiatan_app
+
+# Route GET/HEAD yang hanya membaca database; selebihnya dianggap route tulis
+READ_PATHS = frozenset(('/', '/activities', '/participants_list', '/api/activities'))
+SEAT_STREAM_PATH = '/api/activities/stream'
+
+
+class AsgiAdapter:
+    """Aplikasi ASGI yang meneruskan request ke aplikasi Flask lewat executor baca/tulis terpisah."""
+
+    def __init__(self, app):
+        self.app = app
+        self.read_executor = ThreadPoolExecutor(app.config['ASGI_READ_WORKERS'], thread_name_prefix='kegiatan-read')
+        self.write_executor = ThreadPoolExecutor(app.config['ASGI_WRITE_WORKERS'], thread_name_prefix='kegiatan-write')
+        self.broadcaster = app.extensions['kegiatan']['seat_broadcaster']
+        self._loop = None
+        self._seat_event = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            body = await self._read_body(receive)
+            if scope['path'] == SEAT_STREAM_PATH and scope['method'] == 'GET':
+                await self._seat_stream(scope, receive, send)
+            else:
+                await self._dispatch(scope, body, send)
+        else:
+            raise ValueError(f'Tipe scope ASGI tidak didukung: {scope["type"]}')
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._bind_loop()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _bind_loop(self):
+        # Listener broadcaster dipasang sekali per event loop (server yang mematikan lifespan juga didukung)
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        if self._loop is not None:
+            self.broadcaster.remove_listener(self._seats_published)
+        self._loop = loop
+        self._seat_event = asyncio.Event()
+        self.broadcaster.add_listener(self._seats_published)
+
+    def close(self):
+        if self._loop is not None:
+            self.broadcaster.remove_listener(self._seats_published)
+            self._loop = None
+        self.read_executor.shutdown(wait=False)
+        self.write_executor.shutdown(wait=False)
+
+    @staticmethod
+    async def _read_body(receive):
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        return b''.join(chunks)
+
+    def _environ(self, scope, body):
+        root_path = scope.get('root_path', '')
+        path = scope['path']
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            # WSGI memakai string "bytes-as-latin-1" untuk path
+            'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+            'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1] or 80),
+            'SERVER_PROTOCOL': f'HTTP/{scope["http_version"]}',
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.input_terminated': True,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope['headers']:
+            key = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if key == 'CONTENT_LENGTH':
+                continue
+            if key != 'CONTENT_TYPE':
+                key = f'HTTP_{key}'
+            if key in environ:
+                value = f'{environ[key]}{"; " if key == "HTTP_COOKIE" else ","}{value}'
+            environ[key] = value
+        return environ
+
+    def _start_wsgi(self, environ):
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+        body = self.app(environ, start_response)
+        chunks, done = self._pull_body(body, iter(body))
+        return response['status'], response['headers'], body, chunks, done
+
+    def _pull_body(self, body, iterator):
+        # Respons biasa selesai dalam satu giliran; respons streaming diambil per ASGI_BODY_CHUNK byte
+        limit = self.app.config['ASGI_BODY_CHUNK']
+        chunks, size = [], 0
+        for chunk in iterator:
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= limit:
+                return chunks, False
+        if hasattr(body, 'close'):
+            body.close()
+        return chunks, True
+
+    async def _dispatch(self, scope, body, send):
+        is_read = scope['method'] in ('GET', 'HEAD') and scope['path'] in READ_PATHS
+        executor = self.read_executor if is_read else self.write_executor
+        loop = asyncio.get_running_loop()
+        # Semua giliran satu request memakai Context yang sama: stream_with_context mem-push dan mem-pop
+        # ContextVar Flask dari giliran executor yang berbeda (bisa di thread lain)
+        context = contextvars.Context()
+        status, headers, wsgi_body, chunks, done = await loop.run_in_executor(
+            executor, context.run, self._start_wsgi, self._environ(scope, body))
+        iterator = iter(wsgi_body)
+        try:
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            while True:
+                await send({'type': 'http.response.body', 'body': b''.join(chunks), 'more_body': not done})
+                if done:
+                    return
+                chunks, done = await loop.run_in_executor(executor, context.run, self._pull_body, wsgi_body, iterator)
+        finally:
+            if not done and hasattr(wsgi_body, 'close'):
+                await loop.run_in_executor(executor, context.run, wsgi_body.close)
+
+    def _seat_stream_counts(self, environ):
+        # Cek sesi dan ambil counter awal di executor baca; None berarti belum login
+        with self.app.request_context(environ):
+            if not session.get('logged_in'):
+                return None
+            return kegiatan_app.catalog_cache.get()['counts']
+
+    def _seats_published(self):
+        # Dipanggil dari thread penerbit broadcaster
+        self._loop.call_soon_threadsafe(self._wake_seat_streams)
+
+    def _wake_seat_streams(self):
+        event, self._seat_event = self._seat_event, asyncio.Event()
+        event.set()
+
+    @staticmethod
+    async def _send_json(send, status, payload, headers=()):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()),
+                                *headers]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _seat_stream(self, scope, receive, send):
+        """Padanan async dari api_activities_stream: satu task per penonton, tanpa thread."""
+        self._bind_loop()
+        loop = asyncio.get_running_loop()
+        counts = await loop.run_in_executor(self.read_executor, contextvars.Context().run,
+                                            self._seat_stream_counts, self._environ(scope, b''))
+        if counts is None:
+            await self._send_json(send, 401, {'error': 'Anda harus masuk untuk melihat kegiatan.'})
+            return
+        version = self.broadcaster.subscribe(counts, max_clients=self.app.config['ASGI_SEAT_STREAM_MAX_CLIENTS'])
+        if version is None:
+            await self._send_json(send, 503, {'error': 'Terlalu banyak koneksi realtime. Muat ulang halaman secara berkala.'},
+                                  headers=[(b'retry-after', b'30')])
+            return
+
+        keepalive = self.app.config['SEAT_STREAM_KEEPALIVE']
+        disconnected = loop.create_task(receive())
+        try:
+            await send({'type': 'http.response.start', 'status': 200,
+                        'headers': [(b'content-type', b'text/event-stream; charset=utf-8'),
+                                    (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')]})
+            current, seats = self.broadcaster.snapshot()
+            message = 'retry: 3000\n' + kegiatan_app.format_seat_event(current, 'snapshot', seats)
+            while True:
+                await send({'type': 'http.response.body', 'body': message.encode('utf-8'), 'more_body': True})
+                # Ambil event sebelum mengecek versi agar publikasi di antara keduanya tidak terlewat
+                changed = self._seat_event
+                update = self.broadcaster.wait(current, 0)
+                if update is None:
+                    waiter = loop.create_task(changed.wait())
+                    done, _ = await asyncio.wait((disconnected, waiter), timeout=keepalive,
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                    waiter.cancel()
+                    if disconnected in done:
+                        return
+                    update = self.broadcaster.wait(current, 0)
+                if update is None:
+                    message = kegiatan_app.SEAT_STREAM_KEEPALIVE_EVENT
+                    continue
+                current, event, seats = update
+                message = kegiatan_app.format_seat_event(current, event, seats)
+        except OSError:
+            # Klien memutus koneksi saat data sedang dikirim
+            return
+        finally:
+            disconnected.cancel()
+            self.broadcaster.unsubscribe()
+
+
+def create_asgi_app(config=None):
+    """Buat aplikasi ASGI di atas create_app(config); konfigurasi sama dengan mode WSGI."""
+    return AsgiAdapter(kegiatan_app.create_app(config))
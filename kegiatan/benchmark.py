@@ -0,0 +1,1640 @@
+"""Benchmark beban untuk aplikasi kegiatan.
+
+Contoh:
+    python benchmark.py pool --writers 8 --readers 8 --ops 200
+    python benchmark.py enroll --users 3000 --threads 32
+    python benchmark.py export --rows 500000
+    python benchmark.py wib --values 200000
+    python benchmark.py login --logins 200 --threads 32
+    python benchmark.py import --rows 50000
+    python benchmark.py flow --seed-users 5000 --visitors 200 --threads 16 --output hasil.json
+    python benchmark.py flow --compare hasil-sebelum.json
+    python benchmark.py search --users 100000
+    python benchmark.py analytics --registrations 100000
+    python benchmark.py groupcommit --users 3000 --threads 32
+    python benchmark.py serve --clients 1000 --requests 5
+    python benchmark.py ratelimit --calls 200000
+    python benchmark.py waitlist --waiters 300 --freed 30
+    python benchmark.py reset --requests 100 --mail-delay-ms 100
+"""
+import argparse
+import asyncio
+import csv
+import http.client
+import http.cookies
+import io
+import importlib.util
+import json
+import logging
+import os
+import random
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import resource
+import urllib.parse
+
+from werkzeug.serving import make_server
+
+import app as kegiatan_app
+
+# Aplikasi untuk database sementara yang sedang diuji; dibuat ulang oleh make_temp_database
+app = None
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    # Latensi dalam milidetik
+    return {
+        'count': len(samples),
+        'mean_ms': round(statistics.mean(samples) * 1000, 3) if samples else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'max_ms': round(max(samples) * 1000, 3) if samples else 0.0,
+    }
+
+
+def make_temp_database(directory, users=0, **config):
+    global app
+    database = os.path.join(directory, 'kegiatan_registrasi.db')
+    app = kegiatan_app.create_app({'DATABASE': database, **config})
+    with app.app_context():
+        if users:
+            conn = kegiatan_app.get_db_connection()
+            conn.executemany('INSERT INTO users (email, name, nim, jurusan, password_hash) VALUES (?, ?, ?, ?, ?)',
+                             [(f'user{i}@example.com', f'User {i}', f'{i:013d}', 'Teknik Informatika', 'x')
+                              for i in range(1, users + 1)])
+            conn.commit()
+    # Lepaskan koneksi pool agar mode benchmark bisa mengatur journal sendiri
+    close_pool()
+    return database
+
+
+def close_pool():
+    with app.app_context():
+        kegiatan_app.get_pool().close_all()
+
+
+def shutdown_hasher():
+    # Setiap app punya process pool hashing sendiri; hentikan sebelum app berikutnya dibuat
+    app.extensions['kegiatan']['password_hasher'].shutdown()
+
+
+def run_threads(workers):
+    threads = [threading.Thread(target=worker) for worker in workers]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def bench_pool(args):
+    """Bandingkan koneksi baru per operasi (journal default) dengan ConnectionPool (WAL)."""
+    activities = list(kegiatan_app.ACTIVITIES)
+    original_capacity = {name: data['capacity'] for name, data in kegiatan_app.ACTIVITIES.items()}
+    # Kuota dinaikkan selama benchmark: yang diukur latensi tulis, bukan penolakan saat kursi habis
+    for data in kegiatan_app.ACTIVITIES.values():
+        data['capacity'] = args.writers * args.ops
+    results = {}
+    try:
+        for mode in ('legacy', 'pooled'):
+            with tempfile.TemporaryDirectory() as directory:
+                users = args.writers * args.ops
+                database = make_temp_database(directory, users=users)
+                if mode == 'legacy':
+                    # Kembalikan ke mode rollback journal seperti sebelum pool dipakai
+                    conn = sqlite3.connect(database)
+                    conn.execute('PRAGMA journal_mode = DELETE')
+                    conn.close()
+
+                    def acquire():
+                        conn = sqlite3.connect(database)
+                        conn.row_factory = sqlite3.Row
+                        return conn
+
+                    def release(conn):
+                        conn.close()
+                else:
+                    pool = kegiatan_app.ConnectionPool(database, max_idle=args.writers + args.readers)
+                    acquire, release = pool.acquire, pool.release
+
+                write_samples, read_samples, errors, rejected = [], [], [], []
+                lock = threading.Lock()
+
+                def writer(offset):
+                    def work():
+                        local = []
+                        for i in range(args.ops):
+                            user_id = offset * args.ops + i + 1
+                            chosen = [activities[(user_id + k) % len(activities)] for k in range(3)]
+                            started = time.perf_counter()
+                            conn = acquire()
+                            try:
+                                cursor = conn.execute('INSERT INTO user_final_selection (user_id) VALUES (?)', (user_id,))
+                                kegiatan_app.save_selected_activities(conn, cursor.lastrowid, chosen)
+                                conn.commit()
+                            except sqlite3.OperationalError as e:
+                                conn.rollback()
+                                with lock:
+                                    errors.append(str(e))
+                            except kegiatan_app.ActivityFullError:
+                                conn.rollback()
+                                with lock:
+                                    rejected.append(user_id)
+                            finally:
+                                release(conn)
+                            local.append(time.perf_counter() - started)
+                        with lock:
+                            write_samples.extend(local)
+                    return work
+
+                def reader():
+                    local = []
+                    for _ in range(args.ops):
+                        started = time.perf_counter()
+                        conn = acquire()
+                        try:
+                            kegiatan_app.fetch_activity_counts(conn)
+                        except sqlite3.OperationalError as e:
+                            with lock:
+                                errors.append(str(e))
+                        finally:
+                            release(conn)
+                        local.append(time.perf_counter() - started)
+                    with lock:
+                        read_samples.extend(local)
+
+                elapsed = run_threads([writer(n) for n in range(args.writers)] + [reader] * args.readers)
+                if mode == 'pooled':
+                    pool.close_all()
+                results[mode] = {
+                    'elapsed_s': round(elapsed, 3),
+                    'write': summarize(write_samples),
+                    'read': summarize(read_samples),
+                    'errors': len(errors),
+                    'rejected_full': len(rejected),
+                }
+    finally:
+        for name, capacity in original_capacity.items():
+            kegiatan_app.ACTIVITIES[name]['capacity'] = capacity
+    return results
+
+
+def bench_enroll(args):
+    """Kirim banyak POST /confirm_selection bersamaan dan pastikan tidak ada kegiatan yang melebihi kuota."""
+    activities = list(kegiatan_app.ACTIVITIES)
+    rng = random.Random(args.seed)
+    choices = [rng.sample(activities, rng.randint(1, 3)) for _ in range(args.users)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = make_temp_database(directory, users=args.users)
+        pending = list(range(1, args.users + 1))
+        lock = threading.Lock()
+        samples = []
+
+        def worker():
+            client = app.test_client()
+            local = []
+            while True:
+                with lock:
+                    if not pending:
+                        break
+                    user_id = pending.pop()
+                with client.session_transaction() as sess:
+                    sess['logged_in'] = True
+                    sess['user_id'] = user_id
+                started = time.perf_counter()
+                client.post('/confirm_selection', data={'selected_activities': choices[user_id - 1]})
+                local.append(time.perf_counter() - started)
+            with lock:
+                samples.extend(local)
+
+        elapsed = run_threads([worker] * args.threads)
+        close_pool()
+
+        conn = sqlite3.connect(database)
+        conn.row_factory = sqlite3.Row
+        enrolled = conn.execute('SELECT COUNT(*) FROM user_final_selection').fetchone()[0]
+        oversold = {}
+        for row in conn.execute('SELECT activity, COUNT(*) AS total FROM selection_activity GROUP BY activity'):
+            capacity = kegiatan_app.ACTIVITIES[row['activity']]['capacity']
+            if row['total'] > capacity:
+                oversold[row['activity']] = {'enrolled': row['total'], 'capacity': capacity}
+        drift = kegiatan_app.verify_activity_counters(conn)
+        conn.close()
+
+    if oversold or drift:
+        raise SystemExit(f'Kuota terlampaui: {oversold} / penghitung tidak sesuai: {drift}')
+    return {
+        'confirmations': args.users,
+        'threads': args.threads,
+        'enrolled': enrolled,
+        'rejected': args.users - enrolled,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_per_s': round(args.users / elapsed, 1),
+        'latency': summarize(samples),
+        'oversold': oversold,
+    }
+
+
+def seed_registrations(database, count, seed=1):
+    # Isi pengguna + pilihan sintetis langsung lewat executemany, tanpa hashing password
+    activities = list(kegiatan_app.ACTIVITIES)
+    rng = random.Random(seed)
+    conn = sqlite3.connect(database)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = OFF')
+    batch = 10000
+    for start in range(1, count + 1, batch):
+        ids = range(start, min(start + batch, count + 1))
+        conn.executemany('INSERT INTO users (id, email, name, nim, jurusan, password_hash) VALUES (?, ?, ?, ?, ?, ?)',
+                         [(i, f'user{i}@example.com', f'User {i}', f'{i:013d}', kegiatan_app.JURUSAN_LIST[i % 4], 'x')
+                          for i in ids])
+        conn.executemany('INSERT INTO user_final_selection (id, user_id, submission_date) VALUES (?, ?, ?)',
+                         [(i, i, f'2024-0{1 + i % 9}-{1 + i % 28:02d} {i % 24:02d}:{i % 60:02d}:{(i * 7) % 60:02d}')
+                          for i in ids])
+        conn.executemany('INSERT INTO selection_activity (selection_id, activity) VALUES (?, ?)',
+                         [(i, activity) for i in ids for activity in rng.sample(activities, rng.randint(1, 3))])
+    conn.commit()
+    # Penghitung tidak dipakai untuk ekspor; kapasitas sengaja diabaikan pada data sintetis
+    kegiatan_app.verify_activity_counters(conn, repair=True)
+    conn.commit()
+    conn.close()
+
+
+def admin_client():
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['logged_in'] = True
+        sess['user_id'] = 0
+        sess['is_admin'] = 1
+    return client
+
+
+def bench_export(args):
+    """Ukur time-to-first-byte, total waktu, dan puncak memori /admin/export.csv."""
+    with tempfile.TemporaryDirectory() as directory:
+        database = make_temp_database(directory)
+        seeded = time.perf_counter()
+        seed_registrations(database, args.rows)
+        seed_s = time.perf_counter() - seeded
+
+        client = admin_client()
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        response = client.get('/admin/export.csv', buffered=False)
+        first_byte_s = None
+        total_bytes = 0
+        lines = 0
+        for chunk in response.response:
+            if first_byte_s is None:
+                first_byte_s = time.perf_counter() - started
+            total_bytes += len(chunk)
+            lines += chunk.count(b'\n') if isinstance(chunk, bytes) else chunk.count('\n')
+        elapsed = time.perf_counter() - started
+        response.close()
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        close_pool()
+
+    return {
+        'rows': args.rows,
+        'seed_s': round(seed_s, 3),
+        'csv_lines': lines,
+        'bytes': total_bytes,
+        'time_to_first_byte_ms': round((first_byte_s or 0) * 1000, 3),
+        'elapsed_s': round(elapsed, 3),
+        'rows_per_s': round(args.rows / elapsed, 1),
+        # ru_maxrss dalam KiB di Linux; termasuk halaman database yang di-mmap (dibatasi PRAGMA mmap_size)
+        'peak_rss_growth_mb': round((rss_after - rss_before) / 1024, 2),
+    }
+
+
+def bench_wib(args):
+    """Bandingkan konversi UTC->WIB lama (pytz per nilai) dengan jalur cepat, cache LRU, dan batch."""
+    rng = random.Random(args.seed)
+    values = [f'{rng.randint(2023, 2026)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} '
+              f'{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}'
+              for _ in range(args.values)]
+    # Nilai tepi ikut diperiksa agar hasilnya identik dengan implementasi lama
+    edge_values = ['', None, '2024-12-31 20:00:00.123', '2024-02-30 00:00:00', '2024-1-5 3:4:5',
+                   'bukan tanggal', '1950-06-01 00:00:00', '2024-01-01T00:00:00']
+
+    def legacy(value):
+        return kegiatan_app._convert_utc_to_wib_pytz(value) if value else ""
+
+    mismatches = [value for value in values + edge_values
+                  if legacy(value) != kegiatan_app.convert_utc_to_wib(value)
+                  or [legacy(value)] != kegiatan_app.convert_utc_to_wib_batch([value])]
+    if mismatches:
+        raise SystemExit(f'Hasil konversi berbeda untuk: {mismatches[:10]}')
+
+    def timed(func):
+        started = time.perf_counter()
+        func()
+        return time.perf_counter() - started
+
+    kegiatan_app.convert_utc_to_wib.cache_clear()
+    results = {
+        'legacy_pytz_s': timed(lambda: [legacy(value) for value in values]),
+        'single_cold_cache_s': timed(lambda: [kegiatan_app.convert_utc_to_wib(value) for value in values]),
+        'single_warm_cache_s': timed(lambda: [kegiatan_app.convert_utc_to_wib(value) for value in values]),
+        'batch_s': timed(lambda: kegiatan_app.convert_utc_to_wib_batch(values)),
+    }
+    summary = {name: round(seconds, 4) for name, seconds in results.items()}
+    summary['values'] = args.values
+    summary['batch_speedup'] = round(results['legacy_pytz_s'] / results['batch_s'], 1)
+    return summary
+
+
+def bench_login(args):
+    """Badai login bersamaan: hashing langsung tanpa batas (perilaku lama) vs process pool dengan backpressure."""
+    results = {}
+    password = 'rahasia-benchmark'
+    default_max_pending = kegiatan_app.DEFAULT_CONFIG['PASSWORD_HASH_MAX_PENDING']
+    modes = (('inline_unbounded', 0, args.logins), ('process_pool', args.workers, default_max_pending))
+    for mode, workers, max_pending in modes:
+        with tempfile.TemporaryDirectory() as directory:
+            database = make_temp_database(directory, users=args.users,
+                                          PASSWORD_HASH_WORKERS=workers, PASSWORD_HASH_MAX_PENDING=max_pending)
+            # Satu hash dipakai semua akun: biaya verifikasi sama, seeding tidak perlu ribuan hash
+            shared_hash = kegiatan_app.generate_password_hash(password, app.config['PASSWORD_HASH_METHOD'])
+            conn = sqlite3.connect(database)
+            conn.execute('UPDATE users SET password_hash = ?', (shared_hash,))
+            conn.commit()
+            conn.close()
+
+            pending = list(range(args.logins))
+            lock = threading.Lock()
+            samples, statuses = [], {}
+
+            def worker():
+                client = app.test_client()
+                local = []
+                while True:
+                    with lock:
+                        if not pending:
+                            break
+                        n = pending.pop()
+                    email = f'user{n % args.users + 1}@example.com'
+                    started = time.perf_counter()
+                    response = client.post('/login', data={'email': email, 'password': password})
+                    local.append(time.perf_counter() - started)
+                    with lock:
+                        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                with lock:
+                    samples.extend(local)
+
+            elapsed = run_threads([worker] * args.threads)
+            close_pool()
+            with app.app_context():
+                hasher_stats = kegiatan_app.password_hasher.stats()
+            shutdown_hasher()
+            results[mode] = {
+                'workers': workers,
+                'elapsed_s': round(elapsed, 3),
+                'throughput_per_s': round(args.logins / elapsed, 1),
+                'successful_logins_per_s': round(statuses.get(302, 0) / elapsed, 1),
+                'latency': summarize(samples),
+                'statuses': statuses,
+                'hasher': hasher_stats,
+            }
+    return results
+
+
+def bench_import(args):
+    """Impor massal CSV lewat halaman admin (job latar) dengan metode hash yang dikonfigurasi aplikasi."""
+    config = {'BULK_IMPORT_HASH_METHOD': args.hash_method} if args.hash_method else {}
+    if args.workers:
+        config['BULK_IMPORT_WORKERS'] = args.workers
+    with tempfile.TemporaryDirectory() as directory:
+        database = make_temp_database(directory, **config)
+        rows = io.BytesIO()
+        text = io.TextIOWrapper(rows, encoding='utf-8', newline='', write_through=True)
+        writer = csv.writer(text)
+        writer.writerow(kegiatan_app.IMPORT_COLUMNS)
+        for i in range(1, args.rows + 1):
+            writer.writerow([f'mhs{i}@example.com', f'Mahasiswa {i}', f'{i:013d}',
+                             kegiatan_app.JURUSAN_LIST[i % 4], f'awal-{i}'])
+        rows.seek(0)
+
+        client = admin_client()
+        started = time.perf_counter()
+        response = client.post('/admin/import_students', data={'file': (rows, 'mahasiswa.csv')})
+        upload_elapsed = time.perf_counter() - started
+        job_id = int(response.headers['Location'].rstrip('/').rsplit('/', 1)[1])
+        conn = sqlite3.connect(database)
+        conn.row_factory = sqlite3.Row
+        progress_polls = 0
+        while True:
+            job = conn.execute('SELECT * FROM import_job WHERE id = ?', (job_id,)).fetchone()
+            if job['status'] != 'running':
+                break
+            progress_polls += 1
+            time.sleep(0.2)
+        elapsed = time.perf_counter() - started
+        conn.close()
+        status_page = client.get(f'/admin/import_students/{job_id}').status_code
+        close_pool()
+
+    return {
+        'rows': args.rows,
+        'status': job['status'],
+        'inserted': job['inserted'],
+        'errors': job['error_count'],
+        'workers': args.workers or app.config['BULK_IMPORT_WORKERS'],
+        'hash_method': app.config['BULK_IMPORT_HASH_METHOD'] or app.config['PASSWORD_HASH_METHOD'],
+        'upload_response_ms': round(upload_elapsed * 1000, 1),
+        'status_page': status_page,
+        'progress_polls': progress_polls,
+        'elapsed_s': round(elapsed, 3),
+        'rows_per_s': round(args.rows / elapsed, 1),
+    }
+
+
+# Urutan langkah satu pengunjung; status lain dihitung sebagai error pada rute tersebut
+FLOW_STEPS = (
+    ('POST /register', 302),
+    ('POST /login', 302),
+    ('GET /activities', 200),
+    ('GET /confirm_selection', 200),
+    ('POST /confirm_selection', 302),
+    ('GET /participants_list', 200),
+    ('GET /admin', 200),
+)
+FLOW_ADMIN_EMAIL = 'admin-benchmark@example.com'
+FLOW_ADMIN_PASSWORD = 'admin-benchmark'
+
+
+class TestClientSession:
+    """Klien Flask in-process; cookie sesi disimpan oleh test client."""
+
+    def __init__(self):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        if method == 'GET':
+            return self.client.get(path, query_string=data).status_code
+        return self.client.post(path, data=data).status_code
+
+    def close(self):
+        pass
+
+
+class HttpSession:
+    """Klien HTTP minimal dengan cookie, satu koneksi TCP per request; redirect tidak diikuti."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.cookies = http.cookies.SimpleCookie()
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data or {}, doseq=True)
+        headers = {'Connection': 'close'}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{key}={morsel.value}' for key, morsel in self.cookies.items())
+        if method == 'GET':
+            path = f'{path}?{body}' if body else path
+            body = None
+        else:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            for header in response.headers.get_all('Set-Cookie') or ():
+                self.cookies.load(header)
+            return response.status
+        finally:
+            conn.close()
+
+    def close(self):
+        self.cookies.clear()
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_flow(args, make_session, visitors, activities):
+    """Jalankan register -> login -> jelajah -> konfirmasi -> daftar peserta -> dashboard admin per pengunjung."""
+    pending = list(range(visitors))
+    lock = threading.Lock()
+    samples = {route: [] for route, _ in FLOW_STEPS}
+    errors = {route: {} for route, _ in FLOW_STEPS}
+    rng = random.Random(args.seed)
+    choices = [rng.sample(activities, rng.randint(1, 3)) for _ in range(visitors)]
+
+    def timed(local, route, expected, method, path, session, data=None):
+        started = time.perf_counter()
+        status = session.request(method, path, data)
+        local[route].append(time.perf_counter() - started)
+        if status != expected:
+            with lock:
+                errors[route][status] = errors[route].get(status, 0) + 1
+
+    def worker():
+        local = {route: [] for route, _ in FLOW_STEPS}
+        admin = make_session()
+        admin.request('POST', '/login', {'email': FLOW_ADMIN_EMAIL, 'password': FLOW_ADMIN_PASSWORD})
+        while True:
+            with lock:
+                if not pending:
+                    break
+                n = pending.pop()
+            visitor = make_session()
+            email = f'pengunjung{n}@example.com'
+            selected = {'selected_activities': choices[n]}
+            timed(local, 'POST /register', 302, 'POST', '/register', visitor,
+                  {'email': email, 'name': f'Pengunjung {n}', 'nim': f'9{n:012d}',
+                   'jurusan': kegiatan_app.JURUSAN_LIST[n % 4], 'password': 'pengunjung'})
+            timed(local, 'POST /login', 302, 'POST', '/login', visitor, {'email': email, 'password': 'pengunjung'})
+            timed(local, 'GET /activities', 200, 'GET', '/activities', visitor)
+            timed(local, 'GET /confirm_selection', 200, 'GET', '/confirm_selection', visitor, selected)
+            timed(local, 'POST /confirm_selection', 302, 'POST', '/confirm_selection', visitor, selected)
+            timed(local, 'GET /participants_list', 200, 'GET', '/participants_list', visitor)
+            timed(local, 'GET /admin', 200, 'GET', '/admin', admin)
+            visitor.close()
+        admin.close()
+        with lock:
+            for route, values in local.items():
+                samples[route].extend(values)
+
+    elapsed = run_threads([worker] * args.threads)
+    total = sum(len(values) for values in samples.values())
+    routes = {}
+    for route, _ in FLOW_STEPS:
+        routes[route] = summarize(samples[route])
+        routes[route]['throughput_per_s'] = round(len(samples[route]) / elapsed, 1)
+        routes[route]['errors'] = errors[route]
+    return {
+        'elapsed_s': round(elapsed, 3),
+        'requests': total,
+        'throughput_per_s': round(total / elapsed, 1),
+        'flows_per_s': round(visitors / elapsed, 1),
+        'error_count': sum(sum(statuses.values()) for statuses in errors.values()),
+        'routes': routes,
+    }
+
+
+def compare_flow(baseline, current):
+    # Selisih p50/p95/p99 per rute (positif = lebih lambat dari baseline)
+    report = {}
+    for mode, result in current.items():
+        if mode not in baseline.get('modes', {}):
+            continue
+        before = baseline['modes'][mode]['routes']
+        report[mode] = {
+            route: {key: round(stats[key] - before[route][key], 3) for key in ('p50_ms', 'p95_ms', 'p99_ms')}
+            for route, stats in result['routes'].items() if route in before
+        }
+    return report
+
+
+def bench_flow(args):
+    """Alur pendaftaran ujung ke ujung lewat test client dan server HTTP sungguhan dengan klien bersamaan."""
+    activities = list(kegiatan_app.ACTIVITIES)
+    original_capacity = {name: data['capacity'] for name, data in kegiatan_app.ACTIVITIES.items()}
+    config = {'PASSWORD_HASH_METHOD': args.hash_method} if args.hash_method else {}
+    # Kuota dinaikkan selama benchmark agar data sintetis dan semua pengunjung mendapat kursi
+    for data in kegiatan_app.ACTIVITIES.values():
+        data['capacity'] = args.seed_users + args.visitors
+    modes = ('client', 'http') if args.mode == 'both' else (args.mode,)
+    results = {}
+    try:
+        for mode in modes:
+            with tempfile.TemporaryDirectory() as directory:
+                database = make_temp_database(directory, **config)
+                seed_registrations(database, args.seed_users, seed=args.seed)
+                conn = sqlite3.connect(database)
+                conn.execute('INSERT INTO users (email, name, nim, jurusan, password_hash, is_admin) VALUES (?, ?, ?, ?, ?, 1)',
+                             (FLOW_ADMIN_EMAIL, 'Admin Benchmark', '8000000000000', kegiatan_app.JURUSAN_LIST[0],
+                              kegiatan_app.generate_password_hash(FLOW_ADMIN_PASSWORD,
+                                                                  app.config['PASSWORD_HASH_METHOD'])))
+                conn.commit()
+                conn.close()
+
+                server = None
+                if mode == 'http':
+                    # Log akses per request hanya menambah beban I/O pada hasil pengukuran
+                    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+                    server = make_server('127.0.0.1', 0, app, threaded=True)
+                    threading.Thread(target=server.serve_forever, daemon=True).start()
+                    make_session = lambda: HttpSession('127.0.0.1', server.server_port)
+                else:
+                    make_session = TestClientSession
+                try:
+                    results[mode] = run_flow(args, make_session, args.visitors, activities)
+                finally:
+                    if server is not None:
+                        server.shutdown()
+                        server.server_close()
+                close_pool()
+                shutdown_hasher()
+
+                conn = sqlite3.connect(database)
+                enrolled = conn.execute('SELECT COUNT(*) FROM user_final_selection').fetchone()[0]
+                conn.close()
+                results[mode]['enrolled_visitors'] = enrolled - args.seed_users
+    finally:
+        for name, capacity in original_capacity.items():
+            kegiatan_app.ACTIVITIES[name]['capacity'] = capacity
+
+    report = {
+        'commit': current_commit(),
+        'seed_users': args.seed_users,
+        'visitors': args.visitors,
+        'threads': args.threads,
+        'hash_method': args.hash_method or kegiatan_app.DEFAULT_CONFIG['PASSWORD_HASH_METHOD'],
+        'modes': results,
+    }
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        report['compare'] = {'baseline_commit': baseline.get('commit'), 'delta_ms': compare_flow(baseline, results)}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, indent=2)
+    return report
+
+
+def bench_search(args):
+    """Latensi pencarian admin (FTS5 + awalan NIM) atas banyak pengguna sintetis."""
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        database = make_temp_database(directory)
+        seeded = time.perf_counter()
+        # Trigger users -> user_search ikut mengisi indeks FTS saat seeding
+        seed_registrations(database, args.users, seed=args.seed)
+        seed_s = time.perf_counter() - seeded
+
+        ids = [rng.randint(1, args.users) for _ in range(args.queries)]
+        jurusan_words = ['informatika', 'sipil', 'arsitektur', 'pertambangan']
+        workloads = {
+            'name_exact': [f'User {i}' for i in ids],
+            'name_prefix': [f'user {str(i)[:3]}' for i in ids],
+            'email_prefix': [f'user{i}@exa' for i in ids],
+            'nim_prefix': [f'{i:013d}'[:rng.randint(6, 13)] for i in ids],
+            'name_and_jurusan': [f'{i} {jurusan_words[i % 4]}' for i in ids],
+            'broad_jurusan': [jurusan_words[i % 4] for i in ids],
+        }
+        client = admin_client()
+        results = {'users': args.users, 'seed_s': round(seed_s, 3)}
+        with app.app_context():
+            conn = kegiatan_app.get_db_connection()
+            for name, queries in workloads.items():
+                direct, http, hits = [], [], 0
+                for query in queries:
+                    started = time.perf_counter()
+                    rows, _, _ = kegiatan_app.search_users(conn, query, limit=args.limit)
+                    direct.append(time.perf_counter() - started)
+                    hits += len(rows)
+                    started = time.perf_counter()
+                    client.get('/admin/api/search', query_string={'q': query, 'limit': args.limit})
+                    http.append(time.perf_counter() - started)
+                results[name] = {
+                    'example_query': queries[0],
+                    'avg_results': round(hits / len(queries), 1),
+                    'search_users': summarize(direct),
+                    'endpoint': summarize(http),
+                }
+        close_pool()
+    return results
+
+
+def bench_analytics(args):
+    """Analitik admin dari tabel ringkasan (trigger) vs agregat SQL langsung, plus biaya trigger per pendaftaran."""
+    original_capacity = {name: data['capacity'] for name, data in kegiatan_app.ACTIVITIES.items()}
+    for data in kegiatan_app.ACTIVITIES.values():
+        data['capacity'] = args.registrations + 2 * args.writes
+    activities = list(kegiatan_app.ACTIVITIES)
+    rng = random.Random(args.seed)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            database = make_temp_database(directory)
+            started = time.perf_counter()
+            # Trigger analitik ikut berjalan untuk setiap baris yang di-seed
+            seed_registrations(database, args.registrations, seed=args.seed)
+            results = {'registrations': args.registrations, 'seed_s': round(time.perf_counter() - started, 3)}
+            client = admin_client()
+            with app.app_context():
+                conn = kegiatan_app.get_db_connection()
+                summary, aggregate = [], []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    kegiatan_app.fetch_analytics(conn)
+                    summary.append(time.perf_counter() - started)
+                    started = time.perf_counter()
+                    for _, query in kegiatan_app.ANALYTICS_SOURCES.values():
+                        conn.execute(query).fetchall()
+                    aggregate.append(time.perf_counter() - started)
+                results['fetch_analytics'] = summarize(summary)
+                results['sql_aggregates_on_the_fly'] = summarize(aggregate)
+                results['drift'] = kegiatan_app.verify_analytics(conn)
+
+                # Latensi enroll_user dengan dan tanpa trigger analitik pada database yang sama
+                conn.executemany('INSERT INTO users (id, email, name, nim, jurusan, password_hash) VALUES (?, ?, ?, ?, ?, ?)',
+                                 [(i, f'baru{i}@example.com', f'Baru {i}', f'7{i:012d}', kegiatan_app.JURUSAN_LIST[i % 4], 'x')
+                                  for i in range(args.registrations + 1, args.registrations + 2 * args.writes + 1)])
+                conn.commit()
+                user_ids = iter(range(args.registrations + 1, args.registrations + 2 * args.writes + 1))
+                for label in ('enroll_with_triggers', 'enroll_without_triggers'):
+                    if label == 'enroll_without_triggers':
+                        for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE '%analytics%'").fetchall():
+                            conn.execute(f'DROP TRIGGER {name}')
+                        conn.commit()
+                    samples = []
+                    for _ in range(args.writes):
+                        chosen = rng.sample(activities, rng.randint(1, 3))
+                        started = time.perf_counter()
+                        kegiatan_app.enroll_user(conn, next(user_ids), chosen)
+                        samples.append(time.perf_counter() - started)
+                    results[label] = summarize(samples)
+
+            for path in ('/admin/api/analytics', '/admin/analytics'):
+                samples = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    response = client.get(path)
+                    samples.append(time.perf_counter() - started)
+                    assert response.status_code == 200, response.status_code
+                results[path] = summarize(samples)
+            close_pool()
+    finally:
+        for name, capacity in original_capacity.items():
+            kegiatan_app.ACTIVITIES[name]['capacity'] = capacity
+    return results
+
+
+def group_commit_child(database, users, threads, batch_max, batch_wait_ms, connection):
+    """Proses anak uji ketahanan: konfirmasi lewat group commit, setiap hasil dilaporkan ke induk setelah enroll() kembali."""
+    for data in kegiatan_app.ACTIVITIES.values():
+        data['capacity'] = 2 * users
+    child_app = kegiatan_app.create_app({'DATABASE': database, 'SELECTION_GROUP_COMMIT': True, 'DB_SYNCHRONOUS': 'FULL',
+                                         'SELECTION_BATCH_MAX': batch_max, 'SELECTION_BATCH_WAIT_MS': batch_wait_ms,
+                                         'TEMPLATE_CACHE_DIR': False})
+    activities = list(kegiatan_app.ACTIVITIES)
+    rng = random.Random(users)
+    # Setiap pengguna ke-10 dikirim dua kali berturut-turut agar duplikat sering jatuh di batch yang sama
+    pending = [user_id for user_id in range(users, 0, -1) for _ in range(2 if user_id % 10 == 0 else 1)]
+    choices = {user_id: rng.sample(activities, rng.randint(1, 3)) for user_id in range(1, users + 1)}
+    lock = threading.Lock()
+
+    def worker():
+        with child_app.app_context():
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    user_id = pending.pop()
+                try:
+                    kegiatan_app.selection_writer.enroll(user_id, choices[user_id])
+                    outcome = 'ok'
+                except sqlite3.IntegrityError:
+                    outcome = 'duplicate'
+                with lock:
+                    connection.send((user_id, choices[user_id], outcome))
+
+    run_threads([worker] * threads)
+    connection.close()
+
+
+def check_group_commit_durability(args):
+    """Bunuh (SIGKILL) proses penulis di tengah beban, lalu pastikan setiap konfirmasi yang sudah dilaporkan berhasil tersimpan."""
+    import multiprocessing
+    with tempfile.TemporaryDirectory() as directory:
+        database = make_temp_database(directory, users=args.users)
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.get_context('spawn').Process(
+            target=group_commit_child, args=(database, args.users, args.threads, args.batch_max, args.batch_wait_ms, sender))
+        process.start()
+        sender.close()
+        acknowledged = []
+        kill_after = args.users // 2
+        while len(acknowledged) < kill_after:
+            try:
+                acknowledged.append(receiver.recv())
+            except EOFError:
+                break
+        process.kill()
+        process.join()
+        # Hasil yang sudah terkirim sebelum proses mati tetap bisa dibaca dari pipe
+        while receiver.poll():
+            try:
+                acknowledged.append(receiver.recv())
+            except EOFError:
+                break
+
+        conn = sqlite3.connect(database)
+        conn.row_factory = sqlite3.Row
+        stored = {}
+        for row in conn.execute('''
+            SELECT s.user_id, sa.activity FROM user_final_selection s JOIN selection_activity sa ON sa.selection_id = s.id
+        '''):
+            stored.setdefault(row['user_id'], set()).add(row['activity'])
+        ok = {user_id: set(chosen) for user_id, chosen, outcome in acknowledged if outcome == 'ok'}
+        duplicates = [user_id for user_id, _, outcome in acknowledged if outcome == 'duplicate']
+        oks_per_user = {}
+        for user_id, _, outcome in acknowledged:
+            if outcome == 'ok':
+                oks_per_user[user_id] = oks_per_user.get(user_id, 0) + 1
+        result = {
+            'killed_after_acks': len(acknowledged),
+            'acknowledged_ok': len(ok),
+            'acknowledged_duplicate': len(duplicates),
+            'stored_selections': len(stored),
+            # Harus 0: pilihan yang sudah dilaporkan berhasil tetapi hilang/berbeda setelah proses dibunuh
+            'lost_acknowledged': sum(1 for user_id, chosen in ok.items() if stored.get(user_id) != chosen),
+            'double_enrolled': sum(1 for count in oks_per_user.values() if count > 1),
+            'duplicate_without_stored_selection': sum(1 for user_id in duplicates if user_id not in stored),
+            # Boleh > 0: commit selesai tetapi proses mati sebelum sempat melapor
+            'committed_unacknowledged': len(stored.keys() - ok.keys()),
+            'counter_drift': kegiatan_app.verify_activity_counters(conn),
+            'analytics_drift': kegiatan_app.verify_analytics(conn),
+        }
+        conn.close()
+    return result
+
+
+def bench_groupcommit(args):
+    """Konfirmasi bersamaan lewat POST /confirm_selection: commit per request vs group commit, pada synchronous NORMAL dan FULL."""
+    activities = list(kegiatan_app.ACTIVITIES)
+    rng = random.Random(args.seed)
+    choices = [rng.sample(activities, rng.randint(1, 3)) for _ in range(args.users)]
+    original_capacity = {name: data['capacity'] for name, data in kegiatan_app.ACTIVITIES.items()}
+    for data in kegiatan_app.ACTIVITIES.values():
+        data['capacity'] = 2 * args.users
+    results = {}
+    try:
+        for synchronous in args.synchronous.split(','):
+            for mode in ('per_request', 'group'):
+                with tempfile.TemporaryDirectory() as directory:
+                    # Sesi di memori agar yang diukur hanya commit pilihan, bukan tulisan tabel sesi
+                    database = make_temp_database(directory, users=args.users, DB_SYNCHRONOUS=synchronous,
+                                                  SESSION_BACKEND='memory', SELECTION_GROUP_COMMIT=mode == 'group',
+                                                  SELECTION_BATCH_MAX=args.batch_max,
+                                                  SELECTION_BATCH_WAIT_MS=args.batch_wait_ms)
+                    pending = list(range(1, args.users + 1))
+                    lock = threading.Lock()
+                    samples = []
+
+                    def worker():
+                        client = app.test_client()
+                        local = []
+                        while True:
+                            with lock:
+                                if not pending:
+                                    break
+                                user_id = pending.pop()
+                            with client.session_transaction() as sess:
+                                sess['logged_in'] = True
+                                sess['user_id'] = user_id
+                            started = time.perf_counter()
+                            client.post('/confirm_selection', data={'selected_activities': choices[user_id - 1]})
+                            local.append(time.perf_counter() - started)
+                        with lock:
+                            samples.extend(local)
+
+                    elapsed = run_threads([worker] * args.threads)
+                    with app.app_context():
+                        writer_stats = kegiatan_app.selection_writer.stats()
+                    close_pool()
+
+                    conn = sqlite3.connect(database)
+                    conn.row_factory = sqlite3.Row
+                    enrolled = conn.execute('SELECT COUNT(*) FROM user_final_selection').fetchone()[0]
+                    drift = kegiatan_app.verify_activity_counters(conn)
+                    conn.close()
+                    result = {
+                        'enrolled': enrolled,
+                        'elapsed_s': round(elapsed, 3),
+                        'throughput_per_s': round(args.users / elapsed, 1),
+                        'latency': summarize(samples),
+                        'counter_drift': drift,
+                    }
+                    if mode == 'group':
+                        result['batches'] = writer_stats['batches']
+                        result['avg_batch'] = round(writer_stats['enrollments'] / max(1, writer_stats['batches']), 1)
+                        result['largest_batch'] = writer_stats['largest_batch']
+                    results[f'{mode}_{synchronous.lower()}'] = result
+        if args.durability:
+            results['durability_kill9'] = check_group_commit_durability(args)
+    finally:
+        for name, capacity in original_capacity.items():
+            kegiatan_app.ACTIVITIES[name]['capacity'] = capacity
+    return {'users': args.users, 'threads': args.threads, 'batch_max': args.batch_max,
+            'batch_wait_ms': args.batch_wait_ms, 'results': results}
+
+
+SERVE_PATHS = ('/api/activities', '/activities', '/', '/participants_list')
+
+
+def bench_ratelimit(args):
+    """Overhead limiter per request (memory vs sqlite, rute tanpa batas) dan efeknya pada badai tebak password."""
+    results = {}
+    generous = {'main.login': {'ip': [10 ** 9, 60], 'account': [10 ** 9, 60]}}
+    with tempfile.TemporaryDirectory() as directory:
+        make_temp_database(directory, users=1, RATE_LIMITS=generous)
+        keys = [f'main.login:account:user{i}@example.com' for i in range(args.keys)]
+
+        def per_call_us(func, calls):
+            started = time.perf_counter()
+            for i in range(calls):
+                func(i)
+            return round((time.perf_counter() - started) / calls * 1e6, 3)
+
+        with app.app_context():
+            for backend in ('memory', 'sqlite'):
+                app.config['RATE_LIMIT_BACKEND'] = backend
+                store = kegiatan_app.rate_limiter.get_store(app)
+                calls = args.calls if backend == 'memory' else args.calls // 10
+                results[f'{backend}_hit_us'] = per_call_us(
+                    lambda i: store.hit(keys[i % len(keys)], 10 ** 9, 60, time.time()), calls)
+            # Jalur ditolak: bucket satu token yang sudah terpakai
+            app.config['RATE_LIMIT_BACKEND'] = 'memory'
+            store = kegiatan_app.rate_limiter.get_store(app)
+            store.hit('denied', 1, 3600, time.time())
+            results['memory_denied_hit_us'] = per_call_us(lambda i: store.hit('denied', 1, 3600, time.time()), args.calls)
+
+        # Hook before_request lengkap di dalam request context (form sudah di-parse, seperti yang juga dilakukan view)
+        hook_cases = (
+            ('hook_unlimited_route_us', 'GET', '/activities', 'memory', True),
+            ('hook_disabled_us', 'POST', '/login', 'memory', False),
+            ('hook_memory_us', 'POST', '/login', 'memory', True),
+            ('hook_sqlite_us', 'POST', '/login', 'sqlite', True),
+        )
+        for name, method, path, backend, enabled in hook_cases:
+            app.config.update(RATE_LIMIT_BACKEND=backend, RATE_LIMIT_ENABLED=enabled)
+            calls = args.calls // 10 if backend == 'sqlite' and enabled and method == 'POST' else args.calls
+            with app.test_request_context(path, method=method, data={'email': 'user1@example.com', 'password': 'x'}):
+                kegiatan_app.rate_limit_identities(kegiatan_app.request._get_current_object())
+                for _ in range(100):
+                    kegiatan_app.enforce_rate_limit()
+                results[name] = per_call_us(lambda i: kegiatan_app.enforce_rate_limit(), calls)
+        close_pool()
+
+    # Tebak password untuk satu akun: setiap percobaan yang lolos limiter membayar satu verifikasi hash penuh
+    password_hash = kegiatan_app.generate_password_hash('rahasia-benchmark', kegiatan_app.DEFAULT_CONFIG['PASSWORD_HASH_METHOD'])
+    for enabled in (False, True):
+        with tempfile.TemporaryDirectory() as directory:
+            database = make_temp_database(directory, users=1, RATE_LIMIT_ENABLED=enabled, PASSWORD_HASH_WORKERS=0)
+            conn = sqlite3.connect(database)
+            conn.execute('UPDATE users SET password_hash = ?', (password_hash,))
+            conn.commit()
+            conn.close()
+            client = app.test_client()
+            with app.app_context():
+                hashes_before = kegiatan_app.password_hasher.stats()['completed']
+            statuses = {}
+            started = time.perf_counter()
+            for attempt in range(args.attempts):
+                response = client.post('/login', data={'email': 'user1@example.com', 'password': f'tebakan-{attempt}'})
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            elapsed = time.perf_counter() - started
+            with app.app_context():
+                hashes = kegiatan_app.password_hasher.stats()['completed'] - hashes_before
+                limited = kegiatan_app.rate_limiter.stats()['limited']
+            close_pool()
+            shutdown_hasher()
+            results['guessing_limiter_on' if enabled else 'guessing_limiter_off'] = {
+                'attempts': args.attempts,
+                'elapsed_s': round(elapsed, 3),
+                'password_hashes': hashes,
+                'statuses': statuses,
+                'limited': limited,
+            }
+    return results
+
+
+def bench_waitlist(args):
+    """Antrean daftar tunggu bersamaan: promosi harus FIFO, tidak pernah melebihi kuota, dan posisi murah dibaca."""
+    activity = args.activity
+    capacity = kegiatan_app.ACTIVITIES[activity]['capacity']
+    freed = min(args.freed, capacity, args.waiters)
+    total_users = capacity + args.waiters + args.late_joiners + args.queue_length
+    late_ids = list(range(capacity + args.waiters + 1, capacity + args.waiters + args.late_joiners + 1))
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = make_temp_database(directory, users=total_users, RATE_LIMIT_ENABLED=False)
+        with app.app_context():
+            conn = kegiatan_app.get_db_connection()
+            for user_id in range(1, capacity + 1):
+                kegiatan_app.enroll_user(conn, user_id, [activity])
+            # Daftar tunggu hanya untuk mahasiswa yang sudah punya pilihan (< 3 kegiatan): beri satu kegiatan lain.
+            # Kuota kegiatan lain sengaja diabaikan pada data sintetis
+            other = next(name for name in kegiatan_app.ACTIVITIES if name != activity)
+            waiting_ids = range(capacity + 1, total_users + 1)
+            conn.executemany('INSERT INTO user_final_selection (id, user_id) VALUES (?, ?)', [(i, i) for i in waiting_ids])
+            conn.executemany('INSERT INTO selection_activity (selection_id, activity) VALUES (?, ?)',
+                             [(i, other) for i in waiting_ids])
+            kegiatan_app.verify_activity_counters(conn, repair=True)
+            conn.commit()
+            selection_ids = {row['user_id']: row['id'] for row in conn.execute('SELECT id, user_id FROM user_final_selection')}
+        close_pool()
+
+        lock = threading.Lock()
+
+        def student_client(user_id):
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['logged_in'] = True
+                sess['user_id'] = user_id
+            return client
+
+        def joiner(pending, samples):
+            def worker():
+                local = []
+                while True:
+                    with lock:
+                        if not pending:
+                            break
+                        user_id = pending.pop(0)
+                    client = student_client(user_id)
+                    started = time.perf_counter()
+                    client.post('/waitlist/join', data={'waitlist_activity': activity})
+                    local.append(time.perf_counter() - started)
+                with lock:
+                    samples.extend(local)
+            return worker
+
+        # Fase 1: antrean diisi bersamaan selagi kegiatan penuh
+        join_samples = []
+        run_threads([joiner(list(range(capacity + 1, capacity + args.waiters + 1)), join_samples)] * args.threads)
+        conn = sqlite3.connect(database)
+        join_order = [row[0] for row in conn.execute('SELECT user_id FROM activity_waitlist WHERE activity = ? ORDER BY id',
+                                                     (activity,))]
+        conn.close()
+        if len(join_order) != args.waiters:
+            raise SystemExit(f'Hanya {len(join_order)} dari {args.waiters} mahasiswa masuk daftar tunggu')
+
+        # Fase 2: admin melepas kursi (hapus pilihan / hapus akun) sementara mahasiswa lain ikut antre dan memantau posisi
+        freeing = list(range(1, freed + 1))
+        stop = threading.Event()
+        free_samples, late_samples, poll_samples = [], [], []
+        peak = {'counter': 0, 'enrolled': 0}
+
+        def admin_worker():
+            client = admin_client()
+            local = []
+            while True:
+                with lock:
+                    if not freeing:
+                        break
+                    user_id = freeing.pop(0)
+                started = time.perf_counter()
+                if user_id % 2:
+                    client.post(f'/admin/delete_selection/{selection_ids[user_id]}')
+                else:
+                    client.post(f'/admin/delete_user/{user_id}')
+                local.append(time.perf_counter() - started)
+            with lock:
+                free_samples.extend(local)
+
+        def poller():
+            client = student_client(join_order[-1])
+            local = []
+            while not stop.is_set():
+                started = time.perf_counter()
+                client.get('/api/waitlist')
+                local.append(time.perf_counter() - started)
+            with lock:
+                poll_samples.extend(local)
+
+        def monitor():
+            conn = sqlite3.connect(database)
+            while not stop.is_set():
+                counter = conn.execute('SELECT participant_count FROM activity_counter WHERE activity = ?', (activity,)).fetchone()[0]
+                enrolled = conn.execute('SELECT COUNT(*) FROM selection_activity WHERE activity = ?', (activity,)).fetchone()[0]
+                peak['counter'] = max(peak['counter'], counter)
+                peak['enrolled'] = max(peak['enrolled'], enrolled)
+            conn.close()
+
+        background = [threading.Thread(target=target) for target in (poller, monitor)]
+        for thread in background:
+            thread.start()
+        elapsed = run_threads([admin_worker] * args.admins + [joiner(list(late_ids), late_samples)] * args.threads)
+        stop.set()
+        for thread in background:
+            thread.join()
+        close_pool()
+
+        conn = sqlite3.connect(database)
+        conn.row_factory = sqlite3.Row
+        # Promosi menambah baris selection_activity sesuai urutannya
+        promoted = [row['user_id'] for row in conn.execute('''
+            SELECT s.user_id FROM user_final_selection s JOIN selection_activity a ON a.selection_id = s.id
+            WHERE a.activity = ? AND s.user_id > ? ORDER BY a.rowid
+        ''', (activity, capacity))]
+        remaining = [row['user_id'] for row in conn.execute('SELECT user_id FROM activity_waitlist WHERE activity = ? ORDER BY id',
+                                                            (activity,))]
+        enrolled = conn.execute('SELECT COUNT(*) FROM selection_activity WHERE activity = ?', (activity,)).fetchone()[0]
+        drift = kegiatan_app.verify_activity_counters(conn)
+        analytics_drift = kegiatan_app.verify_analytics(conn)
+
+        # Biaya membaca posisi di ujung antrean yang panjang
+        queue_ids = range(capacity + args.waiters + args.late_joiners + 1, total_users + 1)
+        conn.executemany('INSERT INTO activity_waitlist (activity, user_id) VALUES (?, ?)', [(activity, i) for i in queue_ids])
+        conn.commit()
+        queue_length = len(remaining) + len(queue_ids)
+        last_user = queue_ids[-1] if queue_ids else remaining[-1]
+        position_samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            position = kegiatan_app.fetch_waitlist_positions(conn, last_user)[activity]['position']
+            position_samples.append(time.perf_counter() - started)
+        conn.close()
+
+    problems = []
+    if promoted != join_order[:freed]:
+        problems.append(f'urutan promosi tidak FIFO: {promoted[:10]} vs {join_order[:10]}')
+    # Pendaftar fase 2 selalu berada di belakang seluruh antrean fase 1
+    if remaining[:args.waiters - freed] != join_order[freed:] or sorted(remaining[args.waiters - freed:]) != late_ids:
+        problems.append('sisa antrean tidak sesuai urutan masuk')
+    if enrolled != capacity or peak['counter'] > capacity or peak['enrolled'] > capacity:
+        problems.append(f'kuota: akhir {enrolled}, puncak counter {peak["counter"]}, puncak peserta {peak["enrolled"]} / {capacity}')
+    if drift or analytics_drift or position != queue_length:
+        problems.append(f'drift counter {drift}, analitik {analytics_drift}, posisi {position} / {queue_length}')
+    if problems:
+        raise SystemExit('; '.join(problems))
+    return {
+        'activity': activity,
+        'capacity': capacity,
+        'waiters': args.waiters,
+        'seats_freed': freed,
+        'promoted_in_order': len(promoted),
+        'peak_enrolled': peak['enrolled'],
+        'join': summarize(join_samples),
+        'free_seat_request': summarize(free_samples),
+        'late_join': summarize(late_samples),
+        'api_waitlist_poll': summarize(poll_samples),
+        'phase2_elapsed_s': round(elapsed, 3),
+        'position_query': {'queue_length': queue_length, **summarize(position_samples)},
+    }
+
+
+def bench_reset(args):
+    """Alur lupa password: latensi request dengan server email lambat, cache email negatif, dan token sekali pakai."""
+
+    class SlowMailer(kegiatan_app.LocalMailer):
+        # Meniru server SMTP yang butuh waktu per email
+        def send(self, message):
+            time.sleep(args.mail_delay_ms / 1000.0)
+            super().send(message)
+
+    def queries_per_request(endpoint):
+        histogram = app.extensions['kegiatan']['metrics']._histograms.get(
+            ('kegiatan_db_queries_per_request', (('endpoint', endpoint), ('method', 'POST'))))
+        return round(histogram['sum'] / histogram['count'], 2) if histogram else 0.0
+
+    def timed_posts(path, forms):
+        # Client baru per request (seperti bot tanpa cookie), agar pesan flash tidak menumpuk di satu sesi
+        samples = []
+        for form in forms:
+            client = app.test_client()
+            started = time.perf_counter()
+            client.post(path, data=form)
+            samples.append(time.perf_counter() - started)
+        return samples
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        make_temp_database(directory, users=args.users, RATE_LIMIT_ENABLED=False, METRICS_ENABLED=True,
+                           MAIL_LOCAL_DIR=False, SERVER_NAME='kegiatan.test')
+        outbox = app.extensions['kegiatan']['mail_outbox']
+        outbox.mailer = SlowMailer(None, keep=args.requests)
+        metrics = app.extensions['kegiatan']['metrics']
+
+        # Email terdaftar: token dicatat lalu email masuk antrean; request tidak menunggu mailer
+        metrics.reset()
+        forms = [{'email': f'user{i % args.users + 1}@example.com'} for i in range(args.requests)]
+        started = time.perf_counter()
+        samples = timed_posts('/forgot_password', forms)
+        requests_done = time.perf_counter() - started
+        outbox.wait_idle()
+        results['registered_email'] = {
+            'mail_delay_ms': args.mail_delay_ms,
+            'request': summarize(samples),
+            'db_queries_per_request': queries_per_request('main.forgot_password'),
+            'requests_elapsed_s': round(requests_done, 3),
+            'outbox_drained_after_s': round(time.perf_counter() - started, 3),
+            'outbox': outbox.stats(),
+        }
+
+        # Bot yang mencoba email tidak terdaftar berulang kali
+        unknown = [f'tebakan{i}@example.com' for i in range(args.unknown_emails)]
+        for phase in ('cold', 'warm'):
+            metrics.reset()
+            samples = timed_posts('/forgot_password', [{'email': email} for email in unknown])
+            results[f'unknown_email_{phase}_cache'] = {
+                'request': summarize(samples),
+                'db_queries_per_request': queries_per_request('main.forgot_password'),
+            }
+
+        # Tautan reset: GET tanpa database, POST sekali pakai
+        links = [message.get_content().split('http://kegiatan.test', 1)[1].split()[0] for message in outbox.mailer.sent]
+        links = links[:args.resets]
+        metrics.reset()
+        client = app.test_client()
+        get_samples = []
+        for link in links:
+            started = time.perf_counter()
+            client.get(link)
+            get_samples.append(time.perf_counter() - started)
+        get_queries = metrics._histograms.get(
+            ('kegiatan_db_queries_per_request', (('endpoint', 'main.reset_password'), ('method', 'GET'))))
+        outcomes, post_samples = {}, {}
+        for attempt in ('first_use', 'replay'):
+            outcomes[attempt], post_samples[attempt] = {}, []
+            for link in links:
+                started = time.perf_counter()
+                response = client.post(link, data={'password': 'baru-rahasia', 'confirm_password': 'baru-rahasia'})
+                post_samples[attempt].append(time.perf_counter() - started)
+                outcome = 'ok' if response.location.endswith('/login') else 'rejected'
+                outcomes[attempt][outcome] = outcomes[attempt].get(outcome, 0) + 1
+        results['reset_link'] = {
+            'get': summarize(get_samples),
+            'get_db_queries_per_request': round(get_queries['sum'] / get_queries['count'], 2) if get_queries else 0.0,
+            'post_outcomes': outcomes,
+            # Replay ditolak sebelum hashing password baru
+            'post_first_use': summarize(post_samples['first_use']),
+            'post_replay': summarize(post_samples['replay']),
+        }
+        close_pool()
+        shutdown_hasher()
+
+    if results['reset_link']['post_outcomes']['replay'].get('ok'):
+        raise SystemExit('Token reset password bisa dipakai ulang')
+    return results
+
+
+def server_command(mode, port, args):
+    if mode == 'asgi':
+        return [sys.executable, '-m', 'uvicorn', '--factory', 'asgi:create_asgi_app', '--host', '127.0.0.1',
+                '--port', str(port), '--backlog', '4096', '--log-level', 'warning', '--no-access-log']
+    if args.wsgi_server == 'gunicorn':
+        return [sys.executable, '-m', 'gunicorn', '--workers', '1', '--worker-class', 'gthread',
+                '--threads', str(args.wsgi_threads), '--bind', f'127.0.0.1:{port}', '--backlog', '4096',
+                '--log-level', 'warning', 'app:create_app()']
+    return [sys.executable, '-m', 'flask', '--app', 'app:create_app()', 'run', '--host', '127.0.0.1',
+            '--port', str(port), '--with-threads']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Server berhenti saat start (kode {process.returncode})')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('Server tidak siap dalam batas waktu')
+
+
+def process_tree(pid):
+    # Proses server beserta anaknya (worker gunicorn); hanya Linux
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as stat_file:
+                    parents[int(entry)] = int(stat_file.read().rsplit(')', 1)[1].split()[1])
+            except OSError:
+                continue
+    tree, frontier = [pid], [pid]
+    while frontier:
+        frontier = [child for child, parent in parents.items() if parent in frontier]
+        tree.extend(frontier)
+    return tree
+
+
+def sample_server(pid, stop, peak):
+    # Puncak jumlah thread dan RSS seluruh proses server selama beban berjalan
+    while not stop.wait(0.1):
+        threads = rss_kb = 0
+        for member in process_tree(pid):
+            try:
+                with open(f'/proc/{member}/status') as status_file:
+                    for line in status_file:
+                        if line.startswith('Threads:'):
+                            threads += int(line.split()[1])
+                        elif line.startswith('VmRSS:'):
+                            rss_kb += int(line.split()[1])
+            except OSError:
+                continue
+        peak['threads'] = max(peak['threads'], threads)
+        peak['rss_mb'] = max(peak['rss_mb'], round(rss_kb / 1024, 1))
+
+
+async def read_http_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = dict((name.strip().lower(), value.strip()) for name, value in
+                   (line.split(':', 1) for line in lines[1:] if ':' in line))
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        return status, False
+    keep_alive = headers.get('connection', '').lower() != 'close' and lines[0].startswith('HTTP/1.1')
+    return status, keep_alive
+
+
+async def keepalive_client(port, cookie, paths, timeout, samples, errors):
+    """Satu klien dengan koneksi keep-alive yang meminta paths berurutan; koneksi dibuka ulang jika ditutup server."""
+    reader = writer = None
+    for path in paths:
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nCookie: {cookie}\r\n\r\n'.encode('latin-1'))
+            status, keep_alive = await asyncio.wait_for(read_http_response(reader), timeout)
+        except (OSError, EOFError, ValueError, asyncio.TimeoutError) as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            if writer is not None:
+                writer.close()
+            writer = None
+            continue
+        samples[path].append(time.perf_counter() - started)
+        if status != 200:
+            errors[status] = errors.get(status, 0) + 1
+        if not keep_alive:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def seat_watcher(port, cookie, watchers, stop):
+    # Penonton SSE yang tetap tersambung selama beban berjalan
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        watchers['failed'] += 1
+        return
+    try:
+        writer.write(f'GET /api/activities/stream HTTP/1.1\r\nHost: 127.0.0.1\r\nCookie: {cookie}\r\n\r\n'.encode('latin-1'))
+        head = await reader.readuntil(b'\r\n\r\n')
+        watchers['connected' if head.split(b' ', 2)[1] == b'200' else 'rejected'] += 1
+        await stop.wait()
+    except (OSError, EOFError, ValueError):
+        watchers['failed'] += 1
+    finally:
+        writer.close()
+
+
+def run_serve_load(port, cookies, args, watcher_count=0):
+    samples = {path: [] for path in SERVE_PATHS}
+    errors = {}
+    watchers = {'connected': 0, 'rejected': 0, 'failed': 0}
+    rng = random.Random(args.seed)
+    plans = [[rng.choice(SERVE_PATHS) for _ in range(args.requests)] for _ in cookies]
+    elapsed = 0.0
+
+    async def drive():
+        nonlocal elapsed
+        stop = asyncio.Event()
+        watcher_tasks = [asyncio.create_task(seat_watcher(port, cookies[i % len(cookies)], watchers, stop))
+                         for i in range(watcher_count)]
+        if watcher_tasks:
+            # Beri waktu stream tersambung sebelum beban baca dimulai
+            await asyncio.sleep(1.0)
+        started = time.perf_counter()
+        await asyncio.gather(*(keepalive_client(port, cookie, plan, args.timeout, samples, errors)
+                               for cookie, plan in zip(cookies, plans)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        if watcher_tasks:
+            # Penonton yang masih menunggu header (tidak kebagian thread) dihentikan paksa
+            done, pending = await asyncio.wait(watcher_tasks, timeout=1.0)
+            for task in pending:
+                task.cancel()
+
+    asyncio.run(drive())
+    completed = sum(len(values) for values in samples.values())
+    result = {
+        'elapsed_s': round(elapsed, 3),
+        'requests': completed,
+        'throughput_per_s': round(completed / elapsed, 1),
+        'all': summarize([value for values in samples.values() for value in values]),
+        'routes': {path: summarize(values) for path, values in samples.items()},
+        'errors': {str(key): count for key, count in errors.items()},
+    }
+    if watcher_count:
+        result['seat_watchers'] = watchers
+    return result
+
+
+def bench_serve(args):
+    """Rute baca di mode WSGI (thread per request) vs ASGI (event loop + executor terbatas), banyak klien keep-alive."""
+    if args.wsgi_server == 'auto':
+        args.wsgi_server = 'gunicorn' if importlib.util.find_spec('gunicorn') else 'werkzeug'
+    modes = ('wsgi', 'asgi') if args.mode == 'both' else (args.mode,)
+    if 'asgi' in modes and importlib.util.find_spec('uvicorn') is None:
+        raise SystemExit('Mode ASGI butuh uvicorn: pip install uvicorn')
+    directory = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        database = make_temp_database(temp_dir, SESSION_BACKEND='sqlite')
+        seed_registrations(database, args.seed_users, seed=args.seed)
+        # Sesi login dibuat langsung di store agar beban hanya mengenai rute baca
+        cookies = []
+        with app.app_context():
+            interface = app.session_interface
+            store = interface.get_store(app)
+            expires_at = time.time() + app.config['SESSION_TTL']
+            for user_id in range(1, args.clients + 1):
+                sid = f'bench-{user_id}'
+                store.save(sid, user_id, interface.serializer.dumps({'logged_in': True, 'user_id': user_id, 'is_admin': 0,
+                                                                     'user_name': f'User {user_id}'}), expires_at)
+                cookies.append(f'{app.config["SESSION_COOKIE_NAME"]}={sid}')
+        close_pool()
+
+        env = {**os.environ, 'KEGIATAN_DATABASE': database, 'KEGIATAN_SESSION_BACKEND': 'sqlite',
+               'KEGIATAN_PASSWORD_HASH_WORKERS': '0', 'KEGIATAN_TEMPLATE_CACHE_DIR': os.path.join(temp_dir, 'jinja')}
+        for mode in modes:
+            port = free_port()
+            process = subprocess.Popen(server_command(mode, port, args), cwd=directory, env=env,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                wait_for_port(port, process)
+                # Pemanasan: template terkompilasi dan cache katalog terisi sebelum diukur
+                warmup = argparse.Namespace(**{**vars(args), 'requests': 4})
+                run_serve_load(port, cookies[:10], warmup)
+                peak, stop = {'threads': 0, 'rss_mb': 0.0}, threading.Event()
+                sampler = threading.Thread(target=sample_server, args=(process.pid, stop, peak), daemon=True)
+                sampler.start()
+                results[mode] = run_serve_load(port, cookies, args, watcher_count=args.watchers)
+                stop.set()
+                sampler.join()
+                results[mode]['server_peak'] = peak
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+
+    return {
+        'commit': current_commit(),
+        'clients': args.clients,
+        'requests_per_client': args.requests,
+        'seat_watchers': args.watchers,
+        'seed_users': args.seed_users,
+        'wsgi_server': f'{args.wsgi_server} ({args.wsgi_threads} thread)' if args.wsgi_server == 'gunicorn' else args.wsgi_server,
+        'cpu_count': os.cpu_count(),
+        'modes': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    pool_parser = subparsers.add_parser('pool', help='Latensi koneksi per request vs pool WAL di bawah writer bersamaan')
+    pool_parser.add_argument('--writers', type=int, default=8)
+    pool_parser.add_argument('--readers', type=int, default=8)
+    pool_parser.add_argument('--ops', type=int, default=200)
+    pool_parser.set_defaults(func=bench_pool)
+
+    enroll_parser = subparsers.add_parser('enroll', help='Uji tekanan konfirmasi bersamaan terhadap kuota kegiatan')
+    enroll_parser.add_argument('--users', type=int, default=3000)
+    enroll_parser.add_argument('--threads', type=int, default=32)
+    enroll_parser.add_argument('--seed', type=int, default=1)
+    enroll_parser.set_defaults(func=bench_enroll)
+
+    export_parser = subparsers.add_parser('export', help='Streaming ekspor CSV atas pendaftaran sintetis')
+    export_parser.add_argument('--rows', type=int, default=500000)
+    export_parser.set_defaults(func=bench_export)
+
+    wib_parser = subparsers.add_parser('wib', help='Micro-benchmark konversi timestamp UTC ke WIB')
+    wib_parser.add_argument('--values', type=int, default=200000)
+    wib_parser.add_argument('--seed', type=int, default=1)
+    wib_parser.set_defaults(func=bench_wib)
+
+    login_parser = subparsers.add_parser('login', help='Badai login: throughput dan tail latency hashing password')
+    login_parser.add_argument('--logins', type=int, default=200)
+    login_parser.add_argument('--users', type=int, default=50)
+    login_parser.add_argument('--threads', type=int, default=32)
+    login_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    login_parser.set_defaults(func=bench_login)
+
+    import_parser = subparsers.add_parser('import', help='Impor massal akun mahasiswa dari CSV lewat halaman admin')
+    # Default memakai PASSWORD_HASH_METHOD seperti rute sebenarnya; satu hash scrypt ~0,1 detik per inti CPU
+    import_parser.add_argument('--rows', type=int, default=500)
+    import_parser.add_argument('--workers', type=int, default=None)
+    import_parser.add_argument('--hash-method', default=None, help='Ganti BULK_IMPORT_HASH_METHOD selama benchmark')
+    import_parser.set_defaults(func=bench_import)
+
+    flow_parser = subparsers.add_parser('flow', help='Alur pendaftaran lengkap: p50/p95/p99 per rute, test client dan HTTP')
+    flow_parser.add_argument('--seed-users', type=int, default=5000, help='Pengguna + pilihan yang sudah ada di database')
+    flow_parser.add_argument('--visitors', type=int, default=200, help='Pengunjung baru yang menjalankan alur penuh')
+    flow_parser.add_argument('--threads', type=int, default=16)
+    flow_parser.add_argument('--mode', choices=('client', 'http', 'both'), default='both')
+    flow_parser.add_argument('--hash-method', default=None, help='Ganti PASSWORD_HASH_METHOD selama benchmark')
+    flow_parser.add_argument('--seed', type=int, default=1)
+    flow_parser.add_argument('--output', default=None, help='Simpan hasil JSON ke berkas ini')
+    flow_parser.add_argument('--compare', default=None, help='Hasil JSON commit sebelumnya untuk dibandingkan')
+    flow_parser.set_defaults(func=bench_flow)
+
+    search_parser = subparsers.add_parser('search', help='Latensi pencarian peserta admin (FTS5 dan awalan NIM)')
+    search_parser.add_argument('--users', type=int, default=100000)
+    search_parser.add_argument('--queries', type=int, default=300)
+    search_parser.add_argument('--limit', type=int, default=50)
+    search_parser.add_argument('--seed', type=int, default=1)
+    search_parser.set_defaults(func=bench_search)
+
+    analytics_parser = subparsers.add_parser('analytics', help='Analitik admin: tabel ringkasan vs agregat langsung, biaya trigger')
+    analytics_parser.add_argument('--registrations', type=int, default=100000)
+    analytics_parser.add_argument('--repeat', type=int, default=50)
+    analytics_parser.add_argument('--writes', type=int, default=500, help='Pendaftaran baru per varian (dengan/tanpa trigger)')
+    analytics_parser.add_argument('--seed', type=int, default=1)
+    analytics_parser.set_defaults(func=bench_analytics)
+
+    group_parser = subparsers.add_parser('groupcommit', help='Commit per request vs group commit untuk konfirmasi bersamaan')
+    group_parser.add_argument('--users', type=int, default=3000)
+    group_parser.add_argument('--threads', type=int, default=32)
+    group_parser.add_argument('--batch-max', type=int, default=64)
+    group_parser.add_argument('--batch-wait-ms', type=float, default=2.0)
+    group_parser.add_argument('--synchronous', default='NORMAL,FULL', help='Nilai DB_SYNCHRONOUS yang diuji, dipisah koma')
+    group_parser.add_argument('--no-durability', dest='durability', action='store_false',
+                              help='Lewati uji SIGKILL di tengah group commit')
+    group_parser.add_argument('--seed', type=int, default=1)
+    group_parser.set_defaults(func=bench_groupcommit)
+
+    serve_parser = subparsers.add_parser('serve', help='Rute baca dengan banyak klien bersamaan: mode WSGI vs ASGI')
+    serve_parser.add_argument('--clients', type=int, default=1000, help='Klien keep-alive yang berjalan bersamaan')
+    serve_parser.add_argument('--requests', type=int, default=5, help='Request per klien')
+    serve_parser.add_argument('--seed-users', type=int, default=5000)
+    serve_parser.add_argument('--mode', choices=('wsgi', 'asgi', 'both'), default='both')
+    serve_parser.add_argument('--wsgi-server', choices=('auto', 'gunicorn', 'werkzeug'), default='auto',
+                              help='auto = gunicorn gthread jika terpasang, selain itu server werkzeug berthread')
+    serve_parser.add_argument('--wsgi-threads', type=int, default=32)
+    serve_parser.add_argument('--watchers', type=int, default=0, help='Stream SSE /api/activities/stream yang tetap terbuka')
+    serve_parser.add_argument('--timeout', type=float, default=120.0, help='Detik per request sebelum dianggap gagal')
+    serve_parser.add_argument('--seed', type=int, default=1)
+    serve_parser.set_defaults(func=bench_serve)
+
+    ratelimit_parser = subparsers.add_parser('ratelimit', help='Overhead limiter per request dan badai tebak password')
+    ratelimit_parser.add_argument('--calls', type=int, default=200000)
+    ratelimit_parser.add_argument('--keys', type=int, default=10000, help='Kunci bucket berbeda pada micro-benchmark store')
+    ratelimit_parser.add_argument('--attempts', type=int, default=100, help='Percobaan login salah untuk satu akun')
+    ratelimit_parser.set_defaults(func=bench_ratelimit)
+
+    waitlist_parser = subparsers.add_parser('waitlist', help='Daftar tunggu bersamaan: promosi FIFO tanpa melebihi kuota')
+    waitlist_parser.add_argument('--activity', default='Futsal', choices=list(kegiatan_app.ACTIVITIES))
+    waitlist_parser.add_argument('--waiters', type=int, default=300, help='Mahasiswa yang antre sebelum kursi dilepas')
+    waitlist_parser.add_argument('--freed', type=int, default=30, help='Kursi yang dilepas admin secara bersamaan')
+    waitlist_parser.add_argument('--late-joiners', type=int, default=100, help='Mahasiswa yang antre selagi kursi dilepas')
+    waitlist_parser.add_argument('--threads', type=int, default=8)
+    waitlist_parser.add_argument('--admins', type=int, default=4)
+    waitlist_parser.add_argument('--queue-length', type=int, default=10000, help='Entri tambahan untuk mengukur query posisi')
+    waitlist_parser.add_argument('--repeat', type=int, default=200)
+    waitlist_parser.set_defaults(func=bench_waitlist)
+
+    reset_parser = subparsers.add_parser('reset', help='Lupa password: outbox email, cache email negatif, token sekali pakai')
+    reset_parser.add_argument('--users', type=int, default=1000)
+    reset_parser.add_argument('--requests', type=int, default=100, help='Permintaan reset untuk email terdaftar')
+    reset_parser.add_argument('--mail-delay-ms', type=float, default=100.0, help='Waktu kirim per email pada mailer tiruan')
+    reset_parser.add_argument('--unknown-emails', type=int, default=2000)
+    reset_parser.add_argument('--resets', type=int, default=50, help='Tautan reset yang dibuka lalu dipakai dua kali')
+    reset_parser.set_defaults(func=bench_reset)
+
+    args = parser.parse_args()
+    print(json.dumps(args.func(args), indent=2))
+
+
+if __name__ == '__main__':
+    main()